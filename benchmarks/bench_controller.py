@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+"""Time controller operations on generated configs of growing size.
+
+Each size is a conf with N processes and N/10 neighbors (see genconf.py),
+healthcheck commands are ``true`` and neighbors connect to a local stub
+listener, so nothing leaves the host.
+
+Usage:
+    python benchmarks/bench_controller.py --sizes 10 100 1000 10000
+"""
+from __future__ import print_function
+
+import os
+import sys
+import shutil
+import socket
+import argparse
+import tempfile
+import threading
+import timeit
+
+from exabgpctl import controller
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from genconf import generate  # noqa: E402 pylint: disable=wrong-import-position
+
+
+class StubListener(object):
+    """Accept and close TCP connections on an ephemeral port, bound on all
+    addresses so every 127.0.0.0/8 neighbor reaches it."""
+
+    def __init__(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(("0.0.0.0", 0))
+        self.sock.listen(1024)
+        self.port = self.sock.getsockname()[1]
+        self._thread = threading.Thread(target=self._accept)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except socket.error:
+                return
+            conn.close()
+
+    def close(self):
+        """Stop accepting."""
+        self.sock.close()
+
+
+def _silent(func):
+    """Run func with stdout on devnull."""
+
+    def wrapper(*args):
+        stdout = sys.stdout
+        with open(os.devnull, "w") as devnull:
+            sys.stdout = devnull
+            try:
+                return func(*args)
+            finally:
+                sys.stdout = stdout
+
+    return wrapper
+
+
+def _cold_config_load():
+    """config_load without the conf cache nor the parsed runs memo."""
+    controller._RUNS.clear()  # pylint: disable=protected-access
+    return controller.config_load(cache=False)
+
+
+def setup(workdir, size, port):
+    """Write conf, states and maintenance files of a size, export env.
+
+    Returns:
+        Config: loaded config.
+    """
+    maintenance = os.path.join(workdir, "maintenance")
+    os.mkdir(maintenance)
+    conf = os.path.join(workdir, "exabgp.conf")
+    with open(conf, "w") as fd:
+        fd.write(generate(size, max(1, size // 10), maintenance, port=port))
+    for index in range(size):
+        name = "service%d.exabgp.lan" % index
+        with open(os.path.join(workdir, name), "w") as fd:
+            fd.write("UP")
+        # about 10% in maintenance
+        if index % 10 == 0:
+            open(os.path.join(maintenance, name), "w").close()
+    os.environ["EXABGPCTL_CONF"] = conf
+    os.environ["EXABGPCTL_STATE"] = workdir
+    return controller.config_load(cache=False)
+
+
+def cases(cfg, size):
+    """(name, callable) of each timed operation."""
+    dump = dict(cfg)
+    workers = min(size, controller.CHECK_WORKERS)
+    return [
+        ("config_load", _cold_config_load),
+        ("config_load warm", lambda: controller.config_load(cache=False)),
+        ("config_load cached", lambda: controller.config_load(cache=True)),
+        (
+            "list_enabled_processes",
+            lambda: controller.list_enabled_processes(
+                controller.config_load(cache=True)
+            ),
+        ),
+        ("flat", lambda: controller.flat(dump)),
+        ("print_json", lambda: _silent(controller.print_json)(dump)),
+        ("print_yaml", lambda: _silent(controller.print_yaml)(dump)),
+        ("print_flat", lambda: _silent(controller.print_flat)(dump)),
+        ("print_ndjson", lambda: _silent(controller.print_ndjson)(dump)),
+        (
+            "status_processes",
+            lambda: controller.status_processes(
+                cfg, workers=workers, fresh=True
+            ),
+        ),
+        ("status_neighbors", lambda: controller.status_neighbors(cfg)),
+    ]
+
+
+def main():
+    """Print best time of each operation per size."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000]
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--only", action="append", default=[], help="operations to run"
+    )
+    args = parser.parse_args()
+
+    listener = StubListener()
+    results = {}
+    names = []
+    try:
+        for size in args.sizes:
+            workdir = tempfile.mkdtemp(prefix="exabgpctl-bench-")
+            try:
+                cfg = setup(workdir, size, listener.port)
+                if len(cfg["processes"]) != size:
+                    raise SystemExit(
+                        "%d processes loaded, expected %d"
+                        % (len(cfg["processes"]), size)
+                    )
+                for name, func in cases(cfg, size):
+                    if args.only and name not in args.only:
+                        continue
+                    if name not in names:
+                        names.append(name)
+                    results[name, size] = min(
+                        timeit.repeat(func, number=1, repeat=args.repeat)
+                    )
+            finally:
+                shutil.rmtree(workdir)
+    finally:
+        listener.close()
+
+    print(
+        "%-24s" % "operation (ms)"
+        + "".join("%12d" % size for size in args.sizes)
+    )
+    for name in names:
+        print(
+            "%-24s" % name
+            + "".join(
+                "%12.1f" % (results[name, size] * 1000)
+                for size in args.sizes
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+"""Memory of config_load per process and per neighbor (tracemalloc).
+
+Each size loads a conf with N processes and one with N neighbors (see
+genconf.py), bytes per entry are their memory minus the one of a conf with
+a single process and neighbor, divided by N. Retained is the memory held by
+the loaded config, peak the highest memory during the load.
+
+Usage:
+    python benchmarks/bench_memory.py --sizes 100 1000 10000
+"""
+from __future__ import print_function
+
+import os
+import gc
+import sys
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+
+from exabgpctl import controller
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from genconf import generate  # noqa: E402 pylint: disable=wrong-import-position
+
+
+def measure(workdir, processes, neighbors):
+    """Load a generated conf.
+
+    Returns:
+        tuple: retained and peak bytes.
+    """
+    conf = os.path.join(workdir, "exabgp.conf")
+    with open(conf, "w") as fd:
+        fd.write(
+            generate(processes, neighbors, os.path.join(workdir, "maintenance"))
+        )
+    os.environ["EXABGPCTL_CONF"] = conf
+    os.environ["EXABGPCTL_STATE"] = workdir
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        cfg = controller.config_load(cache=False)
+        gc.collect()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert len(cfg["processes"]) == processes
+    assert len(cfg["neighbors"]) == neighbors
+    return current - before, peak - before
+
+
+def main():
+    """Print bytes per process and per neighbor for each size."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000])
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="exabgpctl-bench-")
+    try:
+        # imports and exabgp globals are not part of any entry
+        measure(workdir, 1, 1)
+        base = measure(workdir, 1, 1)
+        print(
+            "%8s %18s %18s %18s %18s"
+            % (
+                "size",
+                "process retained",
+                "process peak",
+                "neighbor retained",
+                "neighbor peak",
+            )
+        )
+        for size in args.sizes:
+            process = measure(workdir, size + 1, 1)
+            neighbor = measure(workdir, 1, size + 1)
+            print(
+                "%8d %18.0f %18.0f %18.0f %18.0f"
+                % (
+                    size,
+                    (process[0] - base[0]) / float(size),
+                    (process[1] - base[1]) / float(size),
+                    (neighbor[0] - base[0]) / float(size),
+                    (neighbor[1] - base[1]) / float(size),
+                )
+            )
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
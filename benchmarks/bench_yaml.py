@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+"""Compare yaml backends on a synthetic large config.
+
+Usage:
+    python benchmarks/bench_yaml.py --processes 1000 --neighbors 100
+"""
+from __future__ import print_function
+
+import argparse
+import timeit
+
+from exabgpctl.controller import yaml_dump, _yaml_dumpers
+
+
+def synthetic_config(processes, neighbors):
+    """Build a dump-like dict with N processes and M neighbors."""
+    return {
+        "path": "/etc/exabgp/exabgp.conf",
+        "state": "/var/lib/exabgp/status",
+        "processes": [
+            {
+                "name": "service%d.exabgp.lan" % index,
+                "encoder": "text",
+                "neighbor-changes": False,
+                "run": [
+                    "/usr/bin/exabgp-healthcheck",
+                    "--cmd",
+                    "/bin/true",
+                    "--name",
+                    "service%d.exabgp.lan" % index,
+                    "--ip",
+                    "10.0.%d.%d/32" % (index // 256 % 256, index % 256),
+                ],
+                "state": "UP",
+                "maintenance": None,
+            }
+            for index in range(processes)
+        ],
+        "neighbors": {
+            "192.168.%d.%d" % (index // 256 % 256, index % 256): {
+                "peer_address": "192.168.%d.%d"
+                % (index // 256 % 256, index % 256),
+                "local_as": 65000,
+                "peer_as": 65001,
+                "hold_time": 180,
+                "families": [["ipv4", "unicast"], ["ipv6", "unicast"]],
+                "api": {"processes": ["service%d.exabgp.lan" % index]},
+            }
+            for index in range(neighbors)
+        },
+    }
+
+
+def main():
+    """Print the best time of each backend."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--processes", type=int, default=1000)
+    parser.add_argument("--neighbors", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    data = synthetic_config(args.processes, args.neighbors)
+    reference = yaml_dump(data, backend="python")
+    for backend in sorted(_yaml_dumpers()):
+        if yaml_dump(data, backend=backend) != reference:
+            raise SystemExit("%s output differs from python" % backend)
+        best = min(
+            timeit.repeat(
+                lambda backend=backend: yaml_dump(data, backend=backend),
+                number=1,
+                repeat=args.repeat,
+            )
+        )
+        print(
+            "%-8s %8.1f ms  %d bytes" % (backend, best * 1000, len(reference))
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+"""Generate an exabgp 4 conf with N processes and M neighbors.
+
+Processes run the healthcheck with realistic arguments (--ip, --next-hop,
+--disable, --community...), ``program`` must exist (exabgp checks it) but
+is never run by exabgpctl.
+
+Usage:
+    python benchmarks/genconf.py --processes 1000 --neighbors 100 \\
+        --maintenance /tmp/maintenance > /tmp/exabgp.conf
+"""
+from __future__ import print_function
+
+import argparse
+
+NEIGHBOR = """neighbor 127.%(a)d.%(b)d.%(c)d {
+    description "peer %(index)d";
+    router-id 192.0.2.1;
+    local-address 127.0.0.1;
+    local-as 65000;
+    peer-as %(peer_as)d;
+    hold-time 180;%(connect)s
+    capability {
+        graceful-restart 120;
+    }
+    family {
+        ipv4 unicast;
+    }
+}
+"""
+
+PROCESS = """process service%(index)d.exabgp.lan {
+    run %(program)s --name service%(index)d.exabgp.lan \
+--ip 10.%(a)d.%(b)d.%(c)d/32 --next-hop 192.0.2.1 \
+--disable %(maintenance)s/service%(index)d.exabgp.lan \
+--command '%(command)s' --community '65000:%(community)d' \
+--interval 5 --fast-interval 1 --rise 3 --fall 3 --withdraw-on-down \
+--execute '/usr/bin/exabgpctl process state service%(index)d.exabgp.lan';
+    encoder text;
+}
+"""
+
+
+def _octets(index):
+    """Three octets of a unique address per index."""
+    return {
+        "a": index // 65536 % 256,
+        "b": index // 256 % 256,
+        "c": index % 256,
+    }
+
+
+def generate(
+    processes,
+    neighbors,
+    maintenance="/var/lib/exabgp/maintenance",
+    command="true",
+    program="/bin/true",
+    port=None,
+):
+    """Build an exabgp 4 conf.
+
+    Args:
+        processes (int): number of healthcheck processes.
+        neighbors (int): number of neighbors, on 127.0.0.0/8 addresses.
+        maintenance (str): dir of maintenance (disable) files.
+        command (str): healthcheck command.
+        program (str): program of the run line.
+        port (int, optional): neighbor connect port, defaults to 179.
+
+    Returns:
+        str: conf content.
+    """
+    parts = []
+    for index in range(neighbors):
+        values = _octets(index + 1)
+        values.update(
+            index=index,
+            peer_as=65001 + index % 1000,
+            connect="\n    connect %d;" % port if port else "",
+        )
+        parts.append(NEIGHBOR % values)
+    for index in range(processes):
+        values = _octets(index)
+        values.update(
+            index=index,
+            program=program,
+            maintenance=maintenance,
+            command=command,
+            community=index % 65536,
+        )
+        parts.append(PROCESS % values)
+    return "\n".join(parts)
+
+
+def main():
+    """Print a generated conf."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--processes", "-p", type=int, default=100)
+    parser.add_argument("--neighbors", "-n", type=int, default=10)
+    parser.add_argument(
+        "--maintenance", default="/var/lib/exabgp/maintenance"
+    )
+    parser.add_argument("--command", default="true")
+    parser.add_argument("--program", default="/bin/true")
+    parser.add_argument("--port", type=int, default=None)
+    args = parser.parse_args()
+    print(
+        generate(
+            args.processes,
+            args.neighbors,
+            args.maintenance,
+            args.command,
+            args.program,
+            args.port,
+        ),
+        end="",
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -9,13 +9,18 @@ Main hacks of this file came from six module
 
 And https://github.com/ahmet2mir/python-artron/blob/master/artron/_py6.py
 """
+import os
 import sys
+import time
 
 PY2 = sys.version_info[0] == 2
 
 # pylint: disable=invalid-name,redefined-builtin,undefined-variable
 
 if PY2:
+    from collections import Mapping, MutableMapping
+    import SocketServer as socketserver
+
     text_type = unicode
     string_types = (str, unicode)
 
@@ -23,9 +28,25 @@ if PY2:
     itervalues = lambda x: x.itervalues()
     iteritems = lambda x: x.iteritems()
 else:
+    from collections.abc import Mapping, MutableMapping
+    import socketserver
+
     text_type = str
     string_types = (str,)
 
     iterkeys = lambda x: iter(x.keys())
     itervalues = lambda x: iter(x.values())
     iteritems = lambda x: iter(x.items())
+
+# monotonic clock when available (python 3.3+)
+monotonic = getattr(time, "monotonic", time.time)
+
+# os.scandir is python 3.5+, None means os.listdir should be used
+scandir = getattr(os, "scandir", None)
+
+# paths given to C functions (inotify...), python 2 paths are already bytes
+fsencode = getattr(os, "fsencode", lambda path: path)
+fsdecode = getattr(os, "fsdecode", lambda path: path)
+
+# CPU time of the process, time.clock is the python 2 equivalent
+process_time = getattr(time, "process_time", None) or time.clock
@@ -7,45 +7,694 @@ from __future__ import print_function
 
 # standard
 import os
+import re
+import copy
 import sys
 import json
+import time
+import errno
+import signal
 import socket
-import platform
+import fnmatch
+import hashlib
+import importlib
+import operator
+import tempfile
+import threading
+import subprocess
 import collections
+from concurrent import futures
 
 # third
-import yaml
-from yaml.representer import SafeRepresenter
-from exabgp.application import healthcheck
-from exabgp.configuration.setup import environment
-from exabgp.version import version as exabgp_version
-
-try:
-    from exabgp.configuration.ancient import Configuration
-except ImportError:
-    from exabgp.configuration.configuration import Configuration
+# yaml, exabgp and platform are imported where they are used, they are heavy
+# and most commands (version, edit, autocomplete...) don't need them.
 
 # local
 from exabgpctl.release import __version__ as exabgpctl_version
 from exabgpctl._py6 import (
+    PY2,
     iteritems,
-    iterkeys,
     itervalues,
+    monotonic,
+    Mapping,
+    MutableMapping,
+    process_time,
+    scandir,
     string_types,
     text_type,
 )
 
 
+CACHE_DIR = ".exabgpctl"
+# ndjson record kind of each list/dict section
+NDJSON_SECTIONS = {"processes": "process", "neighbors": "neighbor"}
+BGP_PORT = 179
+PROBE_CONCURRENCY = 16
+PROBE_TIMEOUT = 1
+CHECK_WORKERS = 8
+CHECK_TTL = 5
+# extra time given to workers to report a killed command after the deadline
+CHECK_GRACE = 0.5
+EXPORTER_INTERVAL = 15
+# IPInfo kept for reuse, processes often share next-hops and VIPs
+IP_CACHE_SIZE = 4096
+# confs whose parsed run lines are kept for the next load
+RUNS_CACHE_SIZE = 16
+
+
 class ExabgpCTLError(Exception):
     """Generic Error to catch from view"""
 
 
-def config_load():
+def _thread_pool(max_workers):
+    """ThreadPoolExecutor of max_workers."""
+    return futures.ThreadPoolExecutor(max_workers=max_workers)
+
+
+def _process_pool(max_workers):
+    """ProcessPoolExecutor of max_workers, multiprocessing is only imported
+    when a process pool is asked."""
+    return futures.ProcessPoolExecutor(max_workers=max_workers)
+
+
+# executor factory by name
+CHECK_POOLS = {"thread": _thread_pool, "process": _process_pool}
+
+
+# Timings, tracing and memory
+
+
+class Timings(object):
+    """Calls, wall and CPU time of each phase, see phase().
+
+    Phases are reported in the order they first ran, indented by nesting.
+    CPU time is the one of the whole process, it includes other threads.
+
+    Examples:
+        >>> timings = timings_start()
+        >>> with phase("config_load"):
+        ...     cfg = config_load()
+        >>> print(timings_stop().report())
+    """
+
+    def __init__(self):
+        self.phases = collections.OrderedDict()
+        self.depth = threading.local()
+        self.lock = threading.Lock()
+        self.start = (monotonic(), process_time())
+        self.total = None
+
+    def enter(self, name, _):
+        """Start a phase, keep its position when it first starts."""
+        depth = getattr(self.depth, "value", 0)
+        self.depth.value = depth + 1
+        if name not in self.phases:
+            with self.lock:
+                self.phases.setdefault(name, (0, depth, 0.0, 0.0))
+        return depth, monotonic(), process_time()
+
+    def exit(self, name, _, token):
+        """Account a phase run."""
+        depth, wall, cpu = token
+        wall = monotonic() - wall
+        cpu = process_time() - cpu
+        self.depth.value = depth
+        with self.lock:
+            calls, depth, total_wall, total_cpu = self.phases[name]
+            self.phases[name] = (
+                calls + 1,
+                depth,
+                total_wall + wall,
+                total_cpu + cpu,
+            )
+
+    def stop(self):
+        """Set total wall and CPU time since creation."""
+        self.total = (
+            monotonic() - self.start[0],
+            process_time() - self.start[1],
+        )
+
+    def report(self):
+        """Table of phases, times in milliseconds.
+
+        Returns:
+            str: one line per phase and a total line when stopped.
+        """
+        lines = [
+            "%-32s %7s %10s %10s" % ("phase", "calls", "wall ms", "cpu ms")
+        ]
+        for name, (calls, depth, wall, cpu) in iteritems(self.phases):
+            lines.append(
+                "%-32s %7d %10.1f %10.1f"
+                % ("  " * depth + name, calls, wall * 1000, cpu * 1000)
+            )
+        if self.total:
+            lines.append(
+                "%-32s %7s %10.1f %10.1f"
+                % ("total", "", self.total[0] * 1000, self.total[1] * 1000)
+            )
+        return "\n".join(lines)
+
+
+class Tracer(object):
+    """Spans of phases in Chrome trace event format, see phase().
+
+    The trace is readable by chrome://tracing or https://ui.perfetto.dev,
+    each thread (checks, probes) has its own track.
+
+    Examples:
+        >>> tracer = trace_start()
+        >>> cfg = config_load()
+        >>> trace_stop().write("/tmp/trace.json")
+    """
+
+    def __init__(self):
+        self.start = monotonic()
+        self.pid = os.getpid()
+        self.events = []
+        self.threads = {}
+
+    @staticmethod
+    def enter(*_):
+        """Start a span."""
+        return monotonic()
+
+    def exit(self, name, args, start):
+        """Record a complete span, thread-safe (list.append is atomic)."""
+        end = monotonic()
+        thread = threading.current_thread()
+        self.threads[thread.ident] = thread.name
+        event = {
+            "name": name,
+            "ph": "X",
+            "ts": round((start - self.start) * 1e6, 3),
+            "dur": round((end - start) * 1e6, 3),
+            "pid": self.pid,
+            "tid": thread.ident,
+        }
+        if args:
+            event["args"] = args
+        self.events.append(event)
+
+    def trace(self):
+        """Trace events with thread names.
+
+        Returns:
+            dict: Chrome trace JSON object.
+        """
+        metadata = [
+            {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": self.pid,
+                "tid": tid,
+                "args": {"name": name},
+            }
+            for tid, name in sorted(iteritems(self.threads))
+        ]
+        return {"traceEvents": metadata + self.events, "displayTimeUnit": "ms"}
+
+    def write(self, path):
+        """Write the trace (atomically) to path."""
+        atomic_write(path, json.dumps(self.trace(), default=text_type))
+
+
+class MemoryUsage(object):
+    """Peak and retained memory of each phase, with tracemalloc.
+
+    Peak is the highest traced memory during the phase minus memory at its
+    start, retained is memory at its end minus memory at its start (summed
+    over calls). Only phases of the thread which started tracking are
+    measured. Per phase peaks need python 3.9+ (``tracemalloc.reset_peak``).
+
+    Args:
+        frames (int, optional): frames kept per allocation.
+
+    Raises:
+        ExabgpCTLError: if tracemalloc is not available (python 2).
+
+    Examples:
+        >>> memory = memory_start()
+        >>> with phase("config_load"):
+        ...     cfg = config_load()
+        >>> print(memory_stop().report())
+    """
+
+    def __init__(self, frames=1):
+        try:
+            import tracemalloc  # pylint: disable=import-outside-toplevel
+        except ImportError:
+            raise ExabgpCTLError("Memory usage needs python 3.4+")
+        self.tracemalloc = tracemalloc
+        self.reset_peak = getattr(tracemalloc, "reset_peak", None)
+        self.phases = collections.OrderedDict()
+        self.thread = threading.current_thread()
+        # [memory at start, highest peak of finished children]
+        self.stack = []
+        self.snapshot = None
+        # highest traced memory, tracemalloc peak is reset by phases
+        self.highest = 0
+        self.peak = None
+        self.stopped = not tracemalloc.is_tracing()
+        if self.stopped:
+            tracemalloc.start(frames)
+
+    def enter(self, name, _):
+        """Start measuring a phase."""
+        if threading.current_thread() is not self.thread:
+            return None
+        current, peak = self.tracemalloc.get_traced_memory()
+        self.highest = max(self.highest, peak)
+        if self.stack:
+            self.stack[-1][1] = max(self.stack[-1][1], peak)
+        if name not in self.phases:
+            self.phases[name] = (0, len(self.stack), 0, 0)
+        self.stack.append([current, 0])
+        if self.reset_peak:
+            self.reset_peak()
+        return True
+
+    def exit(self, name, _, token):
+        """Account memory of a phase."""
+        if token is None:
+            return
+        current, peak = self.tracemalloc.get_traced_memory()
+        self.highest = max(self.highest, peak)
+        start, children = self.stack.pop()
+        peak = max(peak, children)
+        if self.stack:
+            self.stack[-1][1] = max(self.stack[-1][1], peak)
+        calls, depth, max_peak, retained = self.phases[name]
+        self.phases[name] = (
+            calls + 1,
+            depth,
+            max(max_peak, peak - start) if self.reset_peak else None,
+            retained + current - start,
+        )
+
+    def stop(self):
+        """Set total (current, peak) memory, take a snapshot of live
+        allocations and stop tracing (unless it was started by someone
+        else)."""
+        current, peak = self.tracemalloc.get_traced_memory()
+        self.peak = (current, max(self.highest, peak))
+        self.snapshot = self.tracemalloc.take_snapshot().filter_traces(
+            [
+                self.tracemalloc.Filter(False, self.tracemalloc.__file__),
+                self.tracemalloc.Filter(False, "<unknown>"),
+            ]
+        )
+        if self.stopped:
+            self.tracemalloc.stop()
+
+    def top(self, limit=10):
+        """Allocation sites holding most memory when stopped.
+
+        Returns:
+            list: tracemalloc Statistic, by size.
+        """
+        if self.snapshot is None:
+            return []
+        return self.snapshot.statistics("lineno")[:limit]
+
+    def report(self, limit=10):
+        """Table of phases and top allocation sites, sizes in KiB.
+
+        Returns:
+            str: report text.
+        """
+        lines = [
+            "%-32s %7s %12s %12s"
+            % ("phase", "calls", "peak KiB", "retained KiB")
+        ]
+        for name, (calls, depth, peak, retained) in iteritems(self.phases):
+            lines.append(
+                "%-32s %7d %12s %12.1f"
+                % (
+                    "  " * depth + name,
+                    calls,
+                    "-" if peak is None else "%.1f" % (peak / 1024.0),
+                    retained / 1024.0,
+                )
+            )
+        if self.peak:
+            lines.append(
+                "%-32s %7s %12.1f %12.1f"
+                % (
+                    "total",
+                    "",
+                    self.peak[1] / 1024.0,
+                    self.peak[0] / 1024.0,
+                )
+            )
+        top = self.top(limit)
+        if top:
+            lines.append("")
+            lines.append("%12s %9s  %s" % ("KiB", "blocks", "top allocations"))
+            for stat in top:
+                frame = stat.traceback[0]
+                lines.append(
+                    "%12.1f %9d  %s:%d"
+                    % (
+                        stat.size / 1024.0,
+                        stat.count,
+                        frame.filename,
+                        frame.lineno,
+                    )
+                )
+        return "\n".join(lines)
+
+
+class _Phase(object):
+    """Context manager measuring a phase with the active recorders."""
+
+    __slots__ = ("name", "args", "recorders", "tokens")
+
+    def __init__(self, name, args, recorders):
+        self.name = name
+        self.args = args
+        self.recorders = recorders
+        self.tokens = []
+
+    def __enter__(self):
+        self.tokens = [
+            recorder.enter(self.name, self.args) for recorder in self.recorders
+        ]
+        return self
+
+    def __exit__(self, *_):
+        for recorder, token in reversed(
+            list(zip(self.recorders, self.tokens))
+        ):
+            recorder.exit(self.name, self.args, token)
+
+
+class _NoPhase(object):
+    """Context manager doing nothing, phase() when no recorder is active."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        pass
+
+
+_NO_PHASE = _NoPhase()
+# active Timings, Tracer and MemoryUsage, empty when disabled
+_RECORDERS = ()
+
+
+def _recorder_start(recorder):
+    """Activate a recorder, replacing any of the same type."""
+    global _RECORDERS  # pylint: disable=global-statement
+    _RECORDERS = tuple(
+        active for active in _RECORDERS if type(active) is not type(recorder)
+    ) + (recorder,)
+    return recorder
+
+
+def _recorder_stop(kind):
+    """Deactivate the recorder of a type, None if it was not active."""
+    global _RECORDERS  # pylint: disable=global-statement
+    for recorder in _RECORDERS:
+        if isinstance(recorder, kind):
+            _RECORDERS = tuple(
+                active for active in _RECORDERS if active is not recorder
+            )
+            return recorder
+    return None
+
+
+def timings_start():
+    """Enable phase timings.
+
+    Returns:
+        Timings: filled by phase() until timings_stop().
+    """
+    return _recorder_start(Timings())
+
+
+def timings_stop():
+    """Disable phase timings.
+
+    Returns:
+        Timings: stopped timings, None if they were not started.
+    """
+    timings = _recorder_stop(Timings)
+    if timings is not None:
+        timings.stop()
+    return timings
+
+
+def trace_start():
+    """Enable tracing of phases.
+
+    Returns:
+        Tracer: filled by phase() until trace_stop().
+    """
+    return _recorder_start(Tracer())
+
+
+def trace_stop():
+    """Disable tracing of phases.
+
+    Returns:
+        Tracer: None if tracing was not started.
+    """
+    return _recorder_stop(Tracer)
+
+
+def memory_start(frames=1):
+    """Enable memory usage of phases, starts tracemalloc.
+
+    Args:
+        frames (int, optional): frames kept per allocation.
+
+    Returns:
+        MemoryUsage: filled by phase() until memory_stop().
+    """
+    return _recorder_start(MemoryUsage(frames))
+
+
+def memory_stop():
+    """Disable memory usage of phases.
+
+    Returns:
+        MemoryUsage: stopped, None if it was not started.
+    """
+    memory = _recorder_stop(MemoryUsage)
+    if memory is not None:
+        memory.stop()
+    return memory
+
+
+def get_trace_path():
+    """Get trace file from ``EXABGPCTL_TRACE`` environment variable.
+
+    Returns:
+        str: trace path, None (tracing disabled) by default.
+    """
+    return os.environ.get("EXABGPCTL_TRACE") or None
+
+
+def phase(name, **args):
+    """Measure a block with the active recorders (timings, tracing, memory),
+    almost free when none is active.
+
+    Args:
+        name (str): phase name, measures of phases with the same name are
+            summed.
+        **args: span arguments shown in the trace (process, address...).
+
+    Returns:
+        context manager
+
+    Examples:
+        >>> with phase("render"):
+        ...     print_json(data)
+        >>> with phase("tcping", address="192.168.0.1", port=179):
+        ...     tcping("192.168.0.1", 179)
+    """
+    if not _RECORDERS:
+        return _NO_PHASE
+    return _Phase(name, args, _RECORDERS)
+
+
+class Config(dict):
+    """Config returned by config_load.
+
+    It's a plain dict for callers and printers, with processes and neighbors
+    indexed by name and disabled processes memoized. They are rebuilt when
+    the list is replaced or resized.
+
+    Examples:
+        >>> cfg = Config(processes=[{"name": "service1.exabgp.lan"}])
+        >>> cfg.index("processes")["service1.exabgp.lan"]
+        {'name': 'service1.exabgp.lan'}
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(Config, self).__init__(*args, **kwargs)
+        self._memo = {}
+
+    def _memoize(self, name, key, func):
+        """Memoize func(self[key]) until self[key] is replaced or resized."""
+        items = self[key]
+        cached = self._memo.get(name)
+        if cached is None or cached[0] is not items or cached[1] != len(items):
+            cached = (items, len(items), func(items))
+            self._memo[name] = cached
+        return cached[2]
+
+    def index(self, key):
+        """Get items of a list (processes or neighbors) indexed by name.
+
+        Args:
+            key (str): list to index.
+
+        Returns:
+            dict: item for each name, first one wins on duplicates.
+        """
+        return self._memoize("index:" + key, key, _index_by_name)
+
+    def disabled(self):
+        """Get disabled processes, maintenance files are scanned only once.
+
+        Returns:
+            set: names of disabled processes.
+        """
+        return self._memoize("disabled", "processes", _scan_disabled)
+
+    def set_disabled(self, name, disabled):
+        """Update memoized disabled processes after a change.
+
+        Args:
+            name (str): process name.
+            disabled (bool): True if the maintenance file exists.
+        """
+        if disabled:
+            self.disabled().add(name)
+        else:
+            self.disabled().discard(name)
+
+    def memoize(self, name, key, value):
+        """Store a value computed by the caller, used until self[key] is
+        replaced or resized.
+
+        Args:
+            name (str): ``disabled`` or ``index:<key>``.
+            key (str): list the value is computed from.
+            value: memoized value.
+        """
+        items = self[key]
+        self._memo[name] = (items, len(items), value)
+
+    def refresh_disabled(self, names=(), dirs=()):
+        """Check again the maintenance files of some processes.
+
+        Args:
+            names (iterable): processes whose maintenance file changed, one
+                stat each.
+            dirs (iterable): maintenance dirs which changed, read once each.
+        """
+        names, dirs = set(names), set(dirs)
+        disabled = self.disabled()
+        scan = []
+        for process in self["processes"]:
+            path = process["run"].get("disable")
+            if not path:
+                continue
+            if os.path.dirname(path) in dirs:
+                disabled.discard(process["name"])
+                scan.append(process)
+            elif process["name"] in names:
+                self.set_disabled(process["name"], os.path.exists(path))
+        disabled.update(_scan_disabled(scan))
+
+    def reset(self, name=None):
+        """Forget memoized values, they are rebuilt on next access.
+
+        Args:
+            name (str, optional): ``disabled`` or ``index:<key>``, all when
+                not set.
+        """
+        if name is None:
+            self._memo.clear()
+        else:
+            self._memo.pop(name, None)
+
+
+def _index_by_name(items):
+    """Index items by name, first one wins on duplicates."""
+    return {item["name"]: item for item in reversed(items)}
+
+
+def _scan_disabled(processes):
+    """Find processes with a maintenance file.
+
+    Maintenance files are grouped by directory and each directory is read
+    once, instead of a stat per process.
+    """
+    by_dir = collections.defaultdict(lambda: collections.defaultdict(list))
+    for process in processes:
+        path = process["run"].get("disable")
+        if path:
+            dirname, basename = os.path.split(path)
+            by_dir[dirname][basename].append(process["name"])
+
+    disabled = set()
+    for dirname, files in iteritems(by_dir):
+        for basename in _existing_files(dirname, files):
+            disabled.update(files[basename])
+    return disabled
+
+
+def _existing_files(dirname, basenames):
+    """Get which basenames exist in dirname with one directory read."""
+    # trailing slash, nothing to list
+    if "" in basenames and os.path.exists(dirname):
+        yield ""
+    try:
+        if scandir is None:
+            entries = [(name, None) for name in os.listdir(dirname or ".")]
+        else:
+            entries = [(e.name, e) for e in scandir(dirname or ".")]
+    except OSError:
+        return
+    for name, entry in entries:
+        if name not in basenames:
+            continue
+        # broken symlinks don't exist for os.path.exists
+        if entry is not None and entry.is_symlink():
+            if not os.path.exists(entry.path):
+                continue
+        yield name
+
+
+def _get_disabled(cfg):
+    """Get disabled processes from a Config or a plain dict config."""
+    if isinstance(cfg, Config):
+        return cfg.disabled()
+    return _scan_disabled(cfg["processes"])
+
+
+def _get_index(cfg, key):
+    """Get name index from a Config or a plain dict config."""
+    if isinstance(cfg, Config):
+        return cfg.index(key)
+    return _index_by_name(cfg[key])
+
+
+def config_load(cache=None, path=None, state=None):
     """ExaBGP config loader.
     Loader will use exabgp lib to load the config like exabgp did
 
     Returns:
-        dict: configuration with path, state, version, neighbors and processes.
+        Config: configuration with path, state, version, neighbors and
+                processes.
 
     Examples:
         >>> import os
@@ -143,20 +792,25 @@ def config_load():
             ]
         }
 
+    The parsed result is cached in ``<state>/.exabgpctl/config.json`` and
+    reused as long as the conf file (mtime, size and content), exabgp and
+    exabgpctl versions are unchanged. Set ``EXABGPCTL_CACHE=0`` or
+    ``cache=False`` to always parse the conf file.
+
+    Args:
+        cache (bool, optional): use the on-disk cache, defaults to
+            ``EXABGPCTL_CACHE`` environment variable (enabled).
+        path (str, optional): exabgp conf, defaults to get_conf_path().
+        state (str, optional): state dir, defaults to get_state_path().
+
     Raises:
         ExabgpCTLError: if the conf file doesn't exists.
 
     See Also:
         github.com/Exa-Networks/exabgp/qa/tests/parsing_test.py
     """
-    environ = environment.setup("")
-    environ.log.enable = True
-    environ.log.all = False
-    environ.log.configuration = False
-    environ.log.parser = False
-
-    path = os.environ.get("EXABGPCTL_CONF", "/etc/exabgp/exabgp.conf")
-    state = os.environ.get("EXABGPCTL_STATE", "/var/lib/exabgp/status")
+    path = path or get_conf_path()
+    state = state or get_state_path()
 
     if not os.path.exists(path):
         raise ExabgpCTLError("ExaBGP conf file %s doesn't exists" % str(path))
@@ -164,16 +818,72 @@ def config_load():
     if not os.path.exists(state):
         raise ExabgpCTLError("ExaBGP state dir %s doesn't exists" % str(state))
 
-    cfg = Configuration([os.path.abspath(path)])
-    cfg.reload()
+    if cache is None:
+        cache = os.environ.get("EXABGPCTL_CACHE", "1") != "0"
+
+    key = None
+    result = None
+    if cache:
+        with phase("cache read"):
+            key = _config_cache_key(path)
+            result = _config_cache_read(state, key)
+
+    if result is None:
+        with phase("parse"):
+            result = _config_parse(path)
+        if cache:
+            with phase("cache write"):
+                _config_cache_write(state, key, result)
+
+    result.update({"path": path, "state": state, "version": get_version()})
+    return Config(result)
+
+
+def get_conf_path():
+    """Get exabgp conf path from ``EXABGPCTL_CONF`` environment variable.
+
+    Returns:
+        str: conf path, defaults to /etc/exabgp/exabgp.conf.
+    """
+    return os.environ.get("EXABGPCTL_CONF", "/etc/exabgp/exabgp.conf")
 
-    result = {
-        "path": path,
-        "state": state,
-        "processes": [],
-        "neighbors": [],
-        "version": get_version(),
-    }
+
+def get_state_path():
+    """Get state dir from ``EXABGPCTL_STATE`` environment variable.
+
+    Returns:
+        str: state dir, defaults to /var/lib/exabgp/status.
+    """
+    return os.environ.get("EXABGPCTL_STATE", "/var/lib/exabgp/status")
+
+
+def _config_parse(path):
+    """Parse the exabgp conf file and normalize processes and neighbors.
+
+    Healthcheck arguments of the previous parse of the same conf are reused
+    for unchanged run lines (see _parse_run).
+    """
+    # pylint: disable=import-outside-toplevel
+    with phase("import exabgp"):
+        from exabgp.configuration.setup import environment
+
+        try:
+            from exabgp.configuration.ancient import Configuration
+        except ImportError:
+            from exabgp.configuration.configuration import Configuration
+
+    with phase("environment.setup"):
+        environ = environment.setup("")
+        environ.log.enable = True
+        environ.log.all = False
+        environ.log.configuration = False
+        environ.log.parser = False
+
+    with phase("Configuration.reload"):
+        cfg = Configuration([os.path.abspath(path)])
+        cfg.reload()
+
+    result = {"processes": [], "neighbors": []}
 
     if isinstance(cfg.process, dict):
         _processes = cfg.process
@@ -185,19 +895,22 @@ def config_load():
     else:
         _neighbors = cfg.__dict__["neighbors"]
 
-    sys_argv = sys.argv
+    path = os.path.abspath(path)
+    with _RUNS_LOCK:
+        known = _RUNS.get(path, {})
+    used = {}
     for svc, params in iteritems(_processes):
-        item = params.copy()
-        sys.argv = params["run"]
-        item["run"] = healthcheck.parse().__dict__
-        ips = {}
-        for ipaddr in item["run"]["ips"]:
-            ips.update(_parse_ip(ipaddr))
-        item["run"]["ips"] = ips
-        item["run"]["next_hop"] = _parse_ip(item["run"]["next_hop"])
-        item["name"] = svc
+        run = _parse_run(params["run"], known, used)
+        with phase("normalize"):
+            item = _normalize(dict(params, run=None, name=svc))
+        item["run"] = run
         result["processes"].append(item)
-    sys.argv = sys_argv
+    # keep only run lines of this conf, for the last RUNS_CACHE_SIZE confs
+    with _RUNS_LOCK:
+        _RUNS.pop(path, None)
+        while _RUNS and len(_RUNS) >= RUNS_CACHE_SIZE:
+            _RUNS.popitem(last=False)
+        _RUNS[path] = used
 
     for neighbor in itervalues(_neighbors):
         item = neighbor.__dict__.copy()
@@ -218,9 +931,406 @@ def config_load():
         )
         result["neighbors"].append(item)
 
+    with phase("normalize"):
+        result["neighbors"] = _normalize(result["neighbors"])
     return result
 
 
+# parsed healthcheck arguments of the last parse of each conf, by argv hash
+_RUNS = collections.OrderedDict()
+_RUNS_LOCK = threading.Lock()
+
+
+def _parse_run(argv, known, used):
+    """Parsed and normalized healthcheck arguments of a run line.
+
+    Args:
+        argv (list): run line.
+        known (dict): results of the previous parse of the conf.
+        used (dict): results of this parse, updated.
+
+    Returns:
+        dict: healthcheck arguments.
+    """
+    key = hashlib.sha1(
+        u"\0".join(text_type(arg) for arg in argv).encode("utf-8")
+    ).digest()
+    run = used.get(key) or known.get(key)
+    if run is None:
+        with phase("healthcheck.parse"):
+            run = healthcheck_parse(argv).__dict__
+        with phase("_parse_ip"):
+            ips = {}
+            for ipaddr in run["ips"]:
+                ips.update(_parse_ip(ipaddr))
+            run["ips"] = ips
+            run["next_hop"] = _parse_ip(run["next_hop"])
+        with phase("normalize"):
+            run = _normalize(run)
+    # --config file content may change, its arguments are parsed again
+    if run["config"] is None:
+        used[key] = run
+        # callers may change their run, the memoized one is kept intact
+        run = copy.deepcopy(run)
+    return run
+
+
+def healthcheck_parse(argv):
+    """Parse healthcheck arguments like exabgp ``healthcheck.parse`` but
+    from an explicit argument list, sys.argv is untouched.
+
+    The exabgp parser is built once and shared, calls are thread-safe.
+
+    Args:
+        argv (list): run line, program first.
+
+    Returns:
+        argparse.Namespace: healthcheck options.
+
+    Raises:
+        SystemExit: on invalid arguments, like argparse.
+
+    Examples:
+        >>> healthcheck_parse(["healthcheck", "--ip", "10.0.0.1/32"]).ips
+        [IPv4Network('10.0.0.1/32')]
+    """
+    parser = _healthcheck_parser()
+    options = parser.parse_args(argv[1:])
+    if options.config is not None:
+        # same as exabgp: file lines are arguments, before the command line
+        args = []
+        for line in options.config.readlines():
+            line = line.strip()
+            if line and not line.startswith("#"):
+                args.extend(
+                    arg.strip() for arg in ("--" + line).split("=", 1)
+                )
+        options.config.close()
+        args.extend(argv[1:])
+        options = parser.parse_args(args)
+    return options
+
+
+class _ParserBuilt(Exception):
+    """Raised by the first parse_args of _healthcheck_parser parsers with
+    the built parser."""
+
+    def __init__(self, parser):
+        Exception.__init__(self)
+        self.parser = parser
+
+
+# exabgp healthcheck parser, built once by _healthcheck_parser
+_HEALTHCHECK_PARSER = None
+_HEALTHCHECK_LOCK = threading.Lock()
+
+
+def _healthcheck_parser():
+    """The argparse parser of exabgp healthcheck.
+
+    ``healthcheck.parse`` builds the parser and parses sys.argv. A copy of
+    it is run once with its own ``argparse`` whose parser hands itself over
+    on the first parse_args, neither argparse nor exabgp are changed.
+    """
+    global _HEALTHCHECK_PARSER  # pylint: disable=global-statement
+    if _HEALTHCHECK_PARSER is None:
+        with _HEALTHCHECK_LOCK:
+            if _HEALTHCHECK_PARSER is None:
+                # pylint: disable=import-outside-toplevel
+                import types
+                import argparse
+                from exabgp.application import healthcheck
+
+                class Parser(argparse.ArgumentParser):
+                    """Parser raising _ParserBuilt on the first parse."""
+
+                    built = False
+
+                    def parse_args(self, args=None, namespace=None):
+                        if not self.built:
+                            self.built = True
+                            raise _ParserBuilt(self)
+                        return argparse.ArgumentParser.parse_args(
+                            self, args, namespace
+                        )
+
+                module = types.ModuleType(argparse.__name__)
+                module.__dict__.update(vars(argparse))
+                module.ArgumentParser = Parser
+                parse = types.FunctionType(
+                    healthcheck.parse.__code__,
+                    dict(vars(healthcheck), argparse=module),
+                )
+                try:
+                    parse()
+                except _ParserBuilt as built:
+                    _HEALTHCHECK_PARSER = built.parser
+                else:
+                    raise ExabgpCTLError(
+                        "Unable to get exabgp healthcheck parser"
+                    )
+    return _HEALTHCHECK_PARSER
+
+
+def _normalize(data):
+    """Convert exabgp objects (IP, Counter, tuples...) to JSON types."""
+    if isinstance(data, dict):
+        return {
+            key if isinstance(key, string_types) else text_type(key): (
+                _normalize(value)
+            )
+            for key, value in iteritems(data)
+        }
+    if isinstance(data, (list, tuple, set)):
+        return [_normalize(value) for value in data]
+    if data is None or isinstance(data, (bool, int, float) + string_types):
+        return data
+    if isinstance(data, IPInfo):
+        return data
+    return text_type(data)
+
+
+def json_default(obj):
+    """JSON encoder ``default``, lazy mappings (IPInfo) as objects.
+
+    Examples:
+        >>> json.dumps(config_load(), default=json_default)
+    """
+    if isinstance(obj, Mapping):
+        return dict(obj)
+    raise TypeError("%r is not JSON serializable" % (obj,))
+
+
+def _config_cache_key(path):
+    """Build the cache key of a conf file."""
+    # pylint: disable=import-outside-toplevel
+    from exabgp.version import version as exabgp_version
+
+    stat = os.stat(path)
+    with open(path, "rb") as fds:
+        digest = hashlib.sha256(fds.read()).hexdigest()
+    return {
+        "path": os.path.abspath(path),
+        "mtime": stat.st_mtime,
+        "size": stat.st_size,
+        "sha256": digest,
+        "exabgp": exabgp_version,
+        "exabgpctl": exabgpctl_version,
+        "python": "%d.%d.%d" % sys.version_info[:3],
+    }
+
+
+def _config_cache_read(state, key):
+    """Return the cached config if the key matches, None otherwise."""
+    try:
+        with open(os.path.join(state, CACHE_DIR, "config.json")) as fds:
+            data = json.load(fds, object_hook=_cache_object_hook)
+    except (IOError, OSError, ValueError, TypeError, AttributeError):
+        return None
+    if not isinstance(data, dict) or data.get("key") != key:
+        return None
+    if _uses_config_files(data.get("config")):
+        return None
+    return data.get("config")
+
+
+def _config_cache_write(state, key, config):
+    """Store the config in the cache, ignore errors (ie read-only state).
+
+    Configs with healthcheck ``--config`` files are not cached, the key
+    only covers the exabgp conf.
+    """
+    if _uses_config_files(config):
+        return
+    try:
+        atomic_write(
+            os.path.join(state, CACHE_DIR, "config.json"),
+            json.dumps({"key": key, "config": config}, default=_cache_default),
+        )
+    except (IOError, OSError):
+        pass
+
+
+# marker of an IPInfo stored in the cache by its IP only
+CACHE_IP_KEY = "__ip__"
+
+
+def _cache_default(obj):
+    """JSON encoder ``default`` of the cache, an IPInfo is stored as its IP
+    type and text so none of its lazy fields are computed."""
+    if isinstance(obj, IPInfo):
+        return {CACHE_IP_KEY: [type(obj.ip).__name__, text_type(obj.ip)]}
+    return json_default(obj)
+
+
+def _cache_object_hook(obj):
+    """JSON decoder ``object_hook`` of the cache, IPInfo back from the IP
+    stored by _cache_default.
+
+    Raises:
+        AttributeError: if the IP type is unknown.
+    """
+    if len(obj) == 1 and CACHE_IP_KEY in obj:
+        # pylint: disable=import-outside-toplevel
+        from exabgp.vendoring import ipaddress
+
+        kind, text = obj[CACHE_IP_KEY]
+        return _ip_info(getattr(ipaddress, kind)(text_type(text)))
+    return obj
+
+
+def _uses_config_files(config):
+    """Whether a healthcheck of the config reads a ``--config`` file."""
+    try:
+        return any(
+            (process.get("run") or {}).get("config") is not None
+            for process in config["processes"]
+        )
+    except (KeyError, TypeError, AttributeError):
+        return False
+
+
+def atomic_write(path, data):
+    """Write data in a temp file then rename it to path.
+
+    Readers will see the old or the new content, never a truncated file.
+    Missing parent directory is created.
+
+    Args:
+        path (str): file path.
+        data (str): file content.
+    """
+    dirname = os.path.dirname(os.path.abspath(path))
+    try:
+        os.makedirs(dirname)
+    except OSError as err:
+        if err.errno != errno.EEXIST:
+            raise
+    fdesc, tmp = tempfile.mkstemp(
+        dir=dirname, prefix="." + os.path.basename(path) + "."
+    )
+    try:
+        # mkstemp creates 0600 files, use the same mode as open()
+        os.chmod(tmp, 0o666 & ~_umask())
+        with os.fdopen(fdesc, "w") as fds:
+            fds.write(data)
+        os.rename(tmp, path)
+    except Exception:
+        os.unlink(tmp)
+        raise
+
+
+def _umask(cache=[]):  # pylint: disable=dangerous-default-value
+    """Get process umask, read only once."""
+    if not cache:
+        cache.append(os.umask(0o022))
+        os.umask(cache[0])
+    return cache[0]
+
+
+def completion_index():
+    """Get names used by shell completion without parsing the config.
+
+    The index is stored in ``<state>/.exabgpctl/completion.json`` and
+    rebuilt (using config_load) only when the conf file or a maintenance
+    directory changed, so reading it never imports exabgp.
+
+    Returns:
+        dict: processes, neighbors, enabled and disabled process names.
+
+    Raises:
+        ExabgpCTLError: if the conf file or state dir doesn't exists.
+
+    Examples:
+        >>> completion_index()
+        {
+            'processes': ['service1.exabgp.lan', 'service2.exabgp.lan'],
+            'neighbors': ['192.168.0.1', '192.168.0.2'],
+            'enabled': ['service2.exabgp.lan'],
+            'disabled': ['service1.exabgp.lan']
+        }
+    """
+    path = os.path.join(get_state_path(), CACHE_DIR, "completion.json")
+    try:
+        with open(path) as fds:
+            data = json.load(fds)
+        if data["signature"] == config_signature(
+            get_conf_path(), data["signature"]["dirs"]
+        ):
+            return data["index"]
+    except (IOError, OSError, ValueError, KeyError, TypeError):
+        pass
+
+    cfg = config_load()
+    dirs = maintenance_dirs(cfg)
+    # signature is taken before listing so changes made meanwhile are seen
+    # on next call
+    signature = config_signature(cfg["path"], dirs)
+    index = {
+        "processes": list_processes(cfg),
+        "neighbors": list_neighbors(cfg),
+        "enabled": list_enabled_processes(cfg),
+        "disabled": list_disabled_processes(cfg),
+    }
+    try:
+        atomic_write(
+            path, json.dumps({"signature": signature, "index": index})
+        )
+    except (IOError, OSError):
+        pass
+    return index
+
+
+def maintenance_dirs(cfg):
+    """Directories holding maintenance files of processes.
+
+    Args:
+        cfg (dict): config returned by config_load.
+
+    Returns:
+        list: sorted directory paths.
+    """
+    return sorted(
+        set(
+            os.path.dirname(process["run"]["disable"])
+            for process in cfg["processes"]
+            if process["run"].get("disable")
+        )
+    )
+
+
+def config_signature(conf, dirs):
+    """Modification times of the conf file and maintenance dirs.
+
+    A maintenance file created or removed changes the mtime of its dir.
+
+    Args:
+        conf (str): conf file path.
+        dirs (list): maintenance dirs, see maintenance_dirs.
+
+    Returns:
+        dict: conf path, mtime and size, mtime of each dir.
+    """
+
+    def mtime(path):
+        """mtime in ns when available, None if the path doesn't exists"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return getattr(stat, "st_mtime_ns", stat.st_mtime)
+
+    stat = os.stat(conf)
+    return {
+        "conf": [
+            os.path.abspath(conf),
+            getattr(stat, "st_mtime_ns", stat.st_mtime),
+            stat.st_size,
+        ],
+        "dirs": {dirname: mtime(dirname) for dirname in dirs},
+    }
+
+
 def get_version(key=None):
     """Get module, deps and platform version informations.
 
@@ -242,6 +1352,10 @@ def get_version(key=None):
         >>> get_version("exabgpctl")
         '19.01-1'
     """
+    # pylint: disable=import-outside-toplevel
+    import platform
+    from exabgp.version import version as exabgp_version
+
     data = {
         "exabgp": exabgp_version,
         "exabgpctl": exabgpctl_version,
@@ -253,12 +1367,13 @@ def get_version(key=None):
     return data
 
 
-def tcping(address, port):
+def tcping(address, port, timeout=PROBE_TIMEOUT):
     """Like tcping tools, will test if the address:port is open.
 
     Args:
         address (str): target address ip.
         port (int): target port.
+        timeout (float, optional): connect timeout in seconds, defaults to 1.
 
     Returns:
         bool: True if address:port is open.
@@ -269,13 +1384,14 @@ def tcping(address, port):
     """
     result = 1
     sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    sock.settimeout(1)
+    sock.settimeout(timeout)
     try:
         result = sock.connect_ex((address, port))
     # catch all errors
     # pylint: disable=broad-except
     except Exception as err:
-        print(err)
+        # probes run in threads, stdout is the command output
+        print("%s:%s: %s" % (address, port, err), file=sys.stderr)
         result = -1
     finally:
         sock.close()
@@ -283,6 +1399,42 @@ def tcping(address, port):
     return (result == 0, result)
 
 
+class TokenBucket(object):
+    """Thread-safe token bucket, allows ``rate`` acquisitions per second with
+    bursts up to ``burst``.
+
+    Args:
+        rate (float): tokens added per second.
+        burst (int, optional): bucket size, defaults to max(1, rate).
+
+    Examples:
+        >>> bucket = TokenBucket(10)
+        >>> bucket.acquire()  # blocks until a token is available
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(1, self.rate))
+        self.tokens = self.capacity
+        self.last = monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Take a token, wait until one is available."""
+        while True:
+            with self.lock:
+                now = monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.last) * self.rate
+                )
+                self.last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
 def flat(data, prefix=None):
     """Flat the dict
 
@@ -315,30 +1467,71 @@ def flat(data, prefix=None):
         }
 
     See Also:
+        * iter_flat
         * github.com/ahmet2mir/python-snippets/snippets/flat_unflat_dict.py
     """
+    return dict(iter_flat(data, prefix))
+
+
+def iter_flat(data, prefix=None):
+    """Flat the dict, generate (key, value) sorted by key.
+
+    Nested dicts are walked with an explicit stack, keys are built once and
+    sorted at the end (the walk already follows sorted keys so sort is
+    almost free). When many values get the same key the last one wins, like
+    flat.
+
+    Args:
+        data (dict): the dict (or list) to flat.
+        prefix (str, optional): prefix key with a str value, defaults is None.
+
+    Yields:
+        tuple: flat key and value.
+
+    Examples:
+        >>> list(iter_flat({"key1": {"key11": "value11"}, "key2": ["one"]}))
+        [('key1__key11', 'value11'), ('key2[0]', 'one')]
+    """
     separator = "__"
     lseparator = ("[", "]")
     items = []
-    for k in sorted(data.keys()):
-        new_key = k
-        if prefix:
-            new_key = prefix + separator + k
-        if isinstance(data[k], dict):
-            items.extend(flat(data[k], new_key).items())
+    # (key, value, expand) where expand means value is a dict/list to walk
+    stack = [(prefix, data, True)]
+    while stack:
+        key, value, expand = stack.pop()
+        if not expand:
+            items.append((key, value))
+            continue
+
+        children = []
+        if isinstance(value, list):
+            for i, item in enumerate(value):
+                children.append(
+                    (
+                        (key or "") + lseparator[0] + str(i) + lseparator[1],
+                        item,
+                        isinstance(item, (MutableMapping, IPInfo)),
+                    )
+                )
         else:
-            if isinstance(data[k], list):
-                for i, value in enumerate(data[k]):
-                    pkey = new_key + lseparator[0] + str(i) + lseparator[1]
-                    if isinstance(value, collections.MutableMapping):
-                        flated = flat(value, pkey)
-                        items.extend(flated.items())
-                    else:
-                        items.append((pkey, value))
-            else:
-                items.append((new_key, data[k]))
-
-    return dict(items)
+            for k in sorted(value.keys()):
+                item = value[k]
+                children.append(
+                    (
+                        key + separator + k if key else k,
+                        item,
+                        isinstance(item, (dict, list, IPInfo)),
+                    )
+                )
+        children.reverse()
+        stack.extend(children)
+
+    items.sort(key=operator.itemgetter(0))
+    for i, item in enumerate(items):
+        # duplicated keys are contiguous, keep the last one
+        if i + 1 < len(items) and items[i + 1][0] == item[0]:
+            continue
+        yield item
 
 
 def print_flat(data):
@@ -371,9 +1564,8 @@ def print_flat(data):
     if not isinstance(data, dict) and not isinstance(data, list):
         print(data)
     else:
-        flat_data = flat(data)
-        for key in sorted(iterkeys(flat_data)):
-            print("{}={}".format(key, flat_data[key]))
+        for key, value in iter_flat(data):
+            print("{}={}".format(key, value))
 
 
 def print_json(data):
@@ -416,7 +1608,185 @@ def print_json(data):
     if not isinstance(data, dict) and not isinstance(data, list):
         print(data)
     else:
-        print(json.dumps(data, indent=4))
+        _write_json(data, json.JSONEncoder(indent=4, default=json_default))
+
+
+def print_json_compact(data):
+    """Print data in json mode without whitespace.
+
+    If data is not hash or list, will only print raw value.
+
+    Args:
+        data (dict): data to print.
+
+    Examples:
+        >>> print_json_compact({"key1": {"key11": "value11"}, "key2": [1, 2]})
+        {"key1":{"key11":"value11"},"key2":[1,2]}
+    """
+    if not isinstance(data, dict) and not isinstance(data, list):
+        print(data)
+    else:
+        _write_json_compact(
+            data,
+            json.JSONEncoder(separators=(",", ":"), default=json_default),
+        )
+
+
+def _write_json(data, encoder):
+    """Encode and write chunk by chunk instead of building the whole
+    document, output is the same as ``encoder.encode(data)``."""
+    write = sys.stdout.write
+    chunks = []
+    for chunk in encoder.iterencode(data):
+        chunks.append(chunk)
+        if len(chunks) >= 1024:
+            write("".join(chunks))
+            del chunks[:]
+    chunks.append("\n")
+    write("".join(chunks))
+
+
+def _write_json_compact(data, encoder):
+    """Write each top-level item encoded by ``encoder.encode``, which uses
+    the C encoder (no indent) unlike iterencode, output is the same as
+    ``encoder.encode(data)``."""
+    write = sys.stdout.write
+    if isinstance(data, dict):
+        # one item mappings keep json key conversions (int, None...)
+        pieces = (
+            encoder.encode({key: value})[1:-1]
+            for key, value in iteritems(data)
+        )
+        opening, closing = "{", "}\n"
+    else:
+        pieces = (encoder.encode(item) for item in data)
+        opening, closing = "[", "]\n"
+    write(opening)
+    for index, piece in enumerate(pieces):
+        write("," + piece if index else piece)
+    write(closing)
+
+
+def print_msgpack(data):
+    """Print data in msgpack binary mode.
+
+    Unlike other outputs, raw values are packed too, unknown objects are
+    packed as strings.
+
+    Args:
+        data (dict): data to print.
+    """
+    # pylint: disable=import-outside-toplevel
+    import msgpack
+
+    packed = msgpack.packb(data, use_bin_type=True, default=_msgpack_default)
+    sys.stdout.flush()
+    getattr(sys.stdout, "buffer", sys.stdout).write(packed)
+    sys.stdout.flush()
+
+
+def _msgpack_default(obj):
+    """msgpack ``default``, lazy mappings (IPInfo) as maps, anything else
+    as string."""
+    if isinstance(obj, Mapping):
+        return dict(obj)
+    return text_type(obj)
+
+
+class ByInstance(dict):
+    """Results of a command by exabgp instance name (``--instance``).
+
+    A plain dict for printers, except ndjson which prints the records of
+    each instance with an ``instance`` key.
+    """
+
+
+def print_ndjson(data):
+    """Print data in newline delimited json mode, one record per line.
+
+    Each process and neighbor of ``processes`` and ``neighbors`` sections
+    (dump, status) is a record with a ``kind`` key, remaining keys are a
+    ``config`` record. A list prints one item per line, anything else is a
+    single record. Records of ByInstance results have an ``instance`` key,
+    items which are not objects are its ``value``.
+
+    If data is not hash or list, will only print raw value.
+
+    Args:
+        data (dict): data to print.
+
+    Examples:
+        >>> print_ndjson(status)
+        {"kind":"process","name":"service1.exabgp.lan","state":"UP",...}
+        {"kind":"process","name":"service2.exabgp.lan","state":"DOWN",...}
+        {"kind":"neighbor","name":"192.168.0.1","status":true,...}
+        >>> print_ndjson(["service1.exabgp.lan", "service2.exabgp.lan"])
+        "service1.exabgp.lan"
+        "service2.exabgp.lan"
+        >>> print_ndjson(ByInstance(edge=["service1.exabgp.lan"]))
+        {"instance":"edge","value":"service1.exabgp.lan"}
+    """
+    if not isinstance(data, dict) and not isinstance(data, list):
+        print(data)
+        return
+
+    write = sys.stdout.write
+    encode = json.JSONEncoder(
+        separators=(",", ":"), default=json_default
+    ).encode
+    for record in _ndjson_records(data):
+        write(encode(record) + "\n")
+
+
+def _ndjson_records(data):
+    """Split data into ndjson records."""
+    if isinstance(data, ByInstance):
+        return _ndjson_instance_records(data)
+    if isinstance(data, list):
+        return iter(data)
+
+    sections = [
+        key
+        for key in sorted(data)
+        if key in NDJSON_SECTIONS and isinstance(data[key], (dict, list))
+    ]
+    if not sections:
+        return iter([data])
+    return _ndjson_section_records(data, sections)
+
+
+def _ndjson_record(record, item):
+    """record updated with item, or with item as ``value`` if not a dict."""
+    if isinstance(item, dict):
+        record.update(item)
+    else:
+        record["value"] = item
+    return record
+
+
+def _ndjson_instance_records(data):
+    """Records of each instance result, tagged with the instance name."""
+    for instance, value in iteritems(data):
+        for item in _ndjson_records(value):
+            yield _ndjson_record({"instance": instance}, item)
+
+
+def _ndjson_section_records(data, sections):
+    """A config record of keys out of sections, then a record per item of
+    each section (processes, neighbors) tagged with its kind."""
+    rest = dict((k, v) for k, v in iteritems(data) if k not in sections)
+    if rest:
+        yield _ndjson_record({"kind": "config"}, rest)
+
+    for key in sections:
+        kind = NDJSON_SECTIONS[key]
+        items = data[key]
+        if isinstance(items, list):
+            for item in items:
+                yield _ndjson_record({"kind": kind}, item)
+        else:
+            for name in sorted(items):
+                yield _ndjson_record({"kind": kind, "name": name}, items[name])
 
 
 def print_yaml(data):
@@ -451,47 +1821,332 @@ def print_yaml(data):
           - two
           - three
     """
-    # Hack to enhance Yaml dump ident and unicode
-    class MyDumper(yaml.Dumper):  # pylint: disable=too-many-ancestors
-        """Extend yaml dumper to print better indent on list"""
-
-        def increase_indent(self, flow=False, indentless=False):
-            return super(MyDumper, self).increase_indent(flow, False)
-
     if not isinstance(data, dict) and not isinstance(data, list):
         print(data)
     else:
-        MyDumper.add_representer(string_types, SafeRepresenter.represent_str)
-        # pylint: disable=no-member
-        if hasattr(SafeRepresenter, "represent_unicode"):
-            MyDumper.add_representer(
-                text_type, SafeRepresenter.represent_unicode
-            )
         print("---")
-        print(
-            yaml.dump(
-                data, default_flow_style=False, width=179, Dumper=MyDumper
+        print(yaml_dump(data))
+
+
+def yaml_dump(data, backend=None):
+    """Dump data to yaml using a dumper built once.
+
+    libyaml (C) emitter is used when available and data only has short
+    one-line scalars and scalar keys (see _yaml_libyaml_safe), its
+    indentless sequences are re-indented so both backends give the same
+    output. Anything else is dumped by the python emitter.
+
+    Args:
+        data (dict): data to dump.
+        backend (str, optional): ``libyaml`` or ``python``, defaults to
+            libyaml when available and safe. A forced libyaml may differ
+            from python on data which is not safe.
+
+    Returns:
+        str: yaml document.
+
+    Raises:
+        ExabgpCTLError: if backend is unknown or not available.
+    """
+    # pylint: disable=import-outside-toplevel
+    import yaml
+
+    dumpers = _yaml_dumpers()
+    if backend is None:
+        backend = "python"
+        if "libyaml" in dumpers and _yaml_libyaml_safe(data):
+            backend = "libyaml"
+    if backend not in dumpers:
+        raise ExabgpCTLError("YAML backend %s not available" % backend)
+
+    text = yaml.dump(
+        data,
+        default_flow_style=False,
+        width=YAML_WIDTH,
+        Dumper=dumpers[backend],
+    )
+    if backend == "libyaml":
+        text = _yaml_indent_sequences(text)
+    return text
+
+
+def _yaml_dumpers(cache={}):  # pylint: disable=dangerous-default-value
+    """Build yaml dumpers once, yaml is imported on first call."""
+    if cache:
+        return cache
+
+    # pylint: disable=import-outside-toplevel
+    import yaml
+    from yaml.representer import SafeRepresenter
+
+    # Hack to enhance Yaml dump ident
+    class PyDumper(yaml.SafeDumper):  # pylint: disable=too-many-ancestors
+        """Extend yaml dumper to print better indent on list"""
+
+        def increase_indent(self, flow=False, indentless=False):
+            return super(PyDumper, self).increase_indent(flow, False)
+
+    dumpers = {"python": PyDumper}
+    if getattr(yaml, "__with_libyaml__", False):
+        # pylint: disable=too-many-ancestors
+        class CDumper(yaml.CSafeDumper):
+            """libyaml dumper, indentation is fixed after dump"""
+
+        dumpers["libyaml"] = CDumper
+
+    for dumper in itervalues(dumpers):
+        # Config, dict subclasses and exabgp int/str subclasses as plain types
+        dumper.add_multi_representer(dict, SafeRepresenter.represent_dict)
+        dumper.add_multi_representer(int, SafeRepresenter.represent_int)
+        dumper.add_multi_representer(float, SafeRepresenter.represent_float)
+        dumper.add_multi_representer(text_type, SafeRepresenter.represent_str)
+        dumper.add_representer(tuple, SafeRepresenter.represent_list)
+        dumper.add_representer(IPInfo, SafeRepresenter.represent_dict)
+    cache.update(dumpers)
+    return cache
+
+
+YAML_WIDTH = 179
+# printable ASCII, emitters may escape or break anything else differently
+_YAML_PLAIN_TEXT = re.compile(r"^[\x20-\x7e]*$")
+_YAML_SCALARS = (bool, int, float, type(None))
+
+
+def _yaml_libyaml_safe(data, column=0):
+    """Whether libyaml output re-indented by _yaml_indent_sequences is the
+    same as the python emitter one.
+
+    Every line must be a single scalar (no multi-line or folded scalar) and
+    keys must be scalars (no ``? key``): strings are printable ASCII whose
+    line, quotes and escapes included, fits in YAML_WIDTH.
+
+    Args:
+        data: data to dump.
+        column (int): worst-case column where data starts.
+
+    Returns:
+        bool
+    """
+    if isinstance(data, (dict, Mapping)):
+        for key, value in iteritems(data):
+            if isinstance(key, string_types):
+                if not _yaml_text_safe(key, column):
+                    return False
+                width = 2 * len(key) + 4
+            elif isinstance(key, _YAML_SCALARS):
+                width = 32
+            else:
+                return False
+            if not _yaml_libyaml_safe(value, column + width):
+                return False
+        return True
+    if isinstance(data, (list, tuple)):
+        return all(_yaml_libyaml_safe(item, column + 4) for item in data)
+    if isinstance(data, string_types):
+        return _yaml_text_safe(data, column)
+    return isinstance(data, _YAML_SCALARS)
+
+
+def _yaml_text_safe(text, column):
+    """A string emitted on one line from column, quotes doubled."""
+    return (
+        column + 2 * len(text) + 2 < YAML_WIDTH
+        and _YAML_PLAIN_TEXT.match(text) is not None
+    )
+
+
+def _yaml_indent_sequences(text):
+    """Indent block sequences nested in a mapping, like PyDumper does.
+
+    libyaml writes ``key:\n- item``, every line of such a sequence (nested
+    ones included) is shifted by 2 spaces to get ``key:\n  - item``.
+    """
+    lines = text.split("\n")
+    # key column of the last line, when it's a "key:" opening a block
+    opener = None
+    # raw indent of each open sequence
+    stack = []
+    for i, line in enumerate(lines):
+        content = line.lstrip(" ")
+        if not content:
+            continue
+        indent = len(line) - len(content)
+        while stack and (
+            indent < stack[-1]
+            or (indent == stack[-1] and not _yaml_is_item(content))
+        ):
+            stack.pop()
+        if _yaml_is_item(content) and indent == opener:
+            stack.append(indent)
+        opener = _yaml_key_column(indent, content)
+        if stack:
+            lines[i] = " " * (2 * len(stack)) + line
+    return "\n".join(lines)
+
+
+def _yaml_is_item(content):
+    """Line content is a block sequence item."""
+    return content == "-" or content.startswith("- ")
+
+
+def _yaml_key_column(indent, content):
+    """Column of the key if content is a ``key:`` without value, else None.
+
+    Quoted scalars spanning many lines could end with ``:``, they are
+    detected with their unbalanced quotes.
+    """
+    while _yaml_is_item(content):
+        content = content[2:]
+        indent += 2
+    if not content.endswith(":") or len(content) < 2:
+        return None
+    key = content[:-1]
+    if key[0] == "'":
+        if len(key) < 2 or key[-1] != "'" or key.count("'") % 2:
+            return None
+    elif key[0] == '"':
+        if len(key) < 2 or key[-1] != '"' or key.endswith('\\"'):
+            return None
+    elif ": " in key or key.startswith(("? ", "#")):
+        return None
+    return indent
+
+
+# output name: (printer, backend module imported only when selected)
+OUTPUTS = {
+    "flat": (print_flat, None),
+    "json": (print_json, None),
+    "json-compact": (print_json_compact, None),
+    "msgpack": (print_msgpack, "msgpack"),
+    "ndjson": (print_ndjson, None),
+    "yaml": (print_yaml, "yaml"),
+}
+
+
+def get_output(name):
+    """Get the printer of an output format.
+
+    The backend of the output is imported to fail before running the command
+    when it's not installed.
+
+    Args:
+        name (str): output name, see OUTPUTS.
+
+    Returns:
+        function: printer taking the data to print.
+    """
+    try:
+        printer, backend = OUTPUTS[name]
+    except KeyError:
+        raise ExabgpCTLError("Unknown output %s" % name)
+    if backend is not None:
+        try:
+            importlib.import_module(backend)
+        except ImportError:
+            raise ExabgpCTLError(
+                "Output %s requires %s, install exabgpctl[%s]"
+                % (name, backend, backend)
             )
-        )
+    return printer
+
+
+class IPInfo(Mapping):
+    """Metadata of an exabgp IP (compressed, exploded, is_* flags...).
+
+    A read-only mapping whose fields are computed on first read, listing
+    processes never pays for ``reverse_pointer`` and friends, only printers
+    do. Serializers handle it like a dict (see json_default).
+
+    Args:
+        ip (IPAddress|IPNetwork): exabgp (vendored ipaddress) object.
+
+    Examples:
+        >>> info = IPInfo(ip_network("10.0.0.1/32"))
+        >>> info["version"]
+        4
+        >>> dict(info)
+        {'compressed': '10.0.0.1/32', 'exploded': '10.0.0.1/32', ...}
+    """
+
+    # field: function of the IP object, in output order
+    FIELDS = collections.OrderedDict(
+        [
+            ("compressed", lambda ip: str(ip.compressed)),
+            ("exploded", lambda ip: str(ip.exploded)),
+            ("is_link_local", operator.attrgetter("is_link_local")),
+            ("is_loopback", operator.attrgetter("is_loopback")),
+            ("is_multicast", operator.attrgetter("is_multicast")),
+            ("is_private", operator.attrgetter("is_private")),
+            ("is_reserved", operator.attrgetter("is_reserved")),
+            ("is_unspecified", operator.attrgetter("is_unspecified")),
+            ("max_prefixlen", operator.attrgetter("max_prefixlen")),
+            ("reverse_pointer", lambda ip: getattr(ip, "reverse_pointer", "")),
+            ("version", operator.attrgetter("version")),
+        ]
+    )
+
+    def __init__(self, ip):
+        self.ip = ip
+        self.values = {}
+
+    def __getitem__(self, key):
+        try:
+            return self.values[key]
+        except KeyError:
+            # concurrent readers may compute it twice, same value
+            value = self.values[key] = self.FIELDS[key](self.ip)
+            return value
+
+    def __iter__(self):
+        return iter(self.FIELDS)
+
+    def __len__(self):
+        return len(self.FIELDS)
+
+    def __eq__(self, other):
+        if isinstance(other, IPInfo):
+            return type(self.ip) is type(other.ip) and self.ip == other.ip
+        return Mapping.__eq__(self, other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return "IPInfo(%s)" % self.ip
+
+    def __deepcopy__(self, memo):
+        # read-only, shared like in _ip_info
+        return self
+
+
+_IP_CACHE = collections.OrderedDict()
+_IP_CACHE_LOCK = threading.Lock()
+
+
+def _ip_info(ipaddr):
+    """IPInfo of an IP, the same object for equal IPs (LRU of
+    IP_CACHE_SIZE)."""
+    # ipaddress objects of different types may be equal (v4 network and
+    # address with the same int)
+    key = (type(ipaddr), ipaddr)
+    with _IP_CACHE_LOCK:
+        info = _IP_CACHE.pop(key, None)
+        if info is None:
+            info = IPInfo(ipaddr)
+            if len(_IP_CACHE) >= IP_CACHE_SIZE:
+                _IP_CACHE.popitem(last=False)
+        _IP_CACHE[key] = info
+    return info
 
 
 def _parse_ip(ipaddr):
-    """Parse ExaBGP IP type."""
-    return {
-        ipaddr.compressed: {
-            "compressed": str(ipaddr.compressed),
-            "exploded": str(ipaddr.exploded),
-            "is_link_local": ipaddr.is_link_local,
-            "is_loopback": ipaddr.is_loopback,
-            "is_multicast": ipaddr.is_multicast,
-            "is_private": ipaddr.is_private,
-            "is_reserved": ipaddr.is_reserved,
-            "is_unspecified": ipaddr.is_unspecified,
-            "max_prefixlen": ipaddr.max_prefixlen,
-            "reverse_pointer": getattr(ipaddr, "reverse_pointer", ""),
-            "version": ipaddr.version,
-        }
-    }
+    """Parse ExaBGP IP type.
+
+    Returns:
+        dict: IPInfo by compressed IP.
+    """
+    info = _ip_info(ipaddr)
+    return {info["compressed"]: info}
 
 
 def list_processes(cfg):
@@ -544,10 +2199,10 @@ def get_process(cfg, name):
     Raises:
         ExabgpCTLError: If process not found.
     """
-    for process in cfg["processes"]:
-        if name == process["name"]:
-            return process
-    raise ExabgpCTLError("Process %s not found" % name)
+    try:
+        return _get_index(cfg, "processes")[name]
+    except KeyError:
+        raise ExabgpCTLError("Process %s not found" % name)
 
 
 def list_disabled_processes(cfg):
@@ -563,10 +2218,11 @@ def list_disabled_processes(cfg):
         >>> list_disabled_processes(cfg)
         ['service1.exabgp.lan']
     """
+    disabled = _get_disabled(cfg)
     return [
         process["name"]
         for process in cfg["processes"]
-        if os.path.exists(process["run"]["disable"])
+        if process["name"] in disabled
     ]
 
 
@@ -583,7 +2239,7 @@ def list_enabled_processes(cfg):
         >>> list_enabled_processes(cfg)
         ['service2.exabgp.lan', 'service3.exabgp.lan']
     """
-    disabled = list_disabled_processes(cfg)
+    disabled = _get_disabled(cfg)
     return [
         process for process in list_processes(cfg) if process not in disabled
     ]
@@ -609,7 +2265,10 @@ def disable_process(cfg, process):
     if path and not os.path.exists(path):
         with open(path, "a"):
             os.utime(path, None)
-    return os.path.exists(path)
+    result = os.path.exists(path)
+    if isinstance(cfg, Config):
+        cfg.set_disabled(process, result)
+    return result
 
 
 def enable_process(cfg, process):
@@ -633,7 +2292,94 @@ def enable_process(cfg, process):
     path = get_process(cfg, process)["run"].get("disable")
     if path and os.path.exists(path):
         os.unlink(path)
-    return not os.path.exists(path)
+    result = not os.path.exists(path)
+    if isinstance(cfg, Config):
+        cfg.set_disabled(process, not result)
+    return result
+
+
+def select_processes(cfg, names=(), patterns=(), regex=False):
+    """Select processes by names and patterns.
+
+    Args:
+        cfg (dict): config from config_load.
+        names (list, optional): process names, unknown ones are kept.
+        patterns (list, optional): glob patterns matched on process names.
+        regex (bool, optional): patterns are regular expressions.
+
+    Returns:
+        list: selected process names without duplicates, in given order
+              then config order.
+
+    Raises:
+        ExabgpCTLError: If a regex is invalid.
+
+    Examples:
+        >>> select_processes(cfg, ["service1.exabgp.lan"], ["*3.exabgp.lan"])
+        ['service1.exabgp.lan', 'service3.exabgp.lan']
+    """
+    if regex:
+        try:
+            matchers = [re.compile(pattern).search for pattern in patterns]
+        except re.error as err:
+            raise ExabgpCTLError("Invalid regex: %s" % err)
+    else:
+        matchers = [
+            re.compile(fnmatch.translate(pattern)).match
+            for pattern in patterns
+        ]
+
+    selected = collections.OrderedDict((name, True) for name in names)
+    if matchers:
+        for name in list_processes(cfg):
+            if any(matcher(name) for matcher in matchers):
+                selected[name] = True
+    return list(selected)
+
+
+def _apply_processes(cfg, processes, func):
+    """Run func on each process, failures are reported as False."""
+    result = {}
+    for process in processes:
+        try:
+            result[process] = func(cfg, process)
+        except (IOError, OSError, ExabgpCTLError):
+            result[process] = False
+    return result
+
+
+def disable_processes(cfg, processes):
+    """Disable many processes, see disable_process.
+
+    Args:
+        cfg (dict): config from config_load.
+        processes (list): processes to disable.
+
+    Returns:
+        dict: True for each process disabled, False if not found or failed.
+
+    Examples:
+        >>> disable_processes(cfg, ['service1.exabgp.lan', 'raise'])
+        {'service1.exabgp.lan': True, 'raise': False}
+    """
+    return _apply_processes(cfg, processes, disable_process)
+
+
+def enable_processes(cfg, processes):
+    """Enable many processes, see enable_process.
+
+    Args:
+        cfg (dict): config from config_load.
+        processes (list): processes to enable.
+
+    Returns:
+        dict: True for each process enabled, False if not found or failed.
+
+    Examples:
+        >>> enable_processes(cfg, ['service1.exabgp.lan', 'raise'])
+        {'service1.exabgp.lan': True, 'raise': False}
+    """
+    return _apply_processes(cfg, processes, enable_process)
 
 
 def state_process(cfg, process):
@@ -665,19 +2411,302 @@ def state_process(cfg, process):
         ...     fd.read()
         'UP'
     """
-    target = "%s/%s" % (cfg["state"], process)
-    state = os.environ.get("STATE", "no state found")
-    with open(target, "w") as fds:
-        fds.write(state)
-    return state
+    return write_state(cfg["state"], process)
+
+
+def write_state(state, process, value=None):
+    """Write a process state in the state dir without loading the config.
+
+    The state file is replaced atomically so readers never see a truncated
+    state. Used by ``process state`` which is run by exabgp healthcheck on
+    each state change.
+
+    Args:
+        state (str): state dir.
+        process (str): process name.
+        value (str, optional): state to write, defaults to environment
+            variable ``STATE``.
+
+    Returns:
+        str: state written.
+
+    Raises:
+        ExabgpCTLError: If the state dir doesn't exists or process name is
+            not a valid file name.
+
+    Examples:
+        >>> write_state("/var/lib/exabgp/status", "service1.exabgp.lan", "UP")
+        'UP'
+    """
+    if (
+        not process
+        or process.startswith(".")
+        or os.sep in process
+        or (os.altsep and os.altsep in process)
+    ):
+        raise ExabgpCTLError("Invalid process name %s" % process)
+    if not os.path.isdir(state):
+        raise ExabgpCTLError("ExaBGP state dir %s doesn't exists" % str(state))
+
+    if value is None:
+        value = os.environ.get("STATE", "no state found")
+    atomic_write(os.path.join(state, process), value)
+    return value
+
+
+def check_command(command, timeout=None, deadline=None):
+    """Run a healthcheck command, like exabgp ``healthcheck.check``.
+
+    Unlike exabgp implementation it doesn't rely on SIGALRM so it could run
+    in threads. The command runs in its own process group which is killed on
+    timeout.
+
+    Args:
+        command (str): shell command, None is always successful.
+        timeout (int, optional): command timeout in seconds.
+        deadline (float, optional): absolute ``monotonic`` time after which
+            the command is killed, even if its timeout isn't reached.
+
+    Returns:
+        dict: with result (OK, FAILED or TIMEOUT) and duration in seconds.
+
+    Examples:
+        >>> check_command("/bin/true", 5)
+        {'result': 'OK', 'duration': 0.0021}
+        >>> check_command("sleep 10", 1)
+        {'result': 'TIMEOUT', 'duration': 1.0003}
+    """
+    with phase("check", command=command):
+        start = monotonic()
+        if command is None:
+            return {"result": "OK", "duration": 0.0}
+
+        limit = start + timeout if timeout else None
+        if deadline is not None:
+            limit = deadline if limit is None else min(limit, deadline)
+            if start >= limit:
+                return {"result": "TIMEOUT", "duration": 0.0}
+
+        with open(os.devnull, "wb") as devnull:
+            proc = subprocess.Popen(
+                command,
+                shell=True,
+                stdout=devnull,
+                stderr=devnull,
+                **_NEW_SESSION
+            )
+
+        if PY2:
+            returncode = _wait_polling(proc, limit)
+        else:
+            try:
+                proc.communicate(
+                    timeout=None if limit is None else limit - monotonic()
+                )
+                returncode = proc.returncode
+            except subprocess.TimeoutExpired:
+                returncode = None
+        if returncode is None:
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except OSError:
+                pass
+            proc.wait()
+            return {"result": "TIMEOUT", "duration": monotonic() - start}
+
+        return {
+            "result": "OK" if returncode == 0 else "FAILED",
+            "duration": monotonic() - start,
+        }
+
+
+# own process group, killed on timeout; start_new_session keeps the fast
+# spawn path that preexec_fn disables
+_NEW_SESSION = {"preexec_fn": os.setsid} if PY2 else {"start_new_session": True}
+
+
+def _wait_polling(proc, limit):
+    """Wait for proc until limit (python 2, without Popen timeouts).
+
+    Returns:
+        int: return code, None when limit is reached.
+    """
+    delay = 0.001
+    while proc.poll() is None:
+        now = monotonic()
+        if limit is not None and now >= limit:
+            return None
+        if limit is not None:
+            delay = min(delay, limit - now)
+        time.sleep(delay)
+        delay = min(delay * 2, 0.05)
+    return proc.returncode
+
+
+# pylint: disable=too-many-arguments,too-many-locals
+def check_processes(
+    cfg, workers=CHECK_WORKERS, pool="thread", deadline=None, ttl=0
+):
+    """Run all healthcheck commands in a pool of workers.
+
+    Results (except TIMEOUT) are stored with their timestamp in
+    ``<state>/.exabgpctl/checks.json``, a result younger than ``ttl`` seconds
+    for the same command is reused instead of running the command again.
+
+    Args:
+        cfg (dict): config from config_load.
+        workers (int, optional): max commands running at the same time.
+        pool (str, optional): ``thread`` or ``process`` workers.
+        deadline (float, optional): seconds allowed for all checks, commands
+            still running are killed and reported as TIMEOUT.
+        ttl (float, optional): max age in seconds of a stored result, 0
+            always run commands.
+
+    Returns:
+        dict: check_command result and timestamp for each process.
+
+    Raises:
+        ExabgpCTLError: If pool is unknown.
+
+    Examples:
+        >>> check_processes(cfg, deadline=2)
+        {
+            'service1.exabgp.lan': {
+                'result': 'OK',
+                'duration': 0.0021,
+                'timestamp': 1560000000.0
+            },
+            'service2.exabgp.lan': {
+                'result': 'TIMEOUT',
+                'duration': 2.0,
+                'timestamp': 1560000000.0
+            },
+            ...
+        }
+    """
+    if pool not in CHECK_POOLS:
+        raise ExabgpCTLError("Unknown pool %s" % pool)
+
+    result = {}
+    processes = []
+    cached = _checks_cache_read(cfg["state"]) if ttl else {}
+    now = time.time()
+    for process in cfg["processes"]:
+        entry = cached.get(process["name"])
+        if (
+            entry
+            and entry.get("command") == process["run"]["command"]
+            and 0 <= now - entry.get("timestamp", 0) < ttl
+        ):
+            result[process["name"]] = {
+                "result": entry["result"],
+                "duration": entry["duration"],
+                "timestamp": entry["timestamp"],
+            }
+        else:
+            processes.append(process)
+
+    if not processes:
+        return result
+
+    start = monotonic()
+    end = start + deadline if deadline is not None else None
+    executor = CHECK_POOLS[pool](
+        max_workers=max(1, min(int(workers), len(processes)))
+    )
+    try:
+        jobs = {
+            executor.submit(
+                check_command,
+                process["run"]["command"],
+                process["run"]["timeout"],
+                end,
+            ): process["name"]
+            for process in processes
+        }
+        wait = None if end is None else max(0, end - start) + CHECK_GRACE
+        done, pending = futures.wait(jobs, timeout=wait)
+        for job in pending:
+            job.cancel()
+    finally:
+        executor.shutdown(wait=False)
+
+    now = time.time()
+    for job, name in iteritems(jobs):
+        if job not in done:
+            result[name] = {
+                "result": "TIMEOUT",
+                "duration": monotonic() - start,
+            }
+        else:
+            try:
+                result[name] = job.result()
+            # a command which could not be started is a failed check
+            # pylint: disable=broad-except
+            except Exception:
+                result[name] = {"result": "FAILED", "duration": 0.0}
+        result[name]["timestamp"] = now
+
+    _checks_cache_write(
+        cfg["state"],
+        {
+            process["name"]: dict(
+                result[process["name"]], command=process["run"]["command"]
+            )
+            for process in processes
+            if result[process["name"]]["result"] != "TIMEOUT"
+        },
+    )
+    return result
 
 
-def status_processes(cfg):
+def _checks_cache_read(state):
+    """Read stored healthcheck results."""
+    try:
+        with open(os.path.join(state, CACHE_DIR, "checks.json")) as fds:
+            data = json.load(fds)
+    except (IOError, OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _checks_cache_write(state, entries):
+    """Merge healthcheck results with stored ones, ignore errors."""
+    if not entries:
+        return
+    data = _checks_cache_read(state)
+    data.update(entries)
+    try:
+        atomic_write(
+            os.path.join(state, CACHE_DIR, "checks.json"), json.dumps(data)
+        )
+    except (IOError, OSError):
+        pass
+
+
+# pylint: disable=too-many-arguments
+def status_processes(
+    cfg,
+    workers=CHECK_WORKERS,
+    pool="thread",
+    deadline=None,
+    ttl=0,
+    fresh=False,
+):
     """Read all states from statefiles and run using healthcheck commands.
 
+    Commands run concurrently and their results are reused during ``ttl``
+    seconds, see check_processes.
+
     Args:
         cfg (dict): config from config_load.
-        process (str): process to enable.
+        workers (int, optional): max commands running at the same time.
+        pool (str, optional): ``thread`` or ``process`` workers.
+        deadline (float, optional): seconds allowed for all checks, commands
+            still running are killed and reported as TIMEOUT.
+        ttl (float, optional): max age in seconds of a stored result, 0
+            always run commands, the CLI uses CHECK_TTL.
+        fresh (bool, optional): ignore stored results and run all commands.
 
     Returns:
         dict: with statuses for each process.
@@ -689,38 +2718,46 @@ def status_processes(cfg):
                 'state': 'UP',
                 'state_path': '/tmp/exabgp/state/service1.exabgp.lan',
                 'command': True,
-                'command_check': '/bin/mycheck'
+                'command_check': '/bin/mycheck',
+                'command_result': 'OK'
             },
             'service2.exabgp.lan': {
                 'state': 'DOWN',
                 'state_path': '/tmp/exabgp/state/service2.exabgp.lan',
                 'command': False,
-                'command_check': '/bin/mycheck'
+                'command_check': '/bin/mycheck',
+                'command_result': 'FAILED'
             },
             'service3.exabgp.lan': {
                 'state': 'DOWN',
                 'state_path': '/tmp/exabgp/state/service3.exabgp.lan',
                 'command': False,
-                'command_check': '/bin/mycheck'
+                'command_check': '/bin/mycheck',
+                'command_result': 'TIMEOUT'
             }
         }
     """
-    result = {}
-    for process in cfg["processes"]:
-        state = "UNKNOWN"
-        path = "%s/%s" % (cfg["state"], process["name"])
-        if os.path.exists(path):
-            with open(path) as fds:
-                state = fds.read().strip()
-        cmd = healthcheck.check(
-            process["run"]["command"], process["run"]["timeout"]
+    with phase("check_processes"):
+        checks = check_processes(
+            cfg, workers, pool, deadline, 0 if fresh else ttl
         )
-        result[process["name"]] = {
-            "state": state,
-            "state_path": path,
-            "command": cmd,
-            "command_check": process["run"]["command"],
-        }
+
+    result = {}
+    with phase("read states"):
+        for process in cfg["processes"]:
+            state = "UNKNOWN"
+            path = "%s/%s" % (cfg["state"], process["name"])
+            if os.path.exists(path):
+                with open(path) as fds:
+                    state = fds.read().strip()
+            check = checks[process["name"]]
+            result[process["name"]] = {
+                "state": state,
+                "state_path": path,
+                "command": check["result"] == "OK",
+                "command_check": process["run"]["command"],
+                "command_result": check["result"],
+            }
     return result
 
 
@@ -765,17 +2802,88 @@ def get_neighbor(cfg, name):
     Raises:
         ExabgpCTLError: If neighbor not found.
     """
-    for neighbor in cfg["neighbors"]:
-        if name == neighbor["name"]:
-            return neighbor
-    raise ExabgpCTLError("Neighbor %s not found" % name)
+    try:
+        return _get_index(cfg, "neighbors")[name]
+    except KeyError:
+        raise ExabgpCTLError("Neighbor %s not found" % name)
+
+
+def probe_neighbors(
+    cfg, timeout=PROBE_TIMEOUT, concurrency=PROBE_CONCURRENCY, rate=None
+):
+    """Run tcping on all neighbors concurrently, on port 179 or the
+    ``connect`` port of the neighbor.
+
+    Total time is about one timeout as long as neighbors count is lower than
+    concurrency.
+
+    Args:
+        cfg (dict): config from config_load.
+        timeout (float, optional): connect timeout per neighbor in seconds.
+        concurrency (int, optional): max probes running at the same time.
+        rate (float, optional): max probes started per second, defaults to
+            unlimited.
+
+    Returns:
+        dict: with status, address, port, code and elapsed time (seconds)
+              for each neighbor.
+
+    Examples:
+        >>> probe_neighbors(cfg)
+        {
+            '192.168.0.1': {
+                'status': True,
+                'address': '192.168.0.1',
+                'port': 179,
+                'code': 0,
+                'elapsed': 0.0012
+            },
+            ...
+        }
+    """
+    bucket = TokenBucket(rate) if rate else None
+
+    def probe(neighbor):
+        """Probe one neighbor"""
+        if bucket:
+            bucket.acquire()
+        start = monotonic()
+        # exabgp connects to BGP_PORT unless ``connect`` is set
+        port = neighbor.get("connect") or BGP_PORT
+        with phase("tcping", address=neighbor["peer_address"], port=port):
+            status, code = tcping(neighbor["peer_address"], port, timeout)
+        return {
+            "status": status,
+            "address": neighbor["peer_address"],
+            "port": port,
+            "code": code,
+            "elapsed": monotonic() - start,
+        }
+
+    neighbors = cfg["neighbors"]
+    if not neighbors:
+        return {}
+
+    workers = max(1, min(int(concurrency), len(neighbors)))
+    with futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(probe, neighbors)
+        return {
+            neighbor["name"]: result
+            for neighbor, result in zip(neighbors, results)
+        }
 
 
-def status_neighbors(cfg):
+def status_neighbors(
+    cfg, timeout=PROBE_TIMEOUT, concurrency=PROBE_CONCURRENCY, rate=None
+):
     """Check connectivity with neighbors.
 
     Args:
         cfg (dict): config from config_load.
+        timeout (float, optional): connect timeout per neighbor in seconds.
+        concurrency (int, optional): max probes running at the same time.
+        rate (float, optional): max probes started per second, defaults to
+            unlimited.
 
     Returns:
         dict: with statuses for each neighbor.
@@ -793,10 +2901,12 @@ def status_neighbors(cfg):
             }
         }
     """
-    result = {}
-    for neighbor in cfg["neighbors"]:
-        result[neighbor["name"]] = {
-            "status": tcping(neighbor["peer_address"], 179)[0],
-            "status_addressport": [neighbor["peer_address"], 179],
+    with phase("probe_neighbors"):
+        probes = probe_neighbors(cfg, timeout, concurrency, rate)
+    return {
+        name: {
+            "status": probe["status"],
+            "status_addressport": [probe["address"], probe["port"]],
         }
-    return result
+        for name, probe in iteritems(probes)
+    }
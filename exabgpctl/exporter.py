@@ -0,0 +1,369 @@
+# -*- coding: utf-8 -*-
+"""
+exabgpctl.exporter
+~~~~~~~~~~~~~~~~~~
+
+Prometheus metrics of processes and neighbors, served on ``/metrics``
+and/or written for the node_exporter textfile collector.
+
+Metrics are computed by a background thread every ``interval`` seconds, a
+scrape only returns the last rendering.
+"""
+from __future__ import print_function
+
+# standard
+import time
+import signal
+import socket
+import threading
+import traceback
+
+# local
+from exabgpctl.controller import (
+    atomic_write,
+    check_processes,
+    probe_neighbors,
+    ExabgpCTLError,
+    CHECK_TTL,
+    EXPORTER_INTERVAL,
+)
+from exabgpctl.watcher import ConfigWatcher
+from exabgpctl._py6 import iteritems, monotonic
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# bind address of --listen without one, any other is explicit
+EXPORTER_ADDRESS = "127.0.0.1"
+# name: (type, help)
+METRICS = {
+    "exabgpctl_process_state": (
+        "gauge",
+        "State read from the process state file.",
+    ),
+    "exabgpctl_process_maintenance": (
+        "gauge",
+        "1 if the process maintenance file exists.",
+    ),
+    "exabgpctl_process_check_result": (
+        "gauge",
+        "Result of the healthcheck command (OK, FAILED or TIMEOUT).",
+    ),
+    "exabgpctl_process_check_duration_seconds": (
+        "gauge",
+        "Duration of the healthcheck command.",
+    ),
+    "exabgpctl_neighbor_up": (
+        "gauge",
+        "1 if a TCP connection to the neighbor succeeded.",
+    ),
+    "exabgpctl_neighbor_connect_seconds": (
+        "gauge",
+        "Time to connect to the neighbor, or to fail.",
+    ),
+    "exabgpctl_refresh_duration_seconds": (
+        "gauge",
+        "Duration of the last metrics refresh.",
+    ),
+    "exabgpctl_refresh_timestamp_seconds": (
+        "gauge",
+        "Unix time of the last metrics refresh.",
+    ),
+    "exabgpctl_refresh_errors_total": (
+        "counter",
+        "Failed metrics refreshes.",
+    ),
+}
+
+
+def _escape(value):
+    """Escape a label value."""
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace('"', '\\"')
+        .replace("\n", "\\n")
+    )
+
+
+def render_metrics(samples):
+    """Render samples in Prometheus text format.
+
+    Args:
+        samples (list): (name, labels dict, value) of each sample, metrics
+            are sorted by name and keep the order of their samples.
+
+    Returns:
+        str: metrics text.
+    """
+    by_name = {}
+    for name, labels, value in samples:
+        by_name.setdefault(name, []).append((labels, value))
+    lines = []
+    for name in sorted(by_name):
+        kind, text = METRICS[name]
+        lines.append("# HELP %s %s" % (name, text))
+        lines.append("# TYPE %s %s" % (name, kind))
+        for labels, value in by_name[name]:
+            if labels:
+                lines.append(
+                    "%s{%s} %s"
+                    % (
+                        name,
+                        ",".join(
+                            '%s="%s"' % (key, _escape(labels[key]))
+                            for key in sorted(labels)
+                        ),
+                        repr(float(value)),
+                    )
+                )
+            else:
+                lines.append("%s %s" % (name, repr(float(value))))
+    return "\n".join(lines) + "\n"
+
+
+def collect(cfg, states, checks, probes):
+    """Build samples of processes and neighbors.
+
+    Args:
+        cfg (Config): config from config_load.
+        states (dict): state of each process.
+        checks (dict): check_processes result.
+        probes (dict): probe_neighbors result.
+
+    Returns:
+        list: (name, labels, value) samples, see render_metrics.
+    """
+    samples = []
+    disabled = cfg.disabled()
+    for process in cfg["processes"]:
+        name = process["name"]
+        labels = {"process": name}
+        samples.append(
+            (
+                "exabgpctl_process_state",
+                {"process": name, "state": states.get(name, "UNKNOWN")},
+                1,
+            )
+        )
+        samples.append(
+            ("exabgpctl_process_maintenance", labels, name in disabled)
+        )
+        check = checks.get(name)
+        if check:
+            samples.append(
+                (
+                    "exabgpctl_process_check_result",
+                    {"process": name, "result": check["result"]},
+                    1,
+                )
+            )
+            samples.append(
+                (
+                    "exabgpctl_process_check_duration_seconds",
+                    labels,
+                    check["duration"],
+                )
+            )
+    for name, probe in sorted(iteritems(probes)):
+        labels = {
+            "neighbor": name,
+            "address": probe["address"],
+            "port": probe["port"],
+        }
+        samples.append(("exabgpctl_neighbor_up", labels, probe["status"]))
+        samples.append(
+            ("exabgpctl_neighbor_connect_seconds", labels, probe["elapsed"])
+        )
+    return samples
+
+
+class Exporter(object):
+    """Refresh metrics in a background thread.
+
+    Args:
+        watcher (ConfigWatcher): keeps config and states up to date, only
+            used by the refresh thread.
+        interval (float, optional): seconds between refreshes.
+        textfile (str, optional): file written (atomically) after each
+            refresh, for node_exporter textfile collector.
+        check (dict, optional): check_processes keyword arguments,
+            deadline defaults to interval and ttl to CHECK_TTL.
+        probe (dict, optional): probe_neighbors keyword arguments.
+
+    Attributes:
+        text (str): last metrics rendering, empty before first refresh.
+    """
+
+    def __init__(
+        self,
+        watcher,
+        interval=EXPORTER_INTERVAL,
+        textfile=None,
+        check=None,
+        probe=None,
+    ):
+        self.watcher = watcher
+        self.interval = interval
+        self.textfile = textfile
+        self.check = dict(
+            {"deadline": interval, "ttl": CHECK_TTL}, **(check or {})
+        )
+        self.probe = probe or {}
+        self.text = ""
+        self.errors = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def refresh(self):
+        """Apply config changes, run checks and probes, render metrics.
+
+        Returns:
+            str: metrics text.
+        """
+        start = monotonic()
+        self.watcher.poll()
+        cfg = self.watcher.cfg
+        checks = check_processes(cfg, **self.check)
+        probes = probe_neighbors(cfg, **self.probe)
+        samples = collect(cfg, self.watcher.states, checks, probes)
+        samples.extend(
+            [
+                (
+                    "exabgpctl_refresh_duration_seconds",
+                    None,
+                    monotonic() - start,
+                ),
+                ("exabgpctl_refresh_timestamp_seconds", None, time.time()),
+                ("exabgpctl_refresh_errors_total", None, self.errors),
+            ]
+        )
+        text = render_metrics(samples)
+        if self.textfile:
+            atomic_write(self.textfile, text)
+        self.text = text
+        return text
+
+    def run(self):
+        """Refresh every interval until stop() is called, errors are printed
+        and counted."""
+        delay = self.interval
+        while not self._stop.wait(delay):
+            start = monotonic()
+            try:
+                self.refresh()
+            except Exception:  # pylint: disable=broad-except
+                # keep serving the last metrics
+                self.errors += 1
+                traceback.print_exc()
+            delay = max(0, self.interval - (monotonic() - start))
+
+    def start(self):
+        """Start the refresh thread, its first refresh is after interval."""
+        self._thread = threading.Thread(target=self.run, name="exporter")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop the refresh thread."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+def make_server(exporter, listen):
+    """HTTP server returning exporter text on ``/metrics``.
+
+    Args:
+        exporter (Exporter): metrics source.
+        listen (str): ``address:port``, address defaults to
+            EXPORTER_ADDRESS (``0.0.0.0:port`` for all interfaces), IPv6
+            addresses may be bracketed (``[::1]:port``).
+
+    Returns:
+        HTTPServer: not started.
+
+    Raises:
+        ExabgpCTLError: if the port is not a number.
+    """
+    # pylint: disable=import-outside-toplevel
+    try:
+        from http.server import BaseHTTPRequestHandler, HTTPServer
+    except ImportError:  # python 2
+        from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+    address, _, port = listen.rpartition(":")
+    if not port.isdigit():
+        raise ExabgpCTLError("Invalid listen address %s" % listen)
+    address = address.strip("[]") or EXPORTER_ADDRESS
+
+    class Server(HTTPServer):
+        """HTTPServer of the address family"""
+
+        address_family = socket.AF_INET6 if ":" in address else socket.AF_INET
+
+    class Handler(BaseHTTPRequestHandler):
+        """Serve metrics, constant time"""
+
+        def do_GET(self):  # pylint: disable=invalid-name
+            """GET /metrics"""
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = exporter.text.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *_):  # pylint: disable=arguments-differ
+            """No access log"""
+
+    return Server((address, int(port)), Handler)
+
+
+def _terminate(*_):
+    """Stop on SIGTERM."""
+    raise SystemExit(0)
+
+
+def run_exporter(
+    listen=None,
+    textfile=None,
+    interval=EXPORTER_INTERVAL,
+    once=False,
+    check=None,
+    probe=None,
+):
+    """Run the exporter until SIGINT or SIGTERM.
+
+    Args:
+        listen (str, optional): ``address:port`` to serve ``/metrics``.
+        textfile (str, optional): file written after each refresh.
+        interval (float, optional): seconds between refreshes.
+        once (bool, optional): refresh once and exit.
+        check (dict, optional): check_processes keyword arguments.
+        probe (dict, optional): probe_neighbors keyword arguments.
+    """
+    with ConfigWatcher() as watcher:
+        exporter = Exporter(watcher, interval, textfile, check, probe)
+        if once:
+            exporter.refresh()
+            return
+        # first refresh before serving, scrapes never see empty metrics
+        exporter.refresh()
+        exporter.start()
+        signal.signal(signal.SIGTERM, _terminate)
+        try:
+            if listen:
+                server = make_server(exporter, listen)
+                try:
+                    server.serve_forever()
+                finally:
+                    server.server_close()
+            else:
+                while True:
+                    time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            exporter.stop()
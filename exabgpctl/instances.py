@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+exabgpctl.instances
+~~~~~~~~~~~~~~~~~~~
+
+Several exabgp daemons on one host, each with its own conf and state dir.
+
+Instances are given as ``name=conf:state`` or as a directory of
+``<name>.env`` files::
+
+    EXABGPCTL_CONF=/etc/exabgp/edge.conf
+    EXABGPCTL_STATE=/var/lib/exabgp/edge
+
+Their confs are loaded in parallel, in a pool of processes.
+"""
+# standard
+import os
+import collections
+import multiprocessing
+
+# local
+from exabgpctl.controller import config_load, ExabgpCTLError, CHECK_POOLS
+from exabgpctl._py6 import iteritems
+
+INSTANCES_SUFFIX = ".env"
+
+
+def parse_instance(value):
+    """Parse an instance definition.
+
+    Args:
+        value (str): ``name=conf:state``.
+
+    Returns:
+        tuple: name, conf path and state dir.
+
+    Raises:
+        ExabgpCTLError: if a part is missing.
+
+    Examples:
+        >>> parse_instance("edge=/etc/exabgp/edge.conf:/var/lib/exabgp/edge")
+        ('edge', '/etc/exabgp/edge.conf', '/var/lib/exabgp/edge')
+    """
+    name, _, paths = value.partition("=")
+    conf, _, state = paths.rpartition(":")
+    if not name or not conf or not state:
+        raise ExabgpCTLError(
+            "Invalid instance %s, expected name=conf:state" % value
+        )
+    return name, conf, state
+
+
+def read_instance(path):
+    """Read an instance file, ``KEY=value`` lines like an environment file.
+
+    Args:
+        path (str): ``<name>.env`` file with ``EXABGPCTL_CONF`` and
+            ``EXABGPCTL_STATE``.
+
+    Returns:
+        tuple: name, conf path and state dir.
+
+    Raises:
+        ExabgpCTLError: if a variable is missing.
+    """
+    env = {}
+    with open(path) as fds:
+        for line in fds:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            key, _, value = line.partition("=")
+            key = key.strip()
+            if key.startswith("export "):
+                key = key[len("export ") :].strip()
+            env[key] = value.strip().strip("'\"")
+    name = os.path.basename(path)[: -len(INSTANCES_SUFFIX)]
+    try:
+        return name, env["EXABGPCTL_CONF"], env["EXABGPCTL_STATE"]
+    except KeyError as err:
+        raise ExabgpCTLError("%s is missing in %s" % (err.args[0], path))
+
+
+def read_instances_dir(path):
+    """Read instance files of a directory.
+
+    Args:
+        path (str): directory of ``<name>.env`` files.
+
+    Returns:
+        list: (name, conf, state) sorted by name.
+    """
+    return [
+        read_instance(os.path.join(path, filename))
+        for filename in sorted(os.listdir(path))
+        if filename.endswith(INSTANCES_SUFFIX)
+        and len(filename) > len(INSTANCES_SUFFIX)
+    ]
+
+
+def get_instances(values=(), dirname=None):
+    """Instances of ``--instance`` values and ``--instances-dir``.
+
+    Args:
+        values (list): ``name=conf:state`` definitions.
+        dirname (str, optional): directory of instance files.
+
+    Returns:
+        OrderedDict: (conf, state) by name, files first.
+
+    Raises:
+        ExabgpCTLError: if an instance is defined twice.
+    """
+    instances = collections.OrderedDict()
+    definitions = read_instances_dir(dirname) if dirname else []
+    definitions.extend(parse_instance(value) for value in values)
+    for name, conf, state in definitions:
+        if name in instances:
+            raise ExabgpCTLError("Instance %s is defined twice" % name)
+        instances[name] = (conf, state)
+    return instances
+
+
+def load_instances(instances, workers=None, pool="process"):
+    """Load the conf of each instance in parallel.
+
+    Each conf is parsed (or read from its cache) by config_load in a worker,
+    processes by default so parsing uses all cores.
+
+    Args:
+        instances (dict): (conf, state) by name, see get_instances.
+        workers (int, optional): max loads at the same time, defaults to
+            the number of CPUs.
+        pool (str, optional): ``process`` or ``thread`` workers.
+
+    Returns:
+        OrderedDict: Config by name, same order as instances.
+
+    Raises:
+        ExabgpCTLError: if a conf can't be loaded, prefixed by its instance.
+    """
+    if pool not in CHECK_POOLS:
+        raise ExabgpCTLError("Unknown pool %s" % pool)
+
+    result = collections.OrderedDict()
+    if len(instances) == 1:
+        # not worth a pool
+        for name, (conf, state) in iteritems(instances):
+            result[name] = _load(name, conf, state)
+        return result
+
+    workers = max(
+        1, min(len(instances), workers or multiprocessing.cpu_count())
+    )
+    with CHECK_POOLS[pool](max_workers=workers) as executor:
+        jobs = collections.OrderedDict(
+            (name, executor.submit(_load, name, conf, state))
+            for name, (conf, state) in iteritems(instances)
+        )
+        for name, job in iteritems(jobs):
+            result[name] = job.result()
+    return result
+
+
+def _load(name, conf, state):
+    """config_load of an instance, errors are prefixed by its name."""
+    try:
+        return config_load(path=conf, state=state)
+    except ExabgpCTLError as err:
+        raise ExabgpCTLError("%s: %s" % (name, err))
@@ -0,0 +1,362 @@
+# -*- coding: utf-8 -*-
+"""
+exabgpctl.server
+~~~~~~~~~~~~~~~~
+
+Keep the parsed config in memory behind a UNIX socket. When the socket
+exists, read-only commands are sent to the server instead of importing
+exabgp and parsing the conf on each call.
+
+One request per connection, a json line from the client::
+
+    {"args": ["process", "list"], "conf": "/etc/...", "state": "/var/..."}
+
+answered by a json header line and the raw output::
+
+    {"code": 0, "stdout": 42, "stderr": 0}
+    <42 bytes of stdout><0 bytes of stderr>
+
+A header with an ``error`` key means the client must run the command itself
+(not allowed, other conf...).
+"""
+from __future__ import print_function
+
+# standard
+import io
+import os
+import sys
+import json
+import errno
+import signal
+import socket
+import traceback
+
+# third
+import click
+
+# local
+from exabgpctl.controller import get_conf_path, get_state_path, ExabgpCTLError
+from exabgpctl.watcher import ConfigWatcher
+from exabgpctl._py6 import PY2, socketserver, text_type
+
+SOCKET_PATH = "/run/exabgpctl.sock"
+# seconds the client waits for the server (connect, each read) before
+# running the command itself, the server handles requests one by one
+REQUEST_TIMEOUT = 10.0
+# commands which never change anything, the only ones sent to the server
+READONLY_COMMANDS = frozenset(
+    [
+        ("dump",),
+        ("status",),
+        ("version",),
+        ("process", "list"),
+        ("process", "show"),
+        ("process", "status"),
+        ("neighbor", "list"),
+        ("neighbor", "show"),
+        ("neighbor", "status"),
+    ]
+)
+# global parameters the server doesn't handle (measures of the CLI process,
+# other instances), their commands always run locally
+LOCAL_PARAMS = ("timings", "profile", "memory", "instance", "instances_dir")
+
+
+def get_socket_path():
+    """Get server socket path, empty when disabled."""
+    return os.environ.get("EXABGPCTL_SOCKET", SOCKET_PATH)
+
+
+def is_remote(command, args):
+    """Whether CLI arguments can be sent to the server: a read-only command
+    without LOCAL_PARAMS.
+
+    Arguments are parsed by the CLI itself (without running anything), so
+    every spelling of an option is seen (``-iname=...``, ``--instance=...``).
+
+    Args:
+        command (click.Command): CLI.
+        args (list): CLI arguments without program name.
+
+    Returns:
+        bool
+    """
+    path = []
+    try:
+        ctx = command.make_context(
+            "exabgpctl", list(args), resilient_parsing=True
+        )
+        while True:
+            # raw values: a value failing its conversion is None in params
+            opts = ctx.command.make_parser(ctx).parse_args(list(args))[0]
+            if any(opts.get(name) for name in LOCAL_PARAMS):
+                return False
+            rest = getattr(ctx, "protected_args", []) + ctx.args
+            if not isinstance(ctx.command, click.MultiCommand) or not rest:
+                break
+            name, sub, args = ctx.command.resolve_command(ctx, rest)
+            if sub is None:
+                return False
+            path.append(name)
+            ctx = sub.make_context(
+                name, list(args), parent=ctx, resilient_parsing=True
+            )
+    except (click.ClickException, click.exceptions.Exit):
+        return False
+    return tuple(path) in READONLY_COMMANDS
+
+
+# Server
+
+
+class Server(socketserver.UnixStreamServer):
+    """Run read-only commands on a config kept in memory.
+
+    Requests are handled one by one: commands share the config and stdout
+    is swapped to capture their output.
+
+    Before each command, changes of the conf file, maintenance and state
+    dirs are applied by a ConfigWatcher.
+
+    Args:
+        path (str): socket path.
+        command (click.Command): CLI running the commands.
+        backend (str, optional): watcher backend, see ConfigWatcher.
+    """
+
+    def __init__(self, path, command, backend=None):
+        self.command = command
+        self.watcher = ConfigWatcher(backend)
+        socketserver.UnixStreamServer.__init__(self, path, _Handler)
+
+    @property
+    def cfg(self):
+        """Current config."""
+        return self.watcher.cfg
+
+    def refresh(self):
+        """Apply changes made since last request."""
+        self.watcher.poll()
+
+    def server_close(self):
+        socketserver.UnixStreamServer.server_close(self)
+        self.watcher.close()
+
+    def run(self, payload):
+        """Run a request.
+
+        Args:
+            payload (dict): args, conf and state of the client.
+
+        Returns:
+            tuple: header (dict), stdout (bytes), stderr (bytes).
+        """
+        args = [text_type(arg) for arg in payload["args"]]
+        if not is_remote(self.command, args):
+            return {"error": "command not allowed"}, b"", b""
+        try:
+            self.refresh()
+        except (ExabgpCTLError, OSError) as err:
+            return {"error": str(err)}, b"", b""
+        if (payload.get("conf"), payload.get("state")) != (
+            os.path.abspath(self.cfg["path"]),
+            os.path.abspath(self.cfg["state"]),
+        ):
+            return {"error": "conf or state differs"}, b"", b""
+        code, out, err = run_command(self.command, args, self.cfg)
+        return {"code": code, "stdout": len(out), "stderr": len(err)}, out, err
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """Read a json request line, write header and output."""
+
+    def handle(self):
+        try:
+            payload = json.loads(self.rfile.readline().decode("utf-8"))
+            header, out, err = self.server.run(payload)
+        except (ValueError, KeyError, TypeError, AttributeError):
+            header, out, err = {"error": "bad request"}, b"", b""
+        try:
+            self.wfile.write(
+                json.dumps(header).encode("utf-8") + b"\n" + out + err
+            )
+        except socket.error:
+            # client went away (killed, liveness check...)
+            pass
+
+
+def _capture():
+    """Text stream whose ``buffer`` accepts bytes, like sys.stdout."""
+    if PY2:
+        return io.BytesIO()
+    return io.TextIOWrapper(io.BytesIO(), encoding="utf-8", write_through=True)
+
+
+def _getvalue(stream):
+    """Bytes written to a stream returned by _capture."""
+    stream.flush()
+    return getattr(stream, "buffer", stream).getvalue()
+
+
+def run_command(command, args, cfg):
+    """Run a CLI command with a loaded config and capture its output.
+
+    Args:
+        command (click.Command): CLI, its context object gets ``cfg``.
+        args (list): CLI arguments without program name.
+        cfg (dict): config returned by config_load.
+
+    Returns:
+        tuple: exit code, stdout (bytes), stderr (bytes).
+    """
+    saved = sys.stdout, sys.stderr
+    sys.stdout, sys.stderr = _capture(), _capture()
+    try:
+        code = command.main(
+            args=args,
+            prog_name="exabgpctl",
+            standalone_mode=False,
+            obj={"cfg": cfg},
+        )
+        code = code if isinstance(code, int) else 0
+    except click.ClickException as err:
+        err.show()
+        code = err.exit_code
+    except click.Abort:
+        code = 1
+    except ExabgpCTLError as err:
+        print(err)
+        code = 1
+    except SystemExit as err:
+        code = err.code if isinstance(err.code, int) else 1
+    except Exception:  # pylint: disable=broad-except
+        # a broken command must not stop the server
+        traceback.print_exc()
+        code = 1
+    finally:
+        stdout, stderr = _getvalue(sys.stdout), _getvalue(sys.stderr)
+        sys.stdout, sys.stderr = saved
+    return code, stdout, stderr
+
+
+def _listening(path):
+    """A server accepts connections on the socket."""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except socket.error:
+        return False
+    finally:
+        sock.close()
+    return True
+
+
+def _terminate(*_):
+    """Stop serve_forever on SIGTERM."""
+    raise SystemExit(0)
+
+
+def serve(path, command):
+    """Serve commands on a UNIX socket until SIGTERM or SIGINT.
+
+    Args:
+        path (str): socket path, removed on exit.
+        command (click.Command): CLI running the commands.
+
+    Raises:
+        ExabgpCTLError: if a server is already listening.
+    """
+    if os.path.exists(path):
+        if _listening(path):
+            raise ExabgpCTLError("A server is already listening on %s" % path)
+        os.unlink(path)
+    server = Server(path, command)
+    signal.signal(signal.SIGTERM, _terminate)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        try:
+            os.unlink(path)
+        except OSError as err:
+            if err.errno != errno.ENOENT:
+                raise
+
+
+# Client
+
+
+def _read(fds, size):
+    """Read exactly size bytes."""
+    data = fds.read(size)
+    if len(data) != size:
+        raise ValueError("truncated response")
+    return data
+
+
+def request(path, args, timeout=REQUEST_TIMEOUT):
+    """Run a command on the server and print its output.
+
+    Output is printed once fully received, so the command could be run
+    locally when the server fails or doesn't answer in time.
+
+    Args:
+        path (str): socket path.
+        args (list): CLI arguments without program name.
+        timeout (float, optional): seconds allowed to connect and for each
+            read.
+
+    Returns:
+        int: exit code, None when the command must be run locally.
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(path)
+        payload = {
+            "args": list(args),
+            "conf": os.path.abspath(get_conf_path()),
+            "state": os.path.abspath(get_state_path()),
+        }
+        sock.sendall(json.dumps(payload).encode("utf-8") + b"\n")
+        fds = sock.makefile("rb")
+        header = json.loads(fds.readline().decode("utf-8"))
+        if "error" in header:
+            return None
+        out = _read(fds, header["stdout"])
+        err = _read(fds, header["stderr"])
+    except (socket.timeout, socket.error, ValueError, KeyError, TypeError):
+        return None
+    finally:
+        sock.close()
+
+    for stream, data in ((sys.stdout, out), (sys.stderr, err)):
+        stream.flush()
+        getattr(stream, "buffer", stream).write(data)
+        stream.flush()
+    return header["code"]
+
+
+def client(command, args):
+    """Run read-only commands through the server when its socket exists.
+
+    Args:
+        command (click.Command): CLI.
+        args (list): CLI arguments without program name.
+
+    Returns:
+        int: exit code, None when the command must be run locally.
+    """
+    if "_EXABGPCTL_COMPLETE" in os.environ:
+        return None
+    # the trace must show this process
+    if os.environ.get("EXABGPCTL_TRACE"):
+        return None
+    if not is_remote(command, args):
+        return None
+    path = get_socket_path()
+    if not path or not os.path.exists(path):
+        return None
+    return request(path, args)
@@ -13,41 +13,90 @@ import click
 
 # local
 from exabgpctl.controller import (
+    completion_index,
     config_load,
+    get_conf_path,
+    get_state_path,
     get_version,
     disable_process,
+    disable_processes,
     enable_process,
+    enable_processes,
     get_process,
     list_disabled_processes,
-    list_enabled_processes,
     list_processes,
-    state_process,
+    select_processes,
     status_processes,
     get_neighbor,
     list_neighbors,
     status_neighbors,
-    print_json,
-    print_yaml,
-    print_flat,
+    get_output,
+    get_trace_path,
+    memory_start,
+    memory_stop,
+    phase,
+    timings_start,
+    timings_stop,
+    trace_start,
+    trace_stop,
+    write_state,
+    ByInstance,
     ExabgpCTLError,
+    CHECK_POOLS,
+    CHECK_TTL,
+    CHECK_WORKERS,
+    EXPORTER_INTERVAL,
+    OUTPUTS,
+    PROBE_CONCURRENCY,
+    PROBE_TIMEOUT,
 )
 
 # Context
 
 
-def create_context(output="json", debug=False):
-    """Create a context for CLI - used for autocomplete because Click doesn't
-    support it.
-
-    See https://github.com/pallets/click/issues/942
-    """
-    obj = {"cfg": config_load(), "debug": debug}
-    if output == "yaml":
-        obj["output"] = print_yaml
-    elif output == "flat":
-        obj["output"] = print_flat
-    else:
-        obj["output"] = print_json
+class Context(dict):
+    """CLI context, ``cfg`` is loaded from the exabgp conf on first access so
+    commands which don't need it (version, edit) never parse the conf.
+
+    With ``instances``, ``cfgs`` are their configs and commands which only
+    know ``cfg`` are refused."""
+
+    def __missing__(self, key):
+        if key == "cfg":
+            if self.get("instances"):
+                raise click.UsageError(
+                    "This command doesn't support --instance and "
+                    "--instances-dir."
+                )
+            with phase("config_load"):
+                self[key] = config_load()
+            return self[key]
+        if key == "cfgs":
+            # pylint: disable=import-outside-toplevel
+            from exabgpctl.instances import load_instances
+
+            with phase("load_instances"):
+                self[key] = load_instances(self["instances"])
+            return self[key]
+        raise KeyError(key)
+
+
+def _per_instance(ctx, func):
+    """func(cfg), or func of each instance config by instance name."""
+    if ctx.obj.get("instances"):
+        return ByInstance(
+            (name, func(cfg)) for name, cfg in ctx.obj["cfgs"].items()
+        )
+    return func(ctx.obj["cfg"])
+
+
+def create_context(output="json", debug=False, cfg=None):
+    """Create a context for CLI, config is loaded on first access unless
+    given (by the server)."""
+    obj = Context(debug=debug)
+    if cfg is not None:
+        obj["cfg"] = cfg
+    obj["output"] = get_output(output)
     return obj
 
 
@@ -56,7 +105,7 @@ def create_context(output="json", debug=False):
 
 def _ac_output(*_, **kwargs):
     """Autocomplete output"""
-    outputs = ["flat", "json", "yaml"]
+    outputs = sorted(OUTPUTS)
     if kwargs["incomplete"] is None:
         return outputs
     return [
@@ -66,44 +115,37 @@ def _ac_output(*_, **kwargs):
     ]
 
 
-def _ac_list_processes(*_, **kwargs):
-    """Autocomplete process names"""
-    context = create_context()
+def _ac_names(key, incomplete):
+    """Autocomplete names from the completion index"""
+    try:
+        names = completion_index()[key]
+    except ExabgpCTLError:
+        return []
     return [
-        process.lower()
-        for process in list_processes(context["cfg"])
-        if process.lower().startswith(kwargs["incomplete"].lower())
+        name.lower()
+        for name in names
+        if name.lower().startswith(incomplete.lower())
     ]
 
 
+def _ac_list_processes(*_, **kwargs):
+    """Autocomplete process names"""
+    return _ac_names("processes", kwargs["incomplete"])
+
+
 def _ac_list_processes_enable(*_, **kwargs):
     """Autocomplete enabled process names"""
-    context = create_context()
-    return [
-        process.lower()
-        for process in list_disabled_processes(context["cfg"])
-        if process.lower().startswith(kwargs["incomplete"].lower())
-    ]
+    return _ac_names("disabled", kwargs["incomplete"])
 
 
 def _ac_list_processes_disable(*_, **kwargs):
     """Autocomplete disbled process names"""
-    context = create_context()
-    return [
-        process.lower()
-        for process in list_enabled_processes(context["cfg"])
-        if process.lower().startswith(kwargs["incomplete"].lower())
-    ]
+    return _ac_names("enabled", kwargs["incomplete"])
 
 
 def _ac_list_neighbors(*_, **kwargs):
     """Autocomplete neighbours names"""
-    context = create_context()
-    return [
-        neighbor.lower()
-        for neighbor in list_neighbors(context["cfg"])
-        if neighbor.lower().startswith(kwargs["incomplete"].lower())
-    ]
+    return _ac_names("neighbors", kwargs["incomplete"])
 
 
 def _ac_list_key_version(*_, **kwargs):
@@ -135,6 +177,129 @@ OPTS = {
             "is_flag": True,
         },
     },
+    "timings": {
+        "args": ["--timings"],
+        "kwargs": {
+            "help": "Print wall and CPU time of each phase on stderr.",
+            "default": False,
+            "required": False,
+            "is_flag": True,
+        },
+    },
+    "profile": {
+        "args": ["--profile"],
+        "kwargs": {
+            "help": "Write a cProfile dump of the command (main thread) to "
+            "this file, see python -m pstats.",
+            "default": None,
+            "required": False,
+            "type": click.Path(dir_okay=False, writable=True),
+        },
+    },
+    "memory": {
+        "args": ["--memory"],
+        "kwargs": {
+            "help": "Print peak and retained memory of each phase and top "
+            "allocation sites on stderr (tracemalloc).",
+            "default": False,
+            "required": False,
+            "is_flag": True,
+        },
+    },
+    "instance": {
+        "args": ["--instance", "-i"],
+        "kwargs": {
+            "help": "Exabgp instance as name=conf:state (repeatable), output "
+            "of dump, status, list and status commands is by instance.",
+            "metavar": "NAME=CONF:STATE",
+            "multiple": True,
+            "required": False,
+            "type": click.STRING,
+        },
+    },
+    "instances_dir": {
+        "args": ["--instances-dir"],
+        "kwargs": {
+            "help": "Directory of <name>.env instance files with "
+            "EXABGPCTL_CONF and EXABGPCTL_STATE.",
+            "default": None,
+            "required": False,
+            "type": click.Path(exists=True, file_okay=False),
+        },
+    },
+    "probe_timeout": {
+        "args": ["--probe-timeout"],
+        "kwargs": {
+            "help": "Neighbor connect timeout in seconds.",
+            "default": PROBE_TIMEOUT,
+            "required": False,
+            "type": click.FLOAT,
+        },
+    },
+    "probe_concurrency": {
+        "args": ["--probe-concurrency"],
+        "kwargs": {
+            "help": "Max neighbors probed at the same time.",
+            "default": PROBE_CONCURRENCY,
+            "required": False,
+            "type": click.IntRange(min=1),
+        },
+    },
+    "probe_rate": {
+        "args": ["--probe-rate"],
+        "kwargs": {
+            "help": "Max neighbor probes started per second (unlimited).",
+            "default": None,
+            "required": False,
+            "type": click.FloatRange(min=0.1),
+        },
+    },
+    "check_workers": {
+        "args": ["--check-workers"],
+        "kwargs": {
+            "help": "Max healthcheck commands running at the same time.",
+            "default": CHECK_WORKERS,
+            "required": False,
+            "type": click.IntRange(min=1),
+        },
+    },
+    "check_pool": {
+        "args": ["--check-pool"],
+        "kwargs": {
+            "help": "Run healthcheck commands in threads or processes.",
+            "default": "thread",
+            "required": False,
+            "type": click.Choice(sorted(CHECK_POOLS)),
+        },
+    },
+    "deadline": {
+        "args": ["--deadline"],
+        "kwargs": {
+            "help": "Seconds allowed for all healthcheck commands, "
+            "unfinished ones are killed and reported as TIMEOUT.",
+            "default": None,
+            "required": False,
+            "type": click.FloatRange(min=0),
+        },
+    },
+    "check_ttl": {
+        "args": ["--check-ttl"],
+        "kwargs": {
+            "help": "Reuse healthcheck results younger than this (seconds).",
+            "default": CHECK_TTL,
+            "required": False,
+            "type": click.FloatRange(min=0),
+        },
+    },
+    "fresh": {
+        "args": ["--fresh"],
+        "kwargs": {
+            "help": "Run all healthcheck commands, ignore stored results.",
+            "default": False,
+            "required": False,
+            "is_flag": True,
+        },
+    },
     "list_processes": {
         "args": ["--disable", "-d"],
         "kwargs": {
@@ -153,18 +318,94 @@ OPTS = {
     },
     "process_disable": {
         "kwargs": {
-            "required": True,
+            "nargs": -1,
             "type": click.STRING,
             "autocompletion": _ac_list_processes_disable,
         }
     },
     "process_enable": {
         "kwargs": {
-            "required": True,
+            "nargs": -1,
             "type": click.STRING,
             "autocompletion": _ac_list_processes_enable,
         }
     },
+    "match": {
+        "args": ["--match", "-m"],
+        "kwargs": {
+            "help": "Select processes matching a glob pattern (repeatable).",
+            "multiple": True,
+            "required": False,
+            "type": click.STRING,
+        },
+    },
+    "regex": {
+        "args": ["--regex", "-r"],
+        "kwargs": {
+            "help": "--match patterns are regular expressions.",
+            "default": False,
+            "required": False,
+            "is_flag": True,
+        },
+    },
+    "from_file": {
+        "args": ["--from-file", "-f"],
+        "kwargs": {
+            "help": "Read process names from a file, one per line, - for "
+            "stdin.",
+            "default": None,
+            "required": False,
+            "type": click.File("r"),
+        },
+    },
+    "socket": {
+        "args": ["--socket", "-s", "socket_path"],
+        "kwargs": {
+            "help": "UNIX socket path, default EXABGPCTL_SOCKET environment "
+            "variable or /run/exabgpctl.sock.",
+            "default": None,
+            "required": False,
+            "type": click.Path(dir_okay=False),
+        },
+    },
+    "listen": {
+        "args": ["--listen", "-l"],
+        "kwargs": {
+            "help": "Serve /metrics on [address]:port, address defaults to "
+            "127.0.0.1, e.g. 0.0.0.0:9576 for all interfaces.",
+            "default": None,
+            "required": False,
+            "type": click.STRING,
+        },
+    },
+    "textfile": {
+        "args": ["--textfile", "-t"],
+        "kwargs": {
+            "help": "Write metrics to this file after each refresh, for "
+            "node_exporter textfile collector (*.prom).",
+            "default": None,
+            "required": False,
+            "type": click.Path(dir_okay=False),
+        },
+    },
+    "interval": {
+        "args": ["--interval"],
+        "kwargs": {
+            "help": "Seconds between metrics refreshes.",
+            "default": EXPORTER_INTERVAL,
+            "required": False,
+            "type": click.FloatRange(min=0.1),
+        },
+    },
+    "once": {
+        "args": ["--once"],
+        "kwargs": {
+            "help": "Refresh metrics once (with --textfile) and exit.",
+            "default": False,
+            "required": False,
+            "is_flag": True,
+        },
+    },
     "neighbor": {
         "kwargs": {
             "required": True,
@@ -189,28 +430,124 @@ OPTS = {
 @click.pass_context
 @click.option(*OPTS["output"]["args"], **OPTS["output"]["kwargs"])
 @click.option(*OPTS["debug"]["args"], **OPTS["debug"]["kwargs"])
-def cli(ctx, output, debug):
+@click.option(*OPTS["timings"]["args"], **OPTS["timings"]["kwargs"])
+@click.option(*OPTS["profile"]["args"], **OPTS["profile"]["kwargs"])
+@click.option(*OPTS["memory"]["args"], **OPTS["memory"]["kwargs"])
+@click.option(*OPTS["instance"]["args"], **OPTS["instance"]["kwargs"])
+@click.option(
+    *OPTS["instances_dir"]["args"], **OPTS["instances_dir"]["kwargs"]
+)
+# pylint: disable=too-many-arguments
+def cli(
+    ctx, output, debug, timings, profile, memory, instance, instances_dir
+):
     """ExaBGP admin CLI for managing processes."""
     ctx.ensure_object(dict)
-    ctx.obj = create_context(output, debug)
+    if (instance or instances_dir) and ctx.obj.get("cfg") is not None:
+        # the server only knows its own conf
+        raise click.UsageError(
+            "--instance and --instances-dir are not served.", ctx
+        )
+    ctx.obj = create_context(output, debug, ctx.obj.get("cfg"))
+    if instance or instances_dir:
+        # pylint: disable=import-outside-toplevel
+        from exabgpctl.instances import get_instances
+
+        ctx.obj["instances"] = get_instances(instance, instances_dir)
+    trace = get_trace_path()
+    if timings:
+        timings_start()
+        ctx.call_on_close(
+            lambda: click.echo(timings_stop().report(), err=True)
+        )
+    if trace:
+        trace_start()
+        ctx.call_on_close(lambda: trace_stop().write(trace))
+    if memory:
+        memory_start()
+        ctx.call_on_close(lambda: click.echo(memory_stop().report(), err=True))
+    if timings or trace or memory:
+        ctx.obj["output"] = _render_phase(ctx.obj["output"])
+    if profile:
+        _start_profile(ctx, profile)
+
+
+def _render_phase(printer):
+    """Printer whose calls are a render phase, for timings and tracing."""
+
+    def output(data):
+        with phase("render"):
+            printer(data)
+
+    return output
+
+
+def _start_profile(ctx, path):
+    """Profile the command, stats are written to path when it ends."""
+    import cProfile  # pylint: disable=import-outside-toplevel
+
+    profiler = cProfile.Profile()
+
+    def _dump_stats():
+        profiler.disable()
+        profiler.dump_stats(path)
+
+    profiler.enable()
+    ctx.call_on_close(_dump_stats)
 
 
 @cli.command(name="dump")
 @click.pass_context
 def dump(ctx):
     """Dump configuration into JSON, useful with jq."""
-    ctx.obj["output"](ctx.obj["cfg"])
+    ctx.obj["output"](_per_instance(ctx, lambda cfg: cfg))
 
 
 @cli.command(name="status")
 @click.pass_context
-def status(ctx):
+@click.option(*OPTS["probe_timeout"]["args"], **OPTS["probe_timeout"]["kwargs"])
+@click.option(
+    *OPTS["probe_concurrency"]["args"], **OPTS["probe_concurrency"]["kwargs"]
+)
+@click.option(*OPTS["probe_rate"]["args"], **OPTS["probe_rate"]["kwargs"])
+@click.option(*OPTS["check_workers"]["args"], **OPTS["check_workers"]["kwargs"])
+@click.option(*OPTS["check_pool"]["args"], **OPTS["check_pool"]["kwargs"])
+@click.option(*OPTS["deadline"]["args"], **OPTS["deadline"]["kwargs"])
+@click.option(*OPTS["check_ttl"]["args"], **OPTS["check_ttl"]["kwargs"])
+@click.option(*OPTS["fresh"]["args"], **OPTS["fresh"]["kwargs"])
+# pylint: disable=too-many-arguments
+def status(
+    ctx,
+    probe_timeout,
+    probe_concurrency,
+    probe_rate,
+    check_workers,
+    check_pool,
+    deadline,
+    check_ttl,
+    fresh,
+):
     """Status configuration into JSON, useful with jq."""
     ctx.obj["output"](
-        {
-            "processes": status_processes(ctx.obj["cfg"]),
-            "neighbors": status_neighbors(ctx.obj["cfg"]),
-        }
+        _per_instance(
+            ctx,
+            lambda cfg: {
+                "processes": status_processes(
+                    cfg,
+                    workers=check_workers,
+                    pool=check_pool,
+                    deadline=deadline,
+                    ttl=check_ttl,
+                    fresh=fresh,
+                ),
+                "neighbors": status_neighbors(
+                    cfg,
+                    timeout=probe_timeout,
+                    concurrency=probe_concurrency,
+                    rate=probe_rate,
+                ),
+            },
+        )
     )
 
 
@@ -223,11 +560,77 @@ def version(ctx, key):
 
 
 @cli.command(name="edit")
-@click.pass_context
-def edit(ctx):
+def edit():
     """Edit exabgp config, change EDITOR environment variable
     to change default editor."""
-    click.edit(filename=ctx.obj["cfg"]["path"])
+    click.edit(filename=get_conf_path())
+
+
+@cli.command(name="serve")
+@click.option(*OPTS["socket"]["args"], **OPTS["socket"]["kwargs"])
+def serve_socket(socket_path):
+    """Keep the config in memory and serve read-only commands (dump, status,
+    list, show...) on a UNIX socket, used by exabgpctl when it exists."""
+    # pylint: disable=import-outside-toplevel
+    from exabgpctl.server import get_socket_path, serve
+
+    serve(socket_path or get_socket_path(), cli)
+
+
+@cli.command(name="exporter")
+@click.pass_context
+@click.option(*OPTS["listen"]["args"], **OPTS["listen"]["kwargs"])
+@click.option(*OPTS["textfile"]["args"], **OPTS["textfile"]["kwargs"])
+@click.option(*OPTS["interval"]["args"], **OPTS["interval"]["kwargs"])
+@click.option(*OPTS["once"]["args"], **OPTS["once"]["kwargs"])
+@click.option(*OPTS["probe_timeout"]["args"], **OPTS["probe_timeout"]["kwargs"])
+@click.option(
+    *OPTS["probe_concurrency"]["args"], **OPTS["probe_concurrency"]["kwargs"]
+)
+@click.option(*OPTS["probe_rate"]["args"], **OPTS["probe_rate"]["kwargs"])
+@click.option(*OPTS["check_workers"]["args"], **OPTS["check_workers"]["kwargs"])
+@click.option(*OPTS["check_pool"]["args"], **OPTS["check_pool"]["kwargs"])
+@click.option(*OPTS["deadline"]["args"], **OPTS["deadline"]["kwargs"])
+@click.option(*OPTS["check_ttl"]["args"], **OPTS["check_ttl"]["kwargs"])
+# pylint: disable=too-many-arguments
+def exporter(
+    ctx,
+    listen,
+    textfile,
+    interval,
+    once,
+    probe_timeout,
+    probe_concurrency,
+    probe_rate,
+    check_workers,
+    check_pool,
+    deadline,
+    check_ttl,
+):
+    """Export process and neighbor statuses as Prometheus metrics, computed
+    every interval (deadline defaults to interval)."""
+    if not listen and not textfile:
+        raise click.UsageError("--listen or --textfile is required", ctx)
+    if once and not textfile:
+        raise click.UsageError("--once requires --textfile", ctx)
+    # pylint: disable=import-outside-toplevel
+    from exabgpctl.exporter import run_exporter
+
+    check = {"workers": check_workers, "pool": check_pool, "ttl": check_ttl}
+    if deadline is not None:
+        check["deadline"] = deadline
+    run_exporter(
+        listen=listen,
+        textfile=textfile,
+        interval=interval,
+        once=once,
+        check=check,
+        probe={
+            "timeout": probe_timeout,
+            "concurrency": probe_concurrency,
+            "rate": probe_rate,
+        },
+    )
 
 
 # Processes
@@ -251,7 +654,7 @@ def process_list(ctx, disable):
     if disable:
         func = list_disabled_processes
 
-    ctx.obj["output"](sorted(func(ctx.obj["cfg"])))
+    ctx.obj["output"](_per_instance(ctx, lambda cfg: sorted(func(cfg))))
 
 
 @process_g.command(name="show")
@@ -262,20 +665,66 @@ def process_show(ctx, process):
     ctx.obj["output"](get_process(ctx.obj["cfg"], process))
 
 
+# pylint: disable=too-many-arguments
+def _bulk_processes(ctx, process, match, regex, from_file, func, bulk_func):
+    """Run func on a single process, or bulk_func on the selection of names,
+    patterns and file. In bulk mode exit 1 if any process failed."""
+    if len(process) == 1 and not match and not from_file:
+        ctx.obj["output"](func(ctx.obj["cfg"], process[0]))
+        return
+
+    names = list(process)
+    if from_file:
+        names.extend(
+            line.strip()
+            for line in from_file
+            if line.strip() and not line.strip().startswith("#")
+        )
+    if not names and not match:
+        raise click.UsageError("Missing process, --match or --from-file.")
+
+    selected = select_processes(ctx.obj["cfg"], names, match, regex)
+    if not selected:
+        raise ExabgpCTLError("No process matches %s" % ", ".join(match))
+
+    result = bulk_func(ctx.obj["cfg"], selected)
+    ctx.obj["output"](result)
+    if not all(result.values()):
+        ctx.exit(1)
+
+
 @process_g.command(name="enable")
 @click.pass_context
 @click.argument("process", **OPTS["process_enable"]["kwargs"])
-def process_enable(ctx, process):
+@click.option(*OPTS["match"]["args"], **OPTS["match"]["kwargs"])
+@click.option(*OPTS["regex"]["args"], **OPTS["regex"]["kwargs"])
+@click.option(*OPTS["from_file"]["args"], **OPTS["from_file"]["kwargs"])
+# pylint: disable=too-many-arguments
+def process_enable(ctx, process, match, regex, from_file):
     """Enable process maintenance"""
-    ctx.obj["output"](enable_process(ctx.obj["cfg"], process))
+    _bulk_processes(
+        ctx, process, match, regex, from_file, enable_process, enable_processes
+    )
 
 
 @process_g.command(name="disable")
 @click.pass_context
 @click.argument("process", **OPTS["process_disable"]["kwargs"])
-def process_disable(ctx, process):
+@click.option(*OPTS["match"]["args"], **OPTS["match"]["kwargs"])
+@click.option(*OPTS["regex"]["args"], **OPTS["regex"]["kwargs"])
+@click.option(*OPTS["from_file"]["args"], **OPTS["from_file"]["kwargs"])
+# pylint: disable=too-many-arguments
+def process_disable(ctx, process, match, regex, from_file):
     """Disable process maintenance"""
-    ctx.obj["output"](disable_process(ctx.obj["cfg"], process))
+    _bulk_processes(
+        ctx,
+        process,
+        match,
+        regex,
+        from_file,
+        disable_process,
+        disable_processes,
+    )
 
 
 @process_g.command(name="state")
@@ -283,14 +732,33 @@ def process_disable(ctx, process):
 @click.argument("process", **OPTS["process"]["kwargs"])
 def process_state(ctx, process):
     """Change process state"""
-    ctx.obj["output"](state_process(ctx.obj["cfg"], process))
+    # run by exabgp on each state change, must not parse the config
+    ctx.obj["output"](write_state(get_state_path(), process))
 
 
 @process_g.command(name="status")
 @click.pass_context
-def process_status(ctx):
+@click.option(*OPTS["check_workers"]["args"], **OPTS["check_workers"]["kwargs"])
+@click.option(*OPTS["check_pool"]["args"], **OPTS["check_pool"]["kwargs"])
+@click.option(*OPTS["deadline"]["args"], **OPTS["deadline"]["kwargs"])
+@click.option(*OPTS["check_ttl"]["args"], **OPTS["check_ttl"]["kwargs"])
+@click.option(*OPTS["fresh"]["args"], **OPTS["fresh"]["kwargs"])
+# pylint: disable=too-many-arguments
+def process_status(ctx, check_workers, check_pool, deadline, check_ttl, fresh):
     """Status of all processs."""
-    ctx.obj["output"](status_processes(ctx.obj["cfg"]))
+    ctx.obj["output"](
+        _per_instance(
+            ctx,
+            lambda cfg: status_processes(
+                cfg,
+                workers=check_workers,
+                pool=check_pool,
+                deadline=deadline,
+                ttl=check_ttl,
+                fresh=fresh,
+            ),
+        )
+    )
 
 
 # Neighbours
@@ -315,18 +783,41 @@ def neighbor_show(ctx, neighbor):
 @click.pass_context
 def neighbor_list(ctx):
     """List neighbors."""
-    ctx.obj["output"](sorted(list_neighbors(ctx.obj["cfg"])))
+    ctx.obj["output"](
+        _per_instance(ctx, lambda cfg: sorted(list_neighbors(cfg)))
+    )
 
 
 @neighbor_g.command(name="status")
 @click.pass_context
-def neighbor_status(ctx):
+@click.option(*OPTS["probe_timeout"]["args"], **OPTS["probe_timeout"]["kwargs"])
+@click.option(
+    *OPTS["probe_concurrency"]["args"], **OPTS["probe_concurrency"]["kwargs"]
+)
+@click.option(*OPTS["probe_rate"]["args"], **OPTS["probe_rate"]["kwargs"])
+def neighbor_status(ctx, probe_timeout, probe_concurrency, probe_rate):
     """status neighbors."""
-    ctx.obj["output"](status_neighbors(ctx.obj["cfg"]))
+    ctx.obj["output"](
+        _per_instance(
+            ctx,
+            lambda cfg: status_neighbors(
+                cfg,
+                timeout=probe_timeout,
+                concurrency=probe_concurrency,
+                rate=probe_rate,
+            ),
+        )
+    )
 
 
 def main():
     """main"""
+    # pylint: disable=import-outside-toplevel
+    from exabgpctl.server import client
+
+    code = client(cli, sys.argv[1:])
+    if code is not None:
+        sys.exit(code)
     try:
         cli()  # pylint: disable=no-value-for-parameter
     # catch only exabgp errors
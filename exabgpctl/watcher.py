@@ -0,0 +1,459 @@
+# -*- coding: utf-8 -*-
+"""
+exabgpctl.watcher
+~~~~~~~~~~~~~~~~~
+
+Keep a config up to date in long running mode (server, exporter...)
+instead of calling config_load again and rebuilding everything.
+
+Changes of the conf file, the state dir and the maintenance dirs are seen
+with inotify (Linux) or by polling mtimes, and applied incrementally:
+
+* conf: only run lines which changed are parsed by healthcheck, unchanged
+  processes and neighbors keep their dicts and their maintenance state.
+* maintenance: only touched files are checked again (a read of the dir when
+  polling).
+* state: only touched state files are read again.
+"""
+from __future__ import print_function
+
+# standard
+import os
+import errno
+import time
+import select
+import struct
+
+# local
+from exabgpctl.controller import (
+    config_load,
+    get_conf_path,
+    maintenance_dirs,
+    ExabgpCTLError,
+)
+from exabgpctl._py6 import fsdecode, fsencode, iteritems, monotonic
+
+POLL_INTERVAL = 1
+# inotify(7) flags
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+# files created, removed or replaced in a dir
+IN_DIR_CHANGED = (
+    IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE_SELF
+)
+WATCH_MASKS = {
+    "conf": IN_DIR_CHANGED | IN_CLOSE_WRITE | IN_ATTRIB,
+    "state": IN_DIR_CHANGED | IN_CLOSE_WRITE | IN_MODIFY,
+    "maintenance": IN_DIR_CHANGED,
+}
+# exabgp gives a new uid to neighbors on each parse
+NEIGHBOR_VOLATILE = ("uid",)
+
+
+class Inotify(object):
+    """Minimal inotify binding using ctypes.
+
+    Raises:
+        OSError: when inotify is not available.
+    """
+
+    _EVENT = struct.Struct("iIII")
+
+    def __init__(self):
+        # pylint: disable=import-outside-toplevel
+        import ctypes
+        import ctypes.util
+
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        try:
+            self._add_watch = libc.inotify_add_watch
+            self._rm_watch = libc.inotify_rm_watch
+            init = libc.inotify_init1
+        except AttributeError:
+            raise OSError(errno.ENOSYS, "inotify is not available")
+        self._get_errno = ctypes.get_errno
+        self.fd = init(os.O_NONBLOCK | getattr(os, "O_CLOEXEC", 0))
+        if self.fd < 0:
+            raise OSError(self._get_errno(), "inotify_init1 failed")
+
+    def add(self, path, mask):
+        """Watch a path.
+
+        Returns:
+            int: watch descriptor.
+
+        Raises:
+            OSError: path can't be watched (doesn't exists...).
+        """
+        wd = self._add_watch(self.fd, fsencode(path), mask)
+        if wd < 0:
+            err = self._get_errno()
+            raise OSError(err, os.strerror(err), path)
+        return wd
+
+    def remove(self, wd):
+        """Stop watching, IN_IGNORED will be read."""
+        self._rm_watch(self.fd, wd)
+
+    def read(self, timeout=0):
+        """Read events.
+
+        Args:
+            timeout (float): seconds to wait for the first event.
+
+        Returns:
+            list: (watch descriptor, mask, name) of each event.
+        """
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        try:
+            data = os.read(self.fd, 65536)
+        except OSError as err:
+            if err.errno in (errno.EAGAIN, errno.EINTR):
+                return []
+            raise
+        events = []
+        offset = 0
+        while offset + self._EVENT.size <= len(data):
+            wd, mask, _, size = self._EVENT.unpack_from(data, offset)
+            offset += self._EVENT.size
+            name = data[offset : offset + size].rstrip(b"\0")
+            offset += size
+            events.append((wd, mask, fsdecode(name)))
+        return events
+
+    def close(self):
+        """Close the inotify fd."""
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def _mtime(path):
+    """mtime (ns when available) and size, None if the path doesn't
+    exists."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return getattr(stat, "st_mtime_ns", stat.st_mtime), stat.st_size
+
+
+def _read_state(path):
+    """Content of a state file, UNKNOWN when missing like status_processes."""
+    try:
+        with open(path) as fds:
+            return fds.read().strip()
+    except (IOError, OSError):
+        return "UNKNOWN"
+
+
+def _same(old, new, ignore=()):
+    """Dicts are equal, except ignored keys."""
+    if not ignore:
+        return old == new
+    return len(old) == len(new) and all(
+        key in ignore or key in old and old[key] == value
+        for key, value in iteritems(new)
+    )
+
+
+class ConfigWatcher(object):
+    """Keep a config, its disabled processes and process states up to date.
+
+    Changes are applied by poll(), the config object is replaced when the
+    conf changed and updated in place otherwise.
+
+    Args:
+        backend (str, optional): ``inotify`` or ``poll``, inotify when
+            available.
+        interval (float, optional): seconds between checks when polling.
+
+    Attributes:
+        cfg (Config): current config.
+        states (dict): state of each process, read from its state file.
+
+    Raises:
+        ExabgpCTLError: unknown or unavailable backend, see config_load.
+
+    Examples:
+        >>> watcher = ConfigWatcher()
+        >>> while True:
+        ...     if watcher.poll(timeout=10):
+        ...         print(list_disabled_processes(watcher.cfg))
+    """
+
+    def __init__(self, backend=None, interval=POLL_INTERVAL):
+        self.cfg = None
+        self.states = {}
+        self.interval = interval
+        self._inotify = None
+        self._wds = {}
+        self._conf = None
+        self._files = {}
+        self._polled = {}
+        if backend not in (None, "inotify", "poll"):
+            raise ExabgpCTLError("Unknown watcher backend %s" % backend)
+        if backend != "poll":
+            try:
+                self._inotify = Inotify()
+            except OSError as err:
+                if backend == "inotify":
+                    raise ExabgpCTLError("inotify is not available: %s" % err)
+        self.load()
+
+    @property
+    def backend(self):
+        """``inotify`` or ``poll``."""
+        return "poll" if self._inotify is None else "inotify"
+
+    def close(self):
+        """Stop watching."""
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def load(self):
+        """Load the conf, maintenance and states again from scratch."""
+        self._conf = _mtime(get_conf_path())
+        self.cfg = config_load()
+        self._index()
+        self.states = {
+            name: _read_state(path)
+            for (kind, path), names in iteritems(self._files)
+            if kind == "state"
+            for name in names
+        }
+        self._watch()
+
+    def reload(self):
+        """Load the conf again, unchanged processes and neighbors are kept
+        with their maintenance state and state."""
+        old = self.cfg
+        self._conf = _mtime(get_conf_path())
+        cfg = config_load()
+
+        index = old.index("processes")
+        changed = []
+        processes = []
+        for process in cfg["processes"]:
+            previous = index.get(process["name"])
+            if previous is not None and _same(previous, process):
+                processes.append(previous)
+            else:
+                processes.append(process)
+                changed.append(process["name"])
+        cfg["processes"] = processes
+
+        index = old.index("neighbors")
+        cfg["neighbors"] = [
+            index[neighbor["name"]]
+            if neighbor["name"] in index
+            and _same(index[neighbor["name"]], neighbor, NEIGHBOR_VOLATILE)
+            else neighbor
+            for neighbor in cfg["neighbors"]
+        ]
+
+        cfg.memoize(
+            "disabled",
+            "processes",
+            (old.disabled() - set(changed)) & set(cfg.index("processes")),
+        )
+        cfg.refresh_disabled(names=changed)
+        self.cfg = cfg
+        self._index()
+        states = {}
+        for (kind, path), names in iteritems(self._files):
+            if kind == "state":
+                for name in names:
+                    states[name] = (
+                        self.states[name]
+                        if name in self.states and name not in changed
+                        else _read_state(path)
+                    )
+        self.states = states
+        self._watch()
+
+    def _index(self):
+        """Map watched files to the processes they belong to."""
+        cfg = self.cfg
+        self._files = {("conf", os.path.abspath(cfg["path"])): []}
+        for process in cfg["processes"]:
+            path = "%s/%s" % (cfg["state"], process["name"])
+            key = ("state", os.path.abspath(path))
+            self._files.setdefault(key, []).append(process["name"])
+            path = process["run"].get("disable")
+            if path:
+                key = ("maintenance", os.path.abspath(path))
+                self._files.setdefault(key, []).append(process["name"])
+
+    def _dirs(self):
+        """Watched dirs and their kinds (conf, state, maintenance)."""
+        cfg = self.cfg
+        dirs = {
+            os.path.dirname(os.path.abspath(cfg["path"])): set(["conf"]),
+        }
+        dirs.setdefault(os.path.abspath(cfg["state"]), set()).add("state")
+        for dirname in maintenance_dirs(cfg):
+            dirs.setdefault(os.path.abspath(dirname), set()).add("maintenance")
+        return dirs
+
+    def _watch(self):
+        """Watch dirs with inotify, dirs which can't be watched are polled."""
+        dirs = self._dirs()
+        self._polled = {}
+        if self._inotify is None:
+            # state files are polled one by one, a write doesn't change the
+            # mtime of the dir
+            self._polled = {
+                path: _mtime(path)
+                for (kind, path) in self._files
+                if kind == "state"
+            }
+            self._polled.update(
+                (dirname, _mtime(dirname))
+                for dirname, kinds in iteritems(dirs)
+                if "maintenance" in kinds
+            )
+            return
+
+        watched = dict((dirname, wd) for wd, dirname in iteritems(self._wds))
+        for dirname, wd in iteritems(watched):
+            if dirname not in dirs:
+                self._inotify.remove(wd)
+                del self._wds[wd]
+        for dirname, kinds in iteritems(dirs):
+            mask = 0
+            for kind in kinds:
+                mask |= WATCH_MASKS[kind]
+            try:
+                # mask of an existing watch is replaced
+                self._wds[self._inotify.add(dirname, mask)] = dirname
+            except OSError:
+                # doesn't exists yet
+                self._polled[dirname] = _mtime(dirname)
+
+    def poll(self, timeout=0):
+        """Wait for changes and apply them.
+
+        Args:
+            timeout (float, optional): max seconds to wait for a change.
+
+        Returns:
+            set: what changed, ``conf``, ``maintenance`` and/or ``state``.
+        """
+        end = monotonic() + timeout
+        while True:
+            if self._inotify is not None:
+                wait = max(0, end - monotonic())
+                if self._polled:
+                    wait = min(wait, self.interval)
+                touched = self._read_events(wait)
+            else:
+                touched = self._stat()
+            if self._polled and self._inotify is not None:
+                touched.update(self._stat())
+            changes = self._apply(touched)
+            if changes or monotonic() >= end:
+                return changes
+            if self._inotify is None:
+                # wait before polling again
+                time.sleep(min(self.interval, end - monotonic()))
+
+    def _read_events(self, timeout):
+        """Files touched according to inotify."""
+        touched = set()
+        for wd, mask, name in self._inotify.read(timeout):
+            if mask & IN_Q_OVERFLOW:
+                # events lost
+                touched.add(("reload", None))
+                continue
+            dirname = self._wds.get(wd)
+            if dirname is None:
+                continue
+            if mask & (IN_IGNORED | IN_DELETE_SELF | IN_MOVE_SELF):
+                # dir removed, polled until it comes back
+                touched.add(("reload", None))
+                continue
+            touched.add(os.path.join(dirname, name))
+        return touched
+
+    def _stat(self):
+        """Files (or dirs) touched according to their mtime."""
+        touched = set()
+        conf = os.path.abspath(self.cfg["path"])
+        if _mtime(conf) != self._conf:
+            touched.add(conf)
+        for path, mtime in iteritems(self._polled):
+            if _mtime(path) != mtime:
+                touched.add(path)
+        return touched
+
+    def _apply(self, touched):
+        """Apply changes of touched paths."""
+        if not touched:
+            return set()
+        changes = set()
+        conf = os.path.abspath(self.cfg["path"])
+        try:
+            if ("reload", None) in touched:
+                # events lost or a dir removed, everything is read again
+                self.load()
+                return set(["conf", "maintenance", "state"])
+            if conf in touched and _mtime(conf) != self._conf:
+                self.reload()
+                changes.add("conf")
+        except (OSError, ExabgpCTLError):
+            # conf missing or being replaced, wait for the next change
+            return changes
+
+        names = set()
+        dirs = set()
+        maintenance = set(
+            os.path.dirname(path)
+            for (kind, path) in self._files
+            if kind == "maintenance"
+        )
+        for path in touched:
+            if path in maintenance:
+                # polled dir, its files are read again
+                dirs.add(path)
+            names.update(self._files.get(("maintenance", path), ()))
+            for name in self._files.get(("state", path), ()):
+                self.states[name] = _read_state(path)
+                changes.add("state")
+            if path in self._polled:
+                self._polled[path] = _mtime(path)
+        if names or dirs:
+            self.cfg.refresh_disabled(
+                names=names,
+                dirs=set(
+                    os.path.dirname(process["run"]["disable"])
+                    for process in self.cfg["processes"]
+                    if process["run"].get("disable")
+                    and os.path.dirname(
+                        os.path.abspath(process["run"]["disable"])
+                    )
+                    in dirs
+                ),
+            )
+            changes.add("maintenance")
+        if self._inotify is not None and dirs:
+            # polled dirs created meanwhile are watched
+            self._watch()
+        return changes
@@ -37,6 +37,7 @@ setup(
     packages=find_packages(),
     package_data={"": ["README.md"]},
     install_requires=open("requirements.txt").read().splitlines(),
+    extras_require={"msgpack": ["msgpack"]},
     entry_points={"console_scripts": ["exabgpctl = exabgpctl.view:main"]},
     python_requires=">=2.7,!=3.0.*,!=3.1.*,!=3.2.*,!=3.3.*",
     classifiers=[
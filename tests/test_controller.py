@@ -1,9 +1,14 @@
 # -*- coding: utf-8 -*-
 # standard
 import os
+import sys
 import json
+import argparse
+import time
 import shutil
+import threading
 import tempfile
+from concurrent import futures
 
 # third
 import yaml
@@ -26,14 +31,12 @@ def config():
     return controller.config_load()
 
 
+@patch("platform.python_version", MagicMock(return_value="3.7.1"))
+@patch(
+    "platform.platform",
+    MagicMock(return_value="Linux-4.4.0-138-generic-x86_64-with"),
+)
 def test_get_version():
-    controller.platform = MagicMock()
-    controller.platform.python_version.return_value = "3.7.1"
-    controller.platform.platform.return_value = (
-        "Linux-4.4.0-138-generic-x86_64-with"
-    )
-    controller.platform.close.return_value = True
-
     assert controller.get_version()["python"] == "3.7.1"
     assert (
         controller.get_version()["os"] == "Linux-4.4.0-138-generic-x86_64-with"
@@ -58,6 +61,7 @@ def test_config_load(tmpdir):
     os.environ["EXABGPCTL_STATE"] = str(tmpdir)
     data = controller.config_load()
 
+    assert isinstance(data, controller.Config)
     assert data["state"] == os.environ["EXABGPCTL_STATE"]
     assert data["path"] == os.environ["EXABGPCTL_CONF"]
     assert data["version"] == controller.get_version()
@@ -74,7 +78,7 @@ def test_config_load(tmpdir):
     ]
 
 
-def test_tcping():
+def test_tcping(capsys):
     controller.socket = MagicMock()
 
     controller.socket.socket().connect_ex.return_value = 1
@@ -87,6 +91,8 @@ def test_tcping():
         "General Error!"
     )
     assert controller.tcping("localhost", "1234") == (False, -1)
+    out, err = capsys.readouterr()
+    assert (out, err) == ("", "localhost:1234: General Error!\n")
 
 
 def test_flat():
@@ -109,6 +115,38 @@ def test_flat():
     assert controller.flat(data) == expected
 
 
+def test_iter_flat():
+    data = {
+        "a": {"x": 1},
+        "a!": 2,
+        "b": list(range(11)),
+        "c": [{"d": {"e": 3}}, ["f"]],
+        "g": {},
+    }
+    # same order as sorted(flat(data))
+    assert list(controller.iter_flat(data)) == sorted(
+        controller.flat(data).items()
+    )
+    assert [key for key, _ in controller.iter_flat(data)][:5] == [
+        "a!",
+        "a__x",
+        "b[0]",
+        "b[10]",
+        "b[1]",
+    ]
+    assert ("c[0]__d__e", 3) in controller.iter_flat(data)
+    assert ("c[1]", ["f"]) in controller.iter_flat(data)
+
+    # last value wins on duplicated keys
+    assert list(controller.iter_flat({"a": {"b": 1}, "a__b": 2})) == [
+        ("a__b", 2)
+    ]
+    assert list(controller.iter_flat(["one", {"two": 2}])) == [
+        ("[0]", "one"),
+        ("[1]__two", 2),
+    ]
+
+
 def test_print(capsys):
     data = {
         "key1": {
@@ -129,13 +167,17 @@ key2[2]=three
     out, err = capsys.readouterr()
     assert json.loads(out) == data
 
+    controller.print_json(data)
+    out, err = capsys.readouterr()
+    assert out == json.dumps(data, indent=4) + "\n"
+
     controller.print_json("data")
     out, err = capsys.readouterr()
     assert out == "data\n"
 
     controller.print_yaml(data)
     out, err = capsys.readouterr()
-    assert yaml.load(out) == data
+    assert yaml.safe_load(out) == data
 
     controller.print_yaml("data")
     out, err = capsys.readouterr()
@@ -220,21 +262,25 @@ def test_status_processes(config):
             "state_path": "/tmp/%s" % config["processes"][0]["name"],
             "command": True,
             "command_check": "/bin/true",
+            "command_result": "OK",
         },
         config["processes"][1]["name"]: {
             "state": "DOWN",
             "state_path": "/tmp/%s" % config["processes"][1]["name"],
             "command": False,
             "command_check": "/bin/false",
+            "command_result": "FAILED",
         },
         config["processes"][2]["name"]: {
             "state": "UNKNOWN",
             "state_path": "/tmp/%s" % config["processes"][2]["name"],
             "command": False,
             "command_check": "/bin/false",
+            "command_result": "FAILED",
         },
     }
     assert controller.status_processes(config) == expected
+    assert controller.status_processes(config, pool="process") == expected
 
     try:
         os.unlink("/tmp/%s" % config["processes"][0]["name"])
@@ -283,3 +329,766 @@ def test_status_neighbors(config):
     }
 
     assert controller.status_neighbors(config) == expected
+
+
+def test_config_load_cache(tmpdir, monkeypatch):
+    conf = tmpdir.join("exabgp.conf")
+    if _py6.PY2:
+        conf.write(open("examples/exabgp3.conf").read())
+    else:
+        conf.write(open("examples/exabgp4.conf").read())
+    monkeypatch.setenv("EXABGPCTL_CONF", str(conf))
+    monkeypatch.setenv("EXABGPCTL_STATE", str(tmpdir))
+
+    controller._IP_CACHE.clear()
+    data = controller.config_load()
+    assert tmpdir.join(".exabgpctl", "config.json").check()
+    # IPs are stored without their metadata, which is not computed
+    stored = tmpdir.join(".exabgpctl", "config.json").read()
+    assert controller.CACHE_IP_KEY in stored
+    assert "reverse_pointer" not in stored
+    for process in data["processes"]:
+        for info in process["run"]["ips"].values():
+            assert list(info.values) == ["compressed"]
+
+    controller._IP_CACHE.clear()
+    cached = controller.config_load()
+    info = cached["processes"][0]["run"]["ips"]["10.0.0.1/32"]
+    assert isinstance(info, controller.IPInfo)
+    assert info.values == {}
+    assert info == data["processes"][0]["run"]["ips"]["10.0.0.1/32"]
+    # normalized result is json serializable, IP metadata is lazy
+    json.dumps(data, default=controller.json_default)
+    assert dict(info) == dict(data["processes"][0]["run"]["ips"]["10.0.0.1/32"])
+
+    with patch("exabgpctl.controller._config_parse") as parse:
+        assert controller.config_load() == data
+        assert not parse.called
+
+        parse.return_value = {"processes": [], "neighbors": []}
+        assert controller.config_load(cache=False)["processes"] == []
+        assert parse.call_count == 1
+
+        # any edit invalidates the cache
+        conf.write(conf.read().replace("service3", "service4"))
+        assert controller.config_load()["processes"] == []
+        assert parse.call_count == 2
+
+
+def test_config_load_cache_config_files(tmpdir, monkeypatch):
+    if _py6.PY2:
+        content = open("examples/exabgp3.conf").read()
+    else:
+        content = open("examples/exabgp4.conf").read()
+    healthcheck = tmpdir.join("healthcheck.conf")
+    healthcheck.write("interval=10\n")
+    conf = tmpdir.join("exabgp.conf")
+    conf.write(
+        content.replace(
+            "--name service1.exabgp.lan",
+            "--name service1.exabgp.lan --config %s" % healthcheck,
+        )
+    )
+    monkeypatch.setenv("EXABGPCTL_CONF", str(conf))
+    monkeypatch.setenv("EXABGPCTL_STATE", str(tmpdir))
+
+    processes = controller.config_load().index("processes")
+    assert processes["service1.exabgp.lan"]["run"]["interval"] == 10
+
+    # the exabgp conf is unchanged but the healthcheck conf is parsed again
+    healthcheck.write("interval=20\n")
+    processes = controller.config_load().index("processes")
+    assert processes["service1.exabgp.lan"]["run"]["interval"] == 20
+
+
+def test_token_bucket():
+    bucket = controller.TokenBucket(100, burst=2)
+    start = time.time()
+    for _ in range(4):
+        bucket.acquire()
+    # 2 tokens in the burst then 2 more at 100/s
+    assert 0.01 < time.time() - start < 0.5
+
+
+def test_probe_neighbors(config):
+    def slow_tcping(address, port, timeout):
+        time.sleep(0.2)
+        return (address == "192.168.0.1", 0 if address == "192.168.0.1" else 1)
+
+    config["neighbors"] = config["neighbors"] * 5
+    with patch("exabgpctl.controller.tcping", side_effect=slow_tcping) as ping:
+        start = time.time()
+        result = controller.probe_neighbors(config, timeout=0.3, concurrency=10)
+        # all probes run concurrently
+        assert time.time() - start < 0.2 * 5
+        ping.assert_called_with("192.168.0.2", 179, 0.3)
+
+    assert result["192.168.0.1"]["status"] == True
+    assert result["192.168.0.1"]["code"] == 0
+    assert result["192.168.0.1"]["elapsed"] >= 0.2
+    assert result["192.168.0.2"]["status"] == False
+    assert result["192.168.0.2"]["port"] == 179
+
+    neighbor = dict(config["neighbors"][0], connect=1790)
+    with patch("exabgpctl.controller.tcping", return_value=(True, 0)) as ping:
+        result = controller.probe_neighbors({"neighbors": [neighbor]})
+        ping.assert_called_with("192.168.0.1", 1790, controller.PROBE_TIMEOUT)
+    assert result["192.168.0.1"]["port"] == 1790
+
+    assert controller.probe_neighbors({"neighbors": []}) == {}
+
+
+def test_check_command():
+    assert controller.check_command(None)["result"] == "OK"
+    assert controller.check_command("/bin/true", 5)["result"] == "OK"
+    assert controller.check_command("/bin/false", 5)["result"] == "FAILED"
+
+    result = controller.check_command("sleep 5", 0.2)
+    assert result["result"] == "TIMEOUT"
+    assert result["duration"] < 1
+
+    deadline = controller.monotonic() + 0.2
+    result = controller.check_command("sleep 5", 5, deadline)
+    assert result["result"] == "TIMEOUT"
+    assert result["duration"] < 1
+
+    # deadline already expired, the command is not started
+    assert controller.check_command("/bin/true", 5, deadline) == {
+        "result": "TIMEOUT",
+        "duration": 0.0,
+    }
+
+
+def test_check_processes(config):
+    config["processes"][0]["run"]["command"] = "/bin/true"
+    config["processes"][1]["run"]["command"] = "sleep 5"
+    config["processes"][2]["run"]["command"] = "sleep 5"
+
+    start = time.time()
+    result = controller.check_processes(config, workers=1, deadline=0.3)
+    assert time.time() - start < 2
+    assert result[config["processes"][0]["name"]]["result"] == "OK"
+    assert result[config["processes"][1]["name"]]["result"] == "TIMEOUT"
+    assert result[config["processes"][2]["name"]]["result"] == "TIMEOUT"
+
+    # already expired, nothing is run
+    start = time.time()
+    result = controller.check_processes(config, deadline=0)
+    assert time.time() - start < 1
+    assert [check["result"] for check in result.values()] == ["TIMEOUT"] * 3
+
+    with pytest.raises(controller.ExabgpCTLError):
+        controller.check_processes(config, pool="raise")
+
+
+def test_check_processes_ttl(config, tmpdir):
+    config["state"] = str(tmpdir)
+    for process in config["processes"]:
+        process["run"]["command"] = "/bin/true"
+    config["processes"][2]["run"]["command"] = "sleep 5"
+
+    result = controller.check_processes(config, deadline=0.3, ttl=60)
+    assert tmpdir.join(".exabgpctl", "checks.json").check()
+    name = config["processes"][0]["name"]
+
+    with patch("exabgpctl.controller.check_command") as check:
+        check.return_value = {"result": "FAILED", "duration": 0.1}
+        cached = controller.check_processes(config, ttl=60)
+        # timeouts are never stored
+        assert check.call_count == 1
+        assert cached[name] == result[name]
+
+        # fresh run
+        assert controller.check_processes(config)[name]["result"] == "FAILED"
+
+        # command changed
+        config["processes"][0]["run"]["command"] = "/bin/false"
+        cached = controller.check_processes(config, ttl=60)
+        assert cached[name]["result"] == "FAILED"
+
+
+def test_config_index(capsys):
+    cfg = controller.Config(
+        processes=[{"name": "one"}, {"name": "two"}, {"name": "one", "x": 1}]
+    )
+    assert cfg.index("processes")["one"] == {"name": "one"}
+    assert cfg.index("processes") is cfg.index("processes")
+
+    cfg["processes"].append({"name": "three"})
+    assert "three" in cfg.index("processes")
+
+    cfg["processes"] = [{"name": "four"}]
+    assert list(cfg.index("processes")) == ["four"]
+    assert controller.get_process(cfg, "four") == {"name": "four"}
+
+    # printers see a plain dict
+    controller.print_yaml(cfg)
+    out, err = capsys.readouterr()
+    assert "!!python" not in out
+    assert yaml.safe_load(out) == dict(cfg)
+
+    controller.print_json(cfg)
+    out, err = capsys.readouterr()
+    assert json.loads(out) == dict(cfg)
+
+
+def test_disabled_processes_scan(tmpdir):
+    maintenance = tmpdir.mkdir("maintenance")
+    cfg = controller.Config(
+        processes=[
+            {"name": "one", "run": {"disable": str(maintenance.join("one"))}},
+            {"name": "two", "run": {"disable": str(maintenance.join("two"))}},
+            {"name": "three", "run": {"disable": str(tmpdir.join("no/three"))}},
+            {"name": "four", "run": {"disable": None}},
+            {"name": "link", "run": {"disable": str(maintenance.join("link"))}},
+        ]
+    )
+    maintenance.join("one").write("")
+    maintenance.join("link").mksymlinkto(tmpdir.join("missing"))
+
+    with patch("os.path.exists", wraps=os.path.exists) as exists:
+        assert controller.list_disabled_processes(cfg) == ["one"]
+        # only the broken symlink is checked
+        assert exists.call_count == 1
+
+    # memoized for the lifetime of the config
+    maintenance.join("two").write("")
+    assert controller.list_disabled_processes(cfg) == ["one"]
+    assert controller.list_enabled_processes(cfg) == [
+        "two",
+        "three",
+        "four",
+        "link",
+    ]
+
+    # except for changes made through the controller
+    assert controller.enable_process(cfg, "one") == True
+    assert controller.list_disabled_processes(cfg) == []
+    assert controller.disable_process(cfg, "one") == True
+    assert controller.list_disabled_processes(cfg) == ["one"]
+    maintenance.join("one").remove()
+
+    # plain dict config are scanned each time
+    assert controller.list_disabled_processes(dict(cfg)) == ["two"]
+    assert "one" in controller.list_enabled_processes(dict(cfg))
+
+
+def test_select_processes(config):
+    assert controller.select_processes(
+        config, ["raise", "service1.exabgp.lan"], ["*3.exabgp.lan", "*1*"]
+    ) == ["raise", "service1.exabgp.lan", "service3.exabgp.lan"]
+    assert controller.select_processes(
+        config, patterns=[r"service[12]\."], regex=True
+    ) == ["service1.exabgp.lan", "service2.exabgp.lan"]
+    assert controller.select_processes(config) == []
+
+    with pytest.raises(controller.ExabgpCTLError):
+        controller.select_processes(config, patterns=["("], regex=True)
+
+
+def test_bulk_processes(config, tmpdir):
+    for process in config["processes"]:
+        process["run"]["disable"] = str(tmpdir.join(process["name"]))
+    names = controller.list_processes(config)
+
+    expected = dict((name, True) for name in names)
+    expected["raise"] = False
+    assert controller.disable_processes(config, names + ["raise"]) == expected
+    assert sorted(controller.list_disabled_processes(config)) == sorted(names)
+    assert controller.enable_processes(config, names + ["raise"]) == expected
+    assert controller.list_disabled_processes(config) == []
+
+
+def test_write_state(tmpdir):
+    assert controller.write_state(str(tmpdir), "service1", "UP") == "UP"
+    assert tmpdir.join("service1").read() == "UP"
+    assert oct(tmpdir.join("service1").stat().mode & 0o777) != oct(0o600)
+
+    os.environ["STATE"] = "DOWN"
+    assert controller.write_state(str(tmpdir), "service1") == "DOWN"
+    assert tmpdir.join("service1").read() == "DOWN"
+    # no temp file left
+    assert tmpdir.listdir() == [tmpdir.join("service1")]
+
+    for name in ["", "../service1", ".exabgpctl", "a/b"]:
+        with pytest.raises(controller.ExabgpCTLError):
+            controller.write_state(str(tmpdir), name, "UP")
+
+    with pytest.raises(controller.ExabgpCTLError):
+        controller.write_state(str(tmpdir.join("raise")), "service1", "UP")
+
+
+def test_completion_index(tmpdir, monkeypatch):
+    conf = tmpdir.join("exabgp.conf")
+    maintenance = tmpdir.mkdir("maintenance")
+    if _py6.PY2:
+        content = open("examples/exabgp3.conf").read()
+    else:
+        content = open("examples/exabgp4.conf").read()
+    conf.write(content.replace("/tmp/exabgp/maintenance", str(maintenance)))
+    monkeypatch.setenv("EXABGPCTL_CONF", str(conf))
+    monkeypatch.setenv("EXABGPCTL_STATE", str(tmpdir))
+
+    index = controller.completion_index()
+    assert tmpdir.join(".exabgpctl", "completion.json").check()
+    assert sorted(index["processes"]) == sorted(index["enabled"])
+    assert index["disabled"] == []
+    assert sorted(index["neighbors"]) == ["192.168.0.1", "192.168.0.2"]
+
+    with patch("exabgpctl.controller.config_load") as load:
+        load.side_effect = RuntimeError("config must not be parsed")
+        assert controller.completion_index() == index
+
+    # maintenance dir changed
+    time.sleep(0.01)
+    maintenance.join("service1.exabgp.lan").write("")
+    index = controller.completion_index()
+    assert index["disabled"] == ["service1.exabgp.lan"]
+    assert "service1.exabgp.lan" not in index["enabled"]
+
+    # conf changed
+    conf.write(conf.read().replace("service3", "service4"))
+    assert "service4.exabgp.lan" in controller.completion_index()["processes"]
+
+
+def test_print_ndjson(capsys):
+    controller.print_ndjson(
+        {
+            "path": "/etc/exabgp/exabgp.conf",
+            "processes": [{"name": "service1"}, {"name": "service2"}],
+            "neighbors": {"192.168.0.1": {"status": True}},
+        }
+    )
+    out, err = capsys.readouterr()
+    assert [json.loads(line) for line in out.splitlines()] == [
+        {"kind": "config", "path": "/etc/exabgp/exabgp.conf"},
+        {"kind": "neighbor", "name": "192.168.0.1", "status": True},
+        {"kind": "process", "name": "service1"},
+        {"kind": "process", "name": "service2"},
+    ]
+    assert " " not in out
+
+    controller.print_ndjson(["service1", "service2"])
+    out, err = capsys.readouterr()
+    assert out == '"service1"\n"service2"\n'
+
+    controller.print_ndjson({"name": "service1", "run": {"timeout": 5}})
+    out, err = capsys.readouterr()
+    assert json.loads(out) == {"name": "service1", "run": {"timeout": 5}}
+
+    controller.print_ndjson("data")
+    out, err = capsys.readouterr()
+    assert out == "data\n"
+
+    # one record per instance and item
+    controller.print_ndjson(
+        controller.ByInstance(
+            [
+                ("edge", {"processes": {"service1": {"state": "UP"}}}),
+                ("core", ["service2", "service3"]),
+            ]
+        )
+    )
+    out, err = capsys.readouterr()
+    assert [json.loads(line) for line in out.splitlines()] == [
+        {
+            "instance": "edge",
+            "kind": "process",
+            "name": "service1",
+            "state": "UP",
+        },
+        {"instance": "core", "value": "service2"},
+        {"instance": "core", "value": "service3"},
+    ]
+
+
+def test_yaml_dump():
+    data = {
+        "processes": [
+            {
+                "name": "service%d" % index,
+                "run": ["/usr/bin/healthcheck", "--cmd", "/bin/true"],
+                "neighbor": {"peers": ["192.168.0.1", "192.168.0.2"]},
+                "state": None,
+            }
+            for index in range(50)
+        ],
+        "neighbors": {"192.168.0.1": {"hold_time": 180, "families": []}},
+    }
+    expected = controller.yaml_dump(data, backend="python")
+    assert "processes:\n  - name: service0\n    neighbor:\n" in expected
+    assert "      - 192.168.0.1\n" in expected
+    assert yaml.safe_load(expected) == data
+
+    if getattr(yaml, "__with_libyaml__", False):
+        assert controller.yaml_dump(data, backend="libyaml") == expected
+        assert controller.yaml_dump(data) == expected
+
+    with pytest.raises(controller.ExabgpCTLError):
+        controller.yaml_dump(data, backend="unknown")
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        "line1\nline2\n",
+        "tab\there",
+        "word " * 60,
+        "'quoted' \"text\" " * 20,
+        "caf\u00e9",
+        {("tuple", "key"): "value"},
+        {"k" * 200: "value"},
+        {"nested": [{"deep": ["x" * 170]}]},
+        [[[["item"]]]],
+    ],
+)
+def test_yaml_dump_backends(value):
+    data = {"processes": [{"name": "service", "value": value}]}
+    expected = controller.yaml_dump(data, backend="python")
+    assert controller.yaml_dump(data) == expected
+
+
+def test_print_json_compact(capsys):
+    data = {"key1": {"key11": "value11"}, "key2": ["one", "two"]}
+    controller.print_json_compact(data)
+    out, err = capsys.readouterr()
+    assert out == json.dumps(data, separators=(",", ":")) + "\n"
+
+    # same as json.dumps for any key type and empty containers
+    for data in ({1: "a", None: [], "b": {}}, {}, [], [{"a": 1}, [], "b"]):
+        controller.print_json_compact(data)
+        out, err = capsys.readouterr()
+        assert out == json.dumps(data, separators=(",", ":")) + "\n"
+
+    controller.print_json_compact("data")
+    out, err = capsys.readouterr()
+    assert out == "data\n"
+
+
+def test_print_msgpack(capfdbinary):
+    msgpack = pytest.importorskip("msgpack")
+    data = {"key1": {"key11": "value11"}, "key2": ["one", 2, None]}
+    controller.print_msgpack(data)
+    out, err = capfdbinary.readouterr()
+    assert msgpack.unpackb(out, raw=False) == data
+
+
+def test_get_output():
+    assert controller.get_output("json") == controller.print_json
+    assert controller.get_output("yaml") == controller.print_yaml
+
+    with pytest.raises(controller.ExabgpCTLError):
+        controller.get_output("xml")
+
+    with patch.dict("sys.modules", {"msgpack": None}):
+        with pytest.raises(controller.ExabgpCTLError):
+            controller.get_output("msgpack")
+
+
+def test_config_refresh_disabled(tmpdir):
+    one, two = tmpdir.mkdir("one"), tmpdir.mkdir("two")
+    cfg = controller.Config(
+        processes=[
+            {"name": "service1", "run": {"disable": str(one.join("service1"))}},
+            {"name": "service2", "run": {"disable": str(one.join("service2"))}},
+            {"name": "service3", "run": {"disable": str(two.join("service3"))}},
+        ]
+    )
+    assert cfg.disabled() == set()
+
+    one.join("service1").write("")
+    one.join("service2").write("")
+    two.join("service3").write("")
+    cfg.refresh_disabled(names=["service1"])
+    assert cfg.disabled() == set(["service1"])
+    cfg.refresh_disabled(dirs=[str(one)])
+    assert cfg.disabled() == set(["service1", "service2"])
+
+    cfg.memoize("disabled", "processes", set(["service3"]))
+    assert cfg.disabled() == set(["service3"])
+    cfg.reset()
+    assert cfg.disabled() == set(["service1", "service2", "service3"])
+
+
+def test_timings():
+    assert controller.timings_stop() is None
+    assert controller.phase("idle") is controller.phase("other")
+
+    timings = controller.timings_start()
+    with controller.phase("outer"):
+        for _ in range(3):
+            with controller.phase("inner"):
+                pass
+    with controller.phase("render"):
+        pass
+    assert controller.timings_stop() is timings
+    assert controller.phase("outer") is controller.phase("idle")
+
+    assert list(timings.phases) == ["outer", "inner", "render"]
+    calls, depth, wall, cpu = timings.phases["inner"]
+    assert (calls, depth) == (3, 1)
+    assert timings.phases["outer"][:2] == (1, 0)
+    assert timings.phases["outer"][2] >= wall >= 0
+    lines = timings.report().splitlines()
+    assert lines[0].split() == ["phase", "calls", "wall", "ms", "cpu", "ms"]
+    assert lines[1].split()[:2] == ["outer", "1"]
+    assert lines[2].startswith("  inner ")
+    assert lines[-1].startswith("total ")
+
+
+def test_trace(tmpdir):
+    assert controller.trace_stop() is None
+    tracer = controller.trace_start()
+    with controller.phase("outer"):
+        thread = threading.Thread(
+            target=lambda: controller.phase("tcping", port=179).__enter__(),
+            name="prober",
+        )
+        with controller.phase("tcping", address="192.168.0.1", port=179):
+            thread.start()
+            thread.join()
+    assert controller.trace_stop() is tracer
+    assert controller.phase("outer") is controller.phase("idle")
+
+    path = tmpdir.join("trace.json")
+    tracer.write(str(path))
+    trace = json.loads(path.read())
+    assert trace == tracer.trace()
+    events = [event for event in trace["traceEvents"] if event["ph"] == "X"]
+    # spans are recorded when they end, the thread span never ends
+    assert [event["name"] for event in events] == ["tcping", "outer"]
+    tcping, outer = events
+    assert tcping["args"] == {"address": "192.168.0.1", "port": 179}
+    assert "args" not in outer
+    assert outer["ts"] <= tcping["ts"]
+    assert tcping["ts"] + tcping["dur"] <= outer["ts"] + outer["dur"]
+    assert tcping["pid"] == os.getpid()
+    names = {
+        event["tid"]: event["args"]["name"]
+        for event in trace["traceEvents"]
+        if event["ph"] == "M"
+    }
+    assert names == {tcping["tid"]: threading.current_thread().name}
+
+
+def test_trace_checks_probes(config):
+    tracer = controller.trace_start()
+    try:
+        with patch("exabgpctl.controller.tcping") as tcping:
+            tcping.return_value = (True, 0)
+            controller.status_neighbors(config)
+        controller.check_processes(config)
+    finally:
+        controller.trace_stop()
+    spans = {}
+    for event in tracer.events:
+        spans.setdefault(event["name"], []).append(event)
+    assert sorted(span["args"]["address"] for span in spans["tcping"]) == [
+        "192.168.0.1",
+        "192.168.0.2",
+    ]
+    assert len(spans["check"]) == len(config["processes"])
+    assert len(spans["probe_neighbors"]) == 1
+
+
+def test_memory_usage():
+    tracemalloc = pytest.importorskip("tracemalloc")
+    memory = controller.memory_start()
+    assert tracemalloc.is_tracing()
+    with controller.phase("outer"):
+        kept = bytearray(256 * 1024)
+        with controller.phase("inner"):
+            dropped = bytearray(1024 * 1024)
+            del dropped
+    # other threads are not measured
+    def other():
+        with controller.phase("other"):
+            pass
+
+    thread = threading.Thread(target=other)
+    with controller.phase("thread"):
+        thread.start()
+        thread.join()
+    assert controller.memory_stop() is memory
+    assert not tracemalloc.is_tracing()
+    assert controller.memory_stop() is None
+
+    assert list(memory.phases) == ["outer", "inner", "thread"]
+    calls, depth, peak, retained = memory.phases["inner"]
+    assert (calls, depth) == (1, 1)
+    assert retained < 64 * 1024
+    if memory.reset_peak:
+        assert peak >= 1000 * 1024
+        assert memory.phases["outer"][2] >= peak + 250 * 1024
+    assert memory.phases["outer"][3] >= 250 * 1024
+    assert memory.peak[1] >= 1000 * 1024
+
+    report = memory.report()
+    assert report.splitlines()[1].split()[:2] == ["outer", "1"]
+    assert "top allocations" in report
+    assert any(
+        stat.traceback[0].filename == __file__ for stat in memory.top(50)
+    )
+    assert len(kept)
+
+
+def test_ip_info(capsys):
+    from exabgp.vendoring import ipaddress
+
+    controller._IP_CACHE.clear()
+    network = ipaddress.ip_network(u"10.0.0.1/32")
+    address = ipaddress.ip_address(u"10.0.0.1")
+    parsed = controller._parse_ip(network)
+    info = parsed["10.0.0.1/32"]
+    assert isinstance(info, controller.IPInfo)
+    # only the key is computed
+    assert list(info.values) == ["compressed"]
+    assert info["version"] == 4
+    assert "reverse_pointer" not in info.values
+
+    # memoized by address and type
+    assert controller._parse_ip(ipaddress.ip_network(u"10.0.0.1/32"))[
+        "10.0.0.1/32"
+    ] is info
+    assert controller._parse_ip(address)["10.0.0.1"] is not info
+
+    expanded = {
+        "compressed": "10.0.0.1/32",
+        "exploded": "10.0.0.1/32",
+        "is_link_local": False,
+        "is_loopback": False,
+        "is_multicast": False,
+        "is_private": True,
+        "is_reserved": False,
+        "is_unspecified": False,
+        "max_prefixlen": 32,
+        "reverse_pointer": getattr(network, "reverse_pointer", ""),
+        "version": 4,
+    }
+    assert info == expanded
+    assert list(info) == list(controller.IPInfo.FIELDS)
+    assert controller._normalize({"ips": parsed})["ips"]["10.0.0.1/32"] is info
+    assert controller._msgpack_default(info) == expanded
+
+    data = {"ips": parsed}
+    assert controller.flat(data) == controller.flat(
+        {"ips": {"10.0.0.1/32": expanded}}
+    )
+    assert controller.yaml_dump(data) == controller.yaml_dump(
+        {"ips": {"10.0.0.1/32": expanded}}
+    )
+    controller.print_json(data)
+    controller.print_ndjson([data])
+    out, _ = capsys.readouterr()
+    first, second = out.split("\n}\n")
+    assert json.loads(first + "}") == {"ips": {"10.0.0.1/32": expanded}}
+    assert json.loads(second) == {"ips": {"10.0.0.1/32": expanded}}
+
+
+def test_ip_info_cache():
+    from exabgp.vendoring import ipaddress
+
+    with patch("exabgpctl.controller.IP_CACHE_SIZE", 2):
+        controller._IP_CACHE.clear()
+        one, two, three = [
+            controller._ip_info(ipaddress.ip_address(u"10.0.0.%d" % index))
+            for index in (1, 2, 3)
+        ]
+        assert len(controller._IP_CACHE) == 2
+        # least recently used is evicted
+        assert controller._ip_info(ipaddress.ip_address(u"10.0.0.3")) is three
+        assert controller._ip_info(ipaddress.ip_address(u"10.0.0.1")) is not one
+
+
+def test_healthcheck_parse(tmpdir):
+    from exabgp.application import healthcheck
+
+    argv = [
+        "/usr/bin/healthcheck",
+        "--name",
+        "service1",
+        "--ip",
+        "10.0.0.1/32",
+        "--ip",
+        "10.0.0.2/32",
+        "--next-hop",
+        "192.0.2.1",
+        "--withdraw-on-down",
+        "--execute",
+        "one",
+        "--execute",
+        "two",
+    ]
+    sys_argv = sys.argv
+    parse_args = argparse.ArgumentParser.parse_args
+    options = controller.healthcheck_parse(argv)
+    assert sys.argv is sys_argv
+    assert argparse.ArgumentParser.parse_args is parse_args
+    with patch.object(sys, "argv", argv):
+        expected = healthcheck.parse()
+    assert vars(options) == vars(expected)
+
+    config = tmpdir.join("healthcheck.conf")
+    config.write("# comment\ninterval=10\ncommand = /bin/check\n")
+    options = controller.healthcheck_parse(
+        ["healthcheck", "--config", str(config), "--rise", "5"]
+    )
+    assert (options.interval, options.command, options.rise) == (
+        10,
+        "/bin/check",
+        5,
+    )
+
+    with pytest.raises(SystemExit):
+        controller.healthcheck_parse(["healthcheck", "--rise", "many"])
+
+    # parallel parses, the parser is shared
+    argvs = [
+        ["healthcheck", "--name", "service%d" % index, "--rise", str(index)]
+        for index in range(50)
+    ]
+    with futures.ThreadPoolExecutor(8) as executor:
+        results = list(executor.map(controller.healthcheck_parse, argvs))
+    assert [(item.name, item.rise) for item in results] == [
+        ("service%d" % index, index) for index in range(50)
+    ]
+
+
+def test_config_parse_runs(tmpdir, monkeypatch):
+    conf = tmpdir.join("exabgp.conf")
+    if _py6.PY2:
+        conf.write(open("examples/exabgp3.conf").read())
+    else:
+        conf.write(open("examples/exabgp4.conf").read())
+    monkeypatch.setenv("EXABGPCTL_CONF", str(conf))
+    monkeypatch.setenv("EXABGPCTL_STATE", str(tmpdir))
+
+    with patch(
+        "exabgpctl.controller.healthcheck_parse",
+        wraps=controller.healthcheck_parse,
+    ) as parse:
+        first = controller.config_load(cache=False)
+        assert parse.call_count == 3
+        second = controller.config_load(cache=False)
+        assert parse.call_count == 3
+        assert second["processes"] == first["processes"]
+        # runs are not shared between loads
+        first["processes"][0]["run"]["ips"]["changed"] = None
+        assert "changed" not in second["processes"][0]["run"]["ips"]
+        again = controller.config_load(cache=False)
+        assert "changed" not in again["processes"][0]["run"]["ips"]
+
+        conf.write(conf.read().replace("11223:366", "11223:367"))
+        third = controller.config_load(cache=False)
+        assert parse.call_count == 4
+        assert third.index("processes")["service3.exabgp.lan"]["run"][
+            "community"
+        ] == "11223:367"
+
+    # only the last RUNS_CACHE_SIZE confs are kept
+    other = tmpdir.join("other.conf")
+    other.write(conf.read())
+    monkeypatch.setenv("EXABGPCTL_CONF", str(other))
+    with patch("exabgpctl.controller.RUNS_CACHE_SIZE", 1):
+        controller.config_load(cache=False)
+    assert list(controller._RUNS) == [str(other)]
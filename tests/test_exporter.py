@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+# standard
+import socket
+import threading
+
+# third
+import pytest
+from mock import patch
+
+# local
+from exabgpctl import controller, exporter, watcher, _py6
+
+try:
+    from urllib.request import urlopen
+    from urllib.error import HTTPError
+except ImportError:  # python 2
+    from urllib2 import urlopen, HTTPError
+
+
+@pytest.fixture
+def watched(tmpdir, monkeypatch):
+    conf = tmpdir.join("exabgp.conf")
+    maintenance = tmpdir.mkdir("maintenance")
+    if _py6.PY2:
+        content = open("examples/exabgp3.conf").read()
+    else:
+        content = open("examples/exabgp4.conf").read()
+    conf.write(content.replace("/tmp/exabgp/maintenance", str(maintenance)))
+    maintenance.join("service2.exabgp.lan").write("")
+    tmpdir.join("service1.exabgp.lan").write("UP")
+    monkeypatch.setenv("EXABGPCTL_CONF", str(conf))
+    monkeypatch.setenv("EXABGPCTL_STATE", str(tmpdir))
+
+    with watcher.ConfigWatcher("poll") as instance:
+        yield instance
+
+
+def test_render_metrics():
+    text = exporter.render_metrics(
+        [
+            ("exabgpctl_process_maintenance", {"process": 'a"b\\c'}, True),
+            ("exabgpctl_process_maintenance", {"process": "d\ne"}, 0),
+            ("exabgpctl_refresh_errors_total", None, 2),
+        ]
+    )
+    assert text == (
+        "# HELP exabgpctl_process_maintenance 1 if the process maintenance "
+        "file exists.\n"
+        "# TYPE exabgpctl_process_maintenance gauge\n"
+        'exabgpctl_process_maintenance{process="a\\"b\\\\c"} 1.0\n'
+        'exabgpctl_process_maintenance{process="d\\ne"} 0.0\n'
+        "# HELP exabgpctl_refresh_errors_total Failed metrics refreshes.\n"
+        "# TYPE exabgpctl_refresh_errors_total counter\n"
+        "exabgpctl_refresh_errors_total 2.0\n"
+    )
+
+
+def test_collect(watched):
+    samples = exporter.collect(
+        watched.cfg,
+        watched.states,
+        {"service1.exabgp.lan": {"result": "TIMEOUT", "duration": 2.0}},
+        {
+            "192.168.0.1": {
+                "status": False,
+                "address": "192.168.0.1",
+                "port": 179,
+                "code": 111,
+                "elapsed": 0.5,
+            }
+        },
+    )
+    assert (
+        "exabgpctl_process_state",
+        {"process": "service1.exabgp.lan", "state": "UP"},
+        1,
+    ) in samples
+    assert (
+        "exabgpctl_process_state",
+        {"process": "service3.exabgp.lan", "state": "UNKNOWN"},
+        1,
+    ) in samples
+    assert (
+        "exabgpctl_process_maintenance",
+        {"process": "service2.exabgp.lan"},
+        True,
+    ) in samples
+    assert (
+        "exabgpctl_process_check_result",
+        {"process": "service1.exabgp.lan", "result": "TIMEOUT"},
+        1,
+    ) in samples
+    assert (
+        "exabgpctl_process_check_duration_seconds",
+        {"process": "service1.exabgp.lan"},
+        2.0,
+    ) in samples
+    labels = {"neighbor": "192.168.0.1", "address": "192.168.0.1", "port": 179}
+    assert ("exabgpctl_neighbor_up", labels, False) in samples
+    assert ("exabgpctl_neighbor_connect_seconds", labels, 0.5) in samples
+
+
+@patch("exabgpctl.exporter.probe_neighbors")
+def test_exporter(probe, watched, tmpdir):
+    probe.return_value = {}
+    textfile = tmpdir.join("metrics", "exabgpctl.prom")
+    instance = exporter.Exporter(
+        watched, interval=5, textfile=str(textfile), probe={"timeout": 0.1}
+    )
+    assert instance.check == {"deadline": 5, "ttl": controller.CHECK_TTL}
+    text = instance.refresh()
+    assert instance.text == text
+    assert textfile.read() == text
+    assert (
+        'exabgpctl_process_check_result{process="service1.exabgp.lan",'
+        'result="OK"} 1.0' in text
+    )
+    probe.assert_called_with(watched.cfg, timeout=0.1)
+
+    tmpdir.join("maintenance", "service2.exabgp.lan").remove()
+    assert (
+        'exabgpctl_process_maintenance{process="service2.exabgp.lan"} 0.0'
+        in instance.refresh()
+    )
+
+
+def test_make_server():
+    instance = exporter.Exporter(None)
+    instance.text = "exabgpctl_refresh_errors_total 0.0\n"
+    server = exporter.make_server(instance, "127.0.0.1:0")
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    try:
+        url = "http://127.0.0.1:%d" % server.server_address[1]
+        response = urlopen(url + "/metrics")
+        assert response.read() == b"exabgpctl_refresh_errors_total 0.0\n"
+        assert response.headers["Content-Type"] == exporter.CONTENT_TYPE
+        with pytest.raises(HTTPError):
+            urlopen(url + "/")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    with pytest.raises(controller.ExabgpCTLError):
+        exporter.make_server(instance, "127.0.0.1:http")
+
+    # loopback unless an address is given
+    server = exporter.make_server(instance, ":0")
+    try:
+        assert server.server_address[0] == exporter.EXPORTER_ADDRESS
+    finally:
+        server.server_close()
+
+
+@pytest.mark.skipif(not socket.has_ipv6, reason="no IPv6 support")
+def test_make_server_ipv6():
+    instance = exporter.Exporter(None)
+    for listen in ("[::1]:0", "::1:0"):
+        try:
+            server = exporter.make_server(instance, listen)
+        except socket.error:
+            pytest.skip("no IPv6 loopback")
+        try:
+            assert server.address_family == socket.AF_INET6
+            assert server.server_address[0] == "::1"
+        finally:
+            server.server_close()
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+# standard
+import os
+
+# third
+import pytest
+
+# local
+from exabgpctl import controller, instances, _py6
+
+
+@pytest.fixture
+def confs(tmpdir):
+    if _py6.PY2:
+        example = open("examples/exabgp3.conf").read()
+    else:
+        example = open("examples/exabgp4.conf").read()
+    result = {}
+    for name in ("edge", "core"):
+        conf = tmpdir.join("%s.conf" % name)
+        conf.write(example)
+        state = tmpdir.mkdir(name)
+        result[name] = (str(conf), str(state))
+    return result
+
+
+def test_parse_instance():
+    assert instances.parse_instance("edge=/etc/edge.conf:/var/edge") == (
+        "edge",
+        "/etc/edge.conf",
+        "/var/edge",
+    )
+    for value in ("edge", "edge=/etc/edge.conf", "=/etc/edge.conf:/var/edge"):
+        with pytest.raises(controller.ExabgpCTLError):
+            instances.parse_instance(value)
+
+
+def test_read_instances_dir(tmpdir):
+    tmpdir.join("edge.env").write(
+        "# edge router\n"
+        "EXABGPCTL_CONF=/etc/edge.conf\n"
+        "export EXABGPCTL_STATE='/var/edge'\n"
+    )
+    tmpdir.join("core.env").write(
+        'EXABGPCTL_CONF="/etc/core.conf"\nEXABGPCTL_STATE=/var/core\n'
+    )
+    tmpdir.join("README").write("not an instance")
+    assert instances.read_instances_dir(str(tmpdir)) == [
+        ("core", "/etc/core.conf", "/var/core"),
+        ("edge", "/etc/edge.conf", "/var/edge"),
+    ]
+
+    tmpdir.join("broken.env").write("EXABGPCTL_CONF=/etc/broken.conf\n")
+    with pytest.raises(controller.ExabgpCTLError) as err:
+        instances.read_instances_dir(str(tmpdir))
+    assert "EXABGPCTL_STATE" in str(err.value)
+
+
+def test_get_instances(tmpdir):
+    tmpdir.join("edge.env").write(
+        "EXABGPCTL_CONF=/etc/edge.conf\nEXABGPCTL_STATE=/var/edge\n"
+    )
+    assert list(
+        instances.get_instances(["core=/etc/core.conf:/var/core"], str(tmpdir))
+    ) == ["edge", "core"]
+    assert instances.get_instances(["core=/etc/core.conf:/var/core"]) == {
+        "core": ("/etc/core.conf", "/var/core")
+    }
+    with pytest.raises(controller.ExabgpCTLError):
+        instances.get_instances(
+            ["edge=/etc/other.conf:/var/other"], str(tmpdir)
+        )
+
+
+@pytest.mark.parametrize("pool", ["process", "thread"])
+def test_load_instances(confs, pool):
+    cfgs = instances.load_instances(
+        instances.get_instances(
+            [
+                "%s=%s:%s" % (name, conf, state)
+                for name, (conf, state) in sorted(confs.items())
+            ]
+        ),
+        pool=pool,
+    )
+    assert list(cfgs) == ["core", "edge"]
+    for name, cfg in cfgs.items():
+        assert isinstance(cfg, controller.Config)
+        assert cfg["path"] == confs[name][0]
+        assert cfg["state"] == confs[name][1]
+        assert len(cfg["processes"]) == 3
+
+    # a single instance is loaded inline
+    cfgs = instances.load_instances({"edge": confs["edge"]})
+    assert cfgs["edge"]["path"] == confs["edge"][0]
+
+
+def test_load_instances_error(confs, tmpdir):
+    with pytest.raises(controller.ExabgpCTLError) as err:
+        instances.load_instances(
+            {
+                "edge": confs["edge"],
+                "broken": (str(tmpdir.join("nope.conf")), str(tmpdir)),
+            }
+        )
+    assert str(err.value).startswith("broken: ")
+
+    with pytest.raises(controller.ExabgpCTLError):
+        instances.load_instances(confs, pool="nope")
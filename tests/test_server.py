@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+# standard
+import os
+import sys
+import json
+import time
+import socket
+import threading
+import subprocess
+
+# third
+import pytest
+from mock import patch
+
+# local
+from exabgpctl import server, view, _py6
+
+
+@pytest.fixture
+def served(tmpdir, monkeypatch):
+    conf = tmpdir.join("exabgp.conf")
+    maintenance = tmpdir.mkdir("maintenance")
+    if _py6.PY2:
+        content = open("examples/exabgp3.conf").read()
+    else:
+        content = open("examples/exabgp4.conf").read()
+    conf.write(content.replace("/tmp/exabgp/maintenance", str(maintenance)))
+    path = str(tmpdir.join("exabgpctl.sock"))
+    monkeypatch.setenv("EXABGPCTL_CONF", str(conf))
+    monkeypatch.setenv("EXABGPCTL_STATE", str(tmpdir))
+    monkeypatch.setenv("EXABGPCTL_SOCKET", path)
+
+    srv = server.Server(path, view.cli)
+    thread = threading.Thread(target=srv.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+def test_is_remote():
+    def is_remote(args):
+        return server.is_remote(view.cli, args)
+
+    assert is_remote(["dump"])
+    assert is_remote(["-o", "yaml", "--debug", "status"])
+    assert is_remote(["--output=flat", "process", "list", "-d"])
+    assert is_remote(["-oyaml", "neighbor", "show", "192.168.0.1"])
+    assert not is_remote([])
+    assert not is_remote(["neighbor", "--help"])
+    assert not is_remote(["process", "disable", "service1"])
+    assert not is_remote(["process", "disable", "-o"])
+    assert not is_remote(["nope"])
+    assert not is_remote(["--timings", "dump"])
+    assert not is_remote(["--profile", "out", "dump"])
+    assert not is_remote(["--profile=out", "dump"])
+    assert not is_remote(["--memory", "status"])
+    assert not is_remote(["--instance", "a=a.conf:a", "process", "list"])
+    assert not is_remote(["-iedge=/a:/b", "status"])
+    assert not is_remote(["-d", "-iedge=/a:/b", "process", "status"])
+    assert not is_remote(["--instances-dir", "/etc/exabgp", "dump"])
+
+
+def test_run_command_instances(served):
+    # refused even when is_remote is bypassed
+    code, out, err = server.run_command(
+        view.cli,
+        ["-ievil=/tmp/evil.conf:/tmp/evilstate", "process", "list"],
+        served.cfg,
+    )
+    assert code == 2
+    assert b"not served" in err
+
+
+def test_client(served, capsys):
+    assert server.client(view.cli, ["process", "list"]) == 0
+    out, err = capsys.readouterr()
+    assert json.loads(out) == [
+        "service1.exabgp.lan",
+        "service2.exabgp.lan",
+        "service3.exabgp.lan",
+    ]
+
+    assert server.client(view.cli, ["process", "show", "nope"]) == 1
+    out, err = capsys.readouterr()
+    assert out == "Process nope not found\n"
+
+    # missing argument
+    assert server.client(view.cli, ["process", "show"]) == 2
+    out, err = capsys.readouterr()
+    assert "Missing argument" in err
+
+    # not read-only
+    args = ["process", "disable", "service1.exabgp.lan"]
+    assert server.client(view.cli, args) is None
+
+    # other conf
+    with patch.dict(os.environ, {"EXABGPCTL_CONF": "/etc/other.conf"}):
+        assert server.client(view.cli, ["process", "list"]) is None
+
+    # traced locally
+    with patch.dict(os.environ, {"EXABGPCTL_TRACE": "/tmp/trace.json"}):
+        assert server.client(view.cli, ["process", "list"]) is None
+
+    # no server
+    with patch.dict(os.environ, {"EXABGPCTL_SOCKET": ""}):
+        assert server.client(view.cli, ["process", "list"]) is None
+
+
+def test_request_timeout(tmpdir):
+    # accepts connections (backlog) but never answers
+    path = str(tmpdir.join("wedged.sock"))
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(path)
+    sock.listen(1)
+    try:
+        start = time.time()
+        assert server.request(path, ["process", "list"], timeout=0.2) is None
+        assert time.time() - start < 2
+    finally:
+        sock.close()
+
+
+def test_server_refresh(served, tmpdir, capsys):
+    cfg = served.cfg
+    assert server.client(view.cli, ["process", "list", "-d"]) == 0
+    out, err = capsys.readouterr()
+    assert json.loads(out) == []
+
+    # maintenance file created by another exabgpctl
+    time.sleep(0.01)
+    tmpdir.join("maintenance", "service1.exabgp.lan").write("")
+    assert server.client(view.cli, ["process", "list", "-d"]) == 0
+    out, err = capsys.readouterr()
+    assert json.loads(out) == ["service1.exabgp.lan"]
+    assert served.cfg is cfg
+
+    # conf changed
+    conf = tmpdir.join("exabgp.conf")
+    conf.write(conf.read().replace("service3", "service4"))
+    assert server.client(view.cli, ["process", "list"]) == 0
+    out, err = capsys.readouterr()
+    assert "service4.exabgp.lan" in json.loads(out)
+    assert served.cfg is not cfg
+
+
+def test_serve_listening(served):
+    with pytest.raises(server.ExabgpCTLError):
+        server.serve(served.server_address, view.cli)
+
+
+def test_client_imports(served):
+    code = (
+        "import sys\n"
+        "from exabgpctl import view\n"
+        "sys.argv = ['exabgpctl', 'process', 'list']\n"
+        "try:\n"
+        "    view.main()\n"
+        "except SystemExit as err:\n"
+        "    assert err.code == 0\n"
+        "assert 'exabgp' not in sys.modules\n"
+    )
+    output = subprocess.check_output([sys.executable, "-c", code])
+    assert b"service1.exabgp.lan" in output
@@ -1,7 +1,9 @@
 # -*- coding: utf-8 -*-
 # standard
 import os
+import sys
 import json
+import subprocess
 
 # third
 import yaml
@@ -55,31 +57,51 @@ def test_create_context(config):
 
         data = exabgpctl.view.create_context(output="yaml", debug=True)
         assert data == {
-            "cfg": config,
             "debug": True,
             "output": exabgpctl.controller.print_yaml,
         }
 
         data = exabgpctl.view.create_context(output="json", debug=True)
         assert data == {
-            "cfg": config,
             "debug": True,
             "output": exabgpctl.controller.print_json,
         }
 
+        data = exabgpctl.view.create_context(output="ndjson", debug=True)
+        assert data == {
+            "debug": True,
+            "output": exabgpctl.controller.print_ndjson,
+        }
+
         data = exabgpctl.view.create_context(output="flat", debug=True)
         assert data == {
-            "cfg": config,
             "debug": True,
             "output": exabgpctl.controller.print_flat,
         }
 
+        data = exabgpctl.view.create_context(output="json-compact")
+        assert data["output"] == exabgpctl.controller.print_json_compact
 
-def test_edit(runner, config):
-    with patch("click.edit") as edit:
-        edit.return_value = "lorem"
-        result = runner.invoke(exabgpctl.view.cli, ["edit"])
-        edit.assert_called_with(filename=config["path"])
+        # config is loaded on first access only
+        assert not cfg.called
+        assert data["cfg"] == config
+        assert data["cfg"] == config
+        assert cfg.call_count == 1
+
+        with pytest.raises(KeyError):
+            data["raise"]
+
+
+def test_edit(runner, config, monkeypatch):
+    monkeypatch.setenv("EXABGPCTL_CONF", config["path"])
+    with patch("exabgpctl.view.config_load") as cfg:
+        cfg.side_effect = exabgpctl.controller.ExabgpCTLError("broken")
+        with patch("click.edit") as edit:
+            edit.return_value = "lorem"
+            result = runner.invoke(exabgpctl.view.cli, ["edit"])
+            edit.assert_called_with(filename=config["path"])
+            # a broken config doesn't prevent edition
+            assert not cfg.called
 
 
 def test_status(runner, config):
@@ -89,8 +111,50 @@ def test_status(runner, config):
         exabgpctl.view.status_processes = MagicMock()
         exabgpctl.view.status_neighbors = MagicMock()
         result = runner.invoke(exabgpctl.view.cli, ["status"])
-        exabgpctl.view.status_processes.assert_called_with(config)
-        exabgpctl.view.status_neighbors.assert_called_with(config)
+        exabgpctl.view.status_processes.assert_called_with(
+            config,
+            workers=8,
+            pool="thread",
+            deadline=None,
+            ttl=5,
+            fresh=False,
+        )
+        exabgpctl.view.status_neighbors.assert_called_with(
+            config, timeout=1, concurrency=16, rate=None
+        )
+
+        result = runner.invoke(
+            exabgpctl.view.cli,
+            [
+                "status",
+                "--probe-timeout",
+                "0.5",
+                "--probe-concurrency",
+                "4",
+                "--probe-rate",
+                "10",
+            ],
+        )
+        exabgpctl.view.status_neighbors.assert_called_with(
+            config, timeout=0.5, concurrency=4, rate=10
+        )
+
+        result = runner.invoke(
+            exabgpctl.view.cli,
+            [
+                "status",
+                "--check-pool",
+                "process",
+                "--deadline",
+                "5",
+                "--check-ttl",
+                "30",
+                "--fresh",
+            ],
+        )
+        exabgpctl.view.status_processes.assert_called_with(
+            config, workers=8, pool="process", deadline=5, ttl=30, fresh=True
+        )
 
 
 def test_version(runner, config):
@@ -110,6 +174,113 @@ def test_version(runner, config):
         assert result.output.strip() == "1.2.3"
 
 
+def test_timings_profile(config, tmpdir):
+    runner = CliRunner(mix_stderr=False)
+    profile = tmpdir.join("exabgpctl.prof")
+    with patch("exabgpctl.view.config_load") as cfg:
+        cfg.return_value = config
+        result = runner.invoke(
+            exabgpctl.view.cli,
+            ["--timings", "--profile", str(profile), "dump"],
+        )
+    assert result.exit_code == 0
+    assert json.loads(result.stdout) == config
+    phases = [line.split()[0] for line in result.stderr.splitlines()]
+    assert phases == ["phase", "config_load", "render", "total"]
+    assert exabgpctl.controller.timings_stop() is None
+
+    import pstats
+
+    stats = pstats.Stats(str(profile))
+    assert any(func[2] == "dump" for func in stats.stats)
+
+
+def test_memory(config):
+    pytest.importorskip("tracemalloc")
+    runner = CliRunner(mix_stderr=False)
+    with patch("exabgpctl.view.config_load") as cfg:
+        cfg.return_value = config
+        result = runner.invoke(exabgpctl.view.cli, ["--memory", "dump"])
+    assert result.exit_code == 0
+    assert json.loads(result.stdout) == config
+    phases = [line.split()[0] for line in result.stderr.splitlines()[:4]]
+    assert phases == ["phase", "config_load", "render", "total"]
+    assert "top allocations" in result.stderr
+
+
+def test_trace(runner, config, tmpdir, monkeypatch):
+    trace = tmpdir.join("trace.json")
+    monkeypatch.setenv("EXABGPCTL_TRACE", str(trace))
+    with patch("exabgpctl.view.config_load") as cfg:
+        cfg.return_value = config
+        result = runner.invoke(exabgpctl.view.cli, ["dump"])
+    assert json.loads(result.output) == config
+    events = json.loads(trace.read())["traceEvents"]
+    assert [event["name"] for event in events if event["ph"] == "X"] == [
+        "config_load",
+        "render",
+    ]
+    assert exabgpctl.controller.trace_stop() is None
+
+
+def test_instances(runner, tmpdir):
+    if exabgpctl._py6.PY2:
+        example = os.path.abspath("examples/exabgp3.conf")
+    else:
+        example = os.path.abspath("examples/exabgp4.conf")
+    tmpdir.join("edge.env").write(
+        "EXABGPCTL_CONF=%s\nEXABGPCTL_STATE=%s\n" % (example, tmpdir)
+    )
+    core = "core=%s:%s" % (example, tmpdir)
+    args = ["--instances-dir", str(tmpdir), "-i", core]
+    processes = [
+        "service1.exabgp.lan",
+        "service2.exabgp.lan",
+        "service3.exabgp.lan",
+    ]
+
+    result = runner.invoke(exabgpctl.view.cli, args + ["process", "list"])
+    assert result.exit_code == 0
+    assert json.loads(result.output) == {"edge": processes, "core": processes}
+
+    result = runner.invoke(exabgpctl.view.cli, args + ["dump"])
+    assert result.exit_code == 0
+    assert sorted(json.loads(result.output)) == ["core", "edge"]
+
+    result = runner.invoke(
+        exabgpctl.view.cli, ["-o", "ndjson"] + args + ["neighbor", "list"]
+    )
+    assert result.exit_code == 0
+    assert [json.loads(line) for line in result.output.splitlines()] == [
+        {"instance": instance, "value": neighbor}
+        for instance in ("edge", "core")
+        for neighbor in ("192.168.0.1", "192.168.0.2")
+    ]
+
+    result = runner.invoke(
+        exabgpctl.view.cli, ["-o", "ndjson"] + args + ["dump"]
+    )
+    records = [json.loads(line) for line in result.output.splitlines()]
+    assert [
+        (record["instance"], record["kind"])
+        for record in records
+        if record["kind"] == "config"
+    ] == [("edge", "config"), ("core", "config")]
+    assert len(records) == 2 * (1 + 3 + 2)
+
+    # commands on a single process don't know which instance to use
+    result = runner.invoke(
+        exabgpctl.view.cli, args + ["process", "show", "service1.exabgp.lan"]
+    )
+    assert result.exit_code == 2
+    assert "--instance" in result.output
+
+    # reported by main
+    result = runner.invoke(exabgpctl.view.cli, args + ["-i", core, "dump"])
+    assert isinstance(result.exception, exabgpctl.controller.ExabgpCTLError)
+    assert "Instance core is defined twice" in str(result.exception)
+
+
 def test_process_list(runner, config):
     with patch("exabgpctl.view.config_load") as cfg:
         cfg.return_value = config
@@ -172,20 +343,69 @@ def test_process_disable(runner, config):
         assert bool(result.output.strip()) == True
 
 
-def test_state_process(runner, config):
+def test_process_bulk(runner, tmpdir):
+    cfg = exabgpctl.controller.Config(
+        processes=[
+            {"name": name, "run": {"disable": str(tmpdir.join(name))}}
+            for name in ["web-1", "web-2", "db-1", "db-2"]
+        ]
+    )
+    with patch("exabgpctl.view.config_load") as load:
+        load.return_value = cfg
+
+        result = runner.invoke(
+            exabgpctl.view.cli,
+            ["process", "disable", "--match", "web-*", "--from-file", "-"],
+            input="db-1\n# comment\n\n",
+        )
+        assert result.exit_code == 0
+        assert json.loads(result.output) == {
+            "web-1": True,
+            "web-2": True,
+            "db-1": True,
+        }
+        assert load.call_count == 1
+        assert sorted(tmpdir.listdir()) == sorted(
+            [tmpdir.join("web-1"), tmpdir.join("web-2"), tmpdir.join("db-1")]
+        )
+
+        result = runner.invoke(
+            exabgpctl.view.cli,
+            ["process", "enable", "raise", "-r", "-m", "^(web|db)-1$"],
+        )
+        assert result.exit_code == 1
+        assert json.loads(result.output) == {
+            "raise": False,
+            "web-1": True,
+            "db-1": True,
+        }
+
+        result = runner.invoke(exabgpctl.view.cli, ["process", "enable"])
+        assert result.exit_code == 2
+
+        result = runner.invoke(
+            exabgpctl.view.cli, ["process", "enable", "-m", "raise*"]
+        )
+        assert isinstance(result.exception, exabgpctl.controller.ExabgpCTLError)
+
+
+def test_state_process(runner, config, monkeypatch):
+    monkeypatch.setenv("EXABGPCTL_STATE", "/tmp/state")
     with patch("exabgpctl.view.config_load") as cfg:
         cfg.return_value = config
 
-        exabgpctl.view.state_process = MagicMock()
-        exabgpctl.view.state_process.return_value = "UP"
+        exabgpctl.view.write_state = MagicMock()
+        exabgpctl.view.write_state.return_value = "UP"
         os.environ["STATE"] = "UP"
         result = runner.invoke(
             exabgpctl.view.cli, ["process", "state", "service1.exabgp.lan"]
         )
-        exabgpctl.view.state_process.assert_called_with(
-            config, "service1.exabgp.lan"
+        exabgpctl.view.write_state.assert_called_with(
+            "/tmp/state", "service1.exabgp.lan"
         )
         assert result.output.strip() == "UP"
+        # config is never parsed
+        assert not cfg.called
 
 
 def test_status_processes(runner, config):
@@ -197,7 +417,14 @@ def test_status_processes(runner, config):
             "service1.exabgp.lan": "dict"
         }
         result = runner.invoke(exabgpctl.view.cli, ["process", "status"])
-        exabgpctl.view.status_processes.assert_called_with(config)
+        exabgpctl.view.status_processes.assert_called_with(
+            config,
+            workers=8,
+            pool="thread",
+            deadline=None,
+            ttl=5,
+            fresh=False,
+        )
         assert json.loads(result.output) == {"service1.exabgp.lan": "dict"}
 
 
@@ -232,5 +459,61 @@ def test_neighbor_status(runner, config):
         exabgpctl.view.status_neighbors = MagicMock()
         exabgpctl.view.status_neighbors.return_value = {"1.2.3.4": "dict"}
         result = runner.invoke(exabgpctl.view.cli, ["neighbor", "status"])
-        exabgpctl.view.status_neighbors.assert_called_with(config)
+        exabgpctl.view.status_neighbors.assert_called_with(
+            config, timeout=1, concurrency=16, rate=None
+        )
         assert json.loads(result.output) == {"1.2.3.4": "dict"}
+
+
+@pytest.mark.skipif(
+    exabgpctl._py6.PY2, reason="futures backport imports multiprocessing"
+)
+def test_import_modules():
+    """exabgp, yaml, platform and multiprocessing must not be imported by
+    the CLI module."""
+    proc = subprocess.Popen(
+        [
+            sys.executable,
+            "-c",
+            "import sys, exabgpctl.view; print(' '.join(sys.modules))",
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    out, err = proc.communicate()
+    assert proc.returncode == 0, err
+    heavy = [
+        name
+        for name in out.split()
+        if name.split(".")[0]
+        in ("exabgp", "yaml", "platform", "multiprocessing")
+    ]
+    assert heavy == []
+
+
+def test_autocomplete():
+    index = {
+        "processes": ["Service1", "service2", "other"],
+        "neighbors": ["192.168.0.1", "10.0.0.1"],
+        "enabled": ["service2", "other"],
+        "disabled": ["Service1"],
+    }
+    with patch("exabgpctl.view.completion_index") as completion:
+        completion.return_value = index
+        assert exabgpctl.view._ac_list_processes(incomplete="serv") == [
+            "service1",
+            "service2",
+        ]
+        assert exabgpctl.view._ac_list_processes_enable(incomplete="") == [
+            "service1"
+        ]
+        assert exabgpctl.view._ac_list_processes_disable(incomplete="o") == [
+            "other"
+        ]
+        assert exabgpctl.view._ac_list_neighbors(incomplete="192") == [
+            "192.168.0.1"
+        ]
+
+        completion.side_effect = exabgpctl.controller.ExabgpCTLError("raise")
+        assert exabgpctl.view._ac_list_processes(incomplete="") == []
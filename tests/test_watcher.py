@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+# standard
+import time
+
+# third
+import pytest
+from mock import patch
+
+# local
+from exabgpctl import controller, watcher, _py6
+
+
+def _backends():
+    try:
+        watcher.Inotify().close()
+    except OSError:
+        return ["poll"]
+    return ["poll", "inotify"]
+
+
+@pytest.fixture(params=_backends())
+def watched(request, tmpdir, monkeypatch):
+    conf = tmpdir.join("exabgp.conf")
+    maintenance = tmpdir.mkdir("maintenance")
+    if _py6.PY2:
+        content = open("examples/exabgp3.conf").read()
+    else:
+        content = open("examples/exabgp4.conf").read()
+    conf.write(content.replace("/tmp/exabgp/maintenance", str(maintenance)))
+    monkeypatch.setenv("EXABGPCTL_CONF", str(conf))
+    monkeypatch.setenv("EXABGPCTL_STATE", str(tmpdir))
+    monkeypatch.setenv("EXABGPCTL_CACHE", "0")
+
+    with watcher.ConfigWatcher(request.param, interval=0.01) as instance:
+        assert instance.backend == request.param
+        yield instance
+
+
+def test_watcher_maintenance(watched, tmpdir):
+    cfg = watched.cfg
+    assert watched.poll() == set()
+    assert cfg.disabled() == set()
+
+    time.sleep(0.01)
+    tmpdir.join("maintenance", "service1.exabgp.lan").write("")
+    assert watched.poll(timeout=2) == set(["maintenance"])
+    assert cfg.disabled() == set(["service1.exabgp.lan"])
+
+    tmpdir.join("maintenance", "service1.exabgp.lan").remove()
+    assert watched.poll(timeout=2) == set(["maintenance"])
+    assert cfg.disabled() == set()
+    assert watched.cfg is cfg
+
+
+def test_watcher_state(watched, tmpdir):
+    assert watched.states["service2.exabgp.lan"] == "UNKNOWN"
+
+    tmpdir.join("service2.exabgp.lan").write("DOWN")
+    assert watched.poll(timeout=2) == set(["state"])
+    assert watched.states["service2.exabgp.lan"] == "DOWN"
+    assert watched.states["service1.exabgp.lan"] == "UNKNOWN"
+
+
+def test_watcher_conf(watched, tmpdir):
+    cfg = watched.cfg
+    time.sleep(0.01)
+    tmpdir.join("maintenance", "service1.exabgp.lan").write("")
+    watched.poll(timeout=2)
+
+    conf = tmpdir.join("exabgp.conf")
+    with patch(
+        "exabgpctl.controller.healthcheck_parse",
+        wraps=controller.healthcheck_parse,
+    ) as parse:
+        conf.write(conf.read().replace("11223:366", "11223:367"))
+        assert watched.poll(timeout=2) == set(["conf"])
+    # only the changed run line is parsed
+    assert parse.call_count == 1
+
+    assert watched.cfg is not cfg
+    old = cfg.index("processes")
+    new = watched.cfg.index("processes")
+    assert new["service1.exabgp.lan"] is old["service1.exabgp.lan"]
+    assert new["service3.exabgp.lan"] is not old["service3.exabgp.lan"]
+    assert new["service3.exabgp.lan"]["run"]["community"] == "11223:367"
+    assert watched.cfg.disabled() == set(["service1.exabgp.lan"])
+    for old, new in zip(cfg["neighbors"], watched.cfg["neighbors"]):
+        assert old is new
+
+    # new process, its maintenance file is checked
+    tmpdir.join("maintenance", "service4.exabgp.lan").write("")
+    conf.write(conf.read().replace("service3", "service4"))
+    assert "conf" in watched.poll(timeout=2)
+    assert watched.cfg.disabled() == set(
+        ["service1.exabgp.lan", "service4.exabgp.lan"]
+    )
+    assert "service4.exabgp.lan" in watched.states
+    assert "service3.exabgp.lan" not in watched.states
+
+
+def test_watcher_maintenance_dir_created(watched, tmpdir):
+    tmpdir.join("maintenance").remove()
+    assert watched.poll(timeout=2)
+    assert watched.cfg.disabled() == set()
+
+    time.sleep(0.01)
+    tmpdir.mkdir("maintenance").join("service2.exabgp.lan").write("")
+    assert watched.poll(timeout=2) == set(["maintenance"])
+    assert watched.cfg.disabled() == set(["service2.exabgp.lan"])
+
+
+def test_watcher_backend():
+    with pytest.raises(watcher.ExabgpCTLError):
+        watcher.ConfigWatcher("fanotify")